@@ -0,0 +1,196 @@
+"""
+fixtures.py
+
+Offline fixtures for the benchmark stand-ins, built from the committed data:
+
+- dummy_data.csv (the Google Maps export the Node server scrapes) provides
+  the prospects. Every business gets a few synthetic web pages (home,
+  about, reviews) under http://fixtures.local/<slug>/... (or the host of
+  the site stand-in, see stand_ins/site.py), and search
+  queries are answered with Google Custom Search style items pointing at
+  them.
+- first_approach/cache.sqlite holds a recorded download of tiktoken's
+  cl100k_base encoding; seed_tiktoken_cache() unpacks it so token counting
+  works without network access.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import struct
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+RESEARCH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUSINESSES_CSV = os.path.join(RESEARCH_DIR, "dummy_data.csv")
+RECORDED_CACHE = os.path.join(RESEARCH_DIR, "first_approach", "cache.sqlite")
+FIXTURE_HOST = "http://fixtures.local"
+
+_TIKTOKEN_BLOB = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def slugify(text: str) -> str:
+    return "-".join(_WORD.findall(text.lower())) or "business"
+
+
+def _json_field(value: str, default: Any) -> Any:
+    try:
+        return json.loads(value) if value else default
+    except ValueError:
+        return default
+
+
+def load_businesses(path: str = BUSINESSES_CSV) -> List[Dict[str, Any]]:
+    businesses = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            businesses.append({
+                "slug": slugify(row["title"]),
+                "business_name": row["title"],
+                "website": row["website"],
+                "category": row["category"],
+                "address": row["address"],
+                "phone": row["phone"],
+                "price_range": row["price_range"],
+                "review_rating": row["review_rating"],
+                "review_count": row["review_count"],
+                "open_hours": _json_field(row["open_hours"], {}),
+                "about": _json_field(row["about"], []),
+                "reviews": _json_field(row["user_reviews"], []),
+            })
+    return businesses
+
+
+def business_info(business: Dict[str, Any], host: str = FIXTURE_HOST) -> Dict[str, Any]:
+    """
+    The business_info a task for this prospect is submitted with. The
+    website is always the fixture site, so the native fetcher stays offline.
+    """
+    return {
+        "business_name": business["business_name"],
+        "website": f"{host}/{business['slug']}",
+        "category": business["category"],
+        "address": business["address"],
+    }
+
+
+def pages(business: Dict[str, Any], host: str = FIXTURE_HOST) -> Dict[str, str]:
+    """
+    Markdown pages of a business, keyed by URL, as a reader service would return them.
+    """
+    name, base = business["business_name"], f"{host}/{business['slug']}"
+    hours = "\n".join(f"- {day}: {', '.join(times)}" for day, times in business["open_hours"].items())
+    home = (
+        f"# {name}\n\n{name} is a {business['category'].lower()} at {business['address']}.\n\n"
+        f"Phone: {business['phone'] or 'n/a'}. Price range: {business['price_range'] or 'n/a'}.\n\n"
+        f"## Opening hours\n\n{hours or 'Not published.'}\n\n"
+        f"[About]({base}/about) | [Reviews]({base}/reviews)\n"
+    )
+    about_lines = []
+    for section in business["about"]:
+        options = [o["name"] for o in section.get("options", []) if o.get("enabled")]
+        if options:
+            about_lines.append(f"## {section.get('name', '')}\n\n" + "\n".join(f"- {o}" for o in options))
+    about = f"# About {name}\n\n" + ("\n\n".join(about_lines) or "No details published.")
+    review_lines = [
+        f"**{r.get('Name', 'Guest')}** ({r.get('Rating', '?')}/5): {r.get('Description', '')}"
+        for r in business["reviews"] if isinstance(r, dict)
+    ]
+    reviews = (
+        f"# Reviews of {name}\n\nRated {business['review_rating']} from {business['review_count']} reviews.\n\n"
+        + "\n\n".join(review_lines)
+    )
+    return {base: home, f"{base}/about": about, f"{base}/reviews": reviews}
+
+
+class FixtureIndex:
+    """
+    All fixture pages, and a small keyword search over the businesses.
+    """
+
+    def __init__(self, businesses: Optional[List[Dict[str, Any]]] = None, host: str = FIXTURE_HOST):
+        self.businesses = businesses if businesses is not None else load_businesses()
+        self.host = host
+        self.pages: Dict[str, str] = {}
+        for business in self.businesses:
+            self.pages.update(pages(business, host))
+
+    def page(self, url: str) -> Optional[str]:
+        return self.pages.get(url.rstrip("/"))
+
+    def search(self, query: str, num: int = 10) -> List[Dict[str, Any]]:
+        terms = set(_WORD.findall(query.lower()))
+        scored = []
+        for business in self.businesses:
+            words = set(_WORD.findall(f"{business['business_name']} {business['category']} {business['address']}".lower()))
+            scored.append((len(terms & words), business["slug"], business))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+
+        items = []
+        for _, _, business in scored:
+            for url, content in pages(business, self.host).items():
+                items.append({
+                    "kind": "customsearch#result",
+                    "title": content.splitlines()[0].lstrip("# "),
+                    "htmlTitle": content.splitlines()[0].lstrip("# "),
+                    "link": url,
+                    "displayLink": urlsplit(self.host).netloc,
+                    "snippet": " ".join(content.split()[:30]),
+                    "htmlSnippet": " ".join(content.split()[:30]),
+                    "formattedUrl": url,
+                    # Noise as real results carry it
+                    "pagemap": {"metatags": [{"og:type": "website", "og:title": business["business_name"],
+                                              "viewport": "width=device-width, initial-scale=1"}]},
+                })
+                if len(items) == num:
+                    return items
+        return items
+
+
+def seed_tiktoken_cache(cache_dir: str, recorded_cache: str = RECORDED_CACHE) -> bool:
+    """
+    Writes the recorded cl100k_base encoding into a TIKTOKEN_CACHE_DIR.
+    Returns False if the recording isn't there.
+    """
+    target = os.path.join(cache_dir, hashlib.sha1(_TIKTOKEN_BLOB.encode()).hexdigest())
+    if os.path.exists(target):
+        return True
+    if not os.path.exists(recorded_cache):
+        return False
+    conn = sqlite3.connect(recorded_cache)
+    try:
+        for (value,) in conn.execute("SELECT value FROM responses"):
+            content = _pickled_content(value)
+            if content and content.startswith(b"IQ== 0\n"):
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(target, "wb") as f:
+                    f.write(content)
+                return True
+    finally:
+        conn.close()
+    return False
+
+
+def _pickled_content(value: bytes) -> Optional[bytes]:
+    """
+    Reads the `_content` bytes out of a pickled requests-cache response
+    without unpickling it (which would need requests-cache installed).
+    """
+    marker = value.find(b"\x8c\x08_content")
+    if marker < 0:
+        return None
+    position = marker + len(b"\x8c\x08_content")
+    if value[position:position + 1] == b"\x94":  # MEMOIZE
+        position += 1
+    opcode = value[position:position + 1]
+    if opcode == b"B":  # BINBYTES
+        (length,) = struct.unpack("<I", value[position + 1:position + 5])
+        return value[position + 5:position + 5 + length]
+    if opcode == b"\x8e":  # BINBYTES8
+        (length,) = struct.unpack("<Q", value[position + 1:position + 9])
+        return value[position + 9:position + 9 + length]
+    return None
@@ -0,0 +1,278 @@
+"""
+run_benchmark.py
+
+Offline throughput and latency benchmark for the research service.
+
+Starts local stand-ins for OpenAI, Google Custom Search / SerpAPI, the
+Jina / Firecrawl readers and the prospects' websites (with configurable
+injected latency and error rates), launches `uvicorn main:app` against them, submits N research tasks
+concurrently through /submit-task and waits for their callbacks. Reports:
+
+- cold start: seconds from launching uvicorn until /healthz answers, and
+  the service's own split into importing the app and running its startup
+- throughput: completed tasks per minute
+- end-to-end task latency (submit to callback), p50/p95/p99
+- per-node and per-provider latency from the service's /metrics
+- event loop lag and peak memory of the service process
+
+Nothing touches the network or costs money. Run from the research directory:
+
+    python -m benchmarks.run_benchmark --tasks 50 --workers 16 --llm-latency 0.8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.fixtures import RESEARCH_DIR, FixtureIndex, business_info, seed_tiktoken_cache
+from benchmarks.stand_ins import openai_api, reader_api, search_api, site
+from benchmarks.stand_ins.callback_sink import CallbackSink
+
+SERVICE_DIR = os.path.join(RESEARCH_DIR, "first_approach")
+HOST = "127.0.0.1"
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))], 3)
+
+
+async def start_app(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, port).start()
+    return runner
+
+
+def service_env(args, workdir: str) -> Dict[str, str]:
+    base = args.port_base
+    env = {
+        **os.environ,
+        # Stand-in endpoints; the keys only need to be non-empty
+        "OPENAI_API_KEY": "stand-in",
+        "OPENAI_BASE_URL": f"http://{HOST}:{base}/v1",
+        "OPENAI_BATCH_BASE_URL": f"http://{HOST}:{base}/v1",
+        "GOOGLE_SEARCH_KEY": "stand-in",
+        "GOOGLE_SEARCH_CX": "stand-in",
+        "SERPAPI_API_KEY": "stand-in",
+        "JINA_API_KEY": "stand-in",
+        "FIRECRAWL_API_KEY": "stand-in",
+        "GOOGLE_SEARCH_URL": f"http://{HOST}:{base + 1}/customsearch/v1",
+        "SERPAPI_URL": f"http://{HOST}:{base + 1}/search",
+        "JINA_READER_URL": f"http://{HOST}:{base + 2}/",
+        "FIRECRAWL_URL": f"http://{HOST}:{base + 2}/fetch",
+        "FETCH_BACKEND": args.fetch_backend,
+        # The stand-in's placeholder questions share no terms with the fixture
+        # pages; without this every page would be pre-filtered and extract_info
+        # never measured
+        "PREFILTER_MIN_COVERAGE": "0",
+        # The site stand-in lives on the loopback address the fetcher refuses otherwise
+        "FETCH_ALLOWED_PRIVATE_HOSTS": HOST,
+        # Fresh state per run
+        "TASK_DB_PATH": os.path.join(workdir, "tasks.sqlite"),
+        "CHECKPOINT_DB_PATH": os.path.join(workdir, "checkpoints.sqlite"),
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite"),
+        "RESEARCH_STORE_PATH": os.path.join(workdir, "research_store.sqlite"),
+        "CONTENT_STORE_PATH": os.path.join(workdir, "content_store.sqlite"),
+        "TIKTOKEN_CACHE_DIR": os.path.join(workdir, "tiktoken"),
+        "RESEARCH_WORKERS": str(args.workers),
+        "RESEARCH_MAX_QUEUE": str(max(args.tasks, 500)),
+        "LLM_BATCH_FLUSH_SECONDS": "2",
+        "LLM_BATCH_POLL_SECONDS": "1",
+        "PYTHONUNBUFFERED": "1",
+    }
+    if args.telemetry:
+        env["TELEMETRY_EXPORT"] = os.path.join(workdir, "spans.jsonl")
+    return env
+
+
+async def wait_until_ready(session: aiohttp.ClientSession, service_url: str, process: subprocess.Popen,
+                           timeout: float) -> Tuple[float, Dict[str, Any]]:
+    """
+    Polls /healthz until the service is ready. Returns a tuple: (seconds
+    since launch, the service's own cold start breakdown).
+    """
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"The service exited with code {process.returncode}")
+        try:
+            async with session.get(f"{service_url}/healthz") as response:
+                if response.status == 200:
+                    ready_after = time.monotonic() - started
+                    return ready_after, (await response.json()).get("cold_start", {})
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.02)
+    raise RuntimeError("The service did not become ready in time")
+
+
+async def submit_tasks(session: aiohttp.ClientSession, service_url: str, callback_url: str,
+                       index: FixtureIndex, args) -> Dict[str, float]:
+    """
+    Submits all tasks at once. Returns the submit time of each task id.
+    """
+    async def submit(i: int):
+        business = index.businesses[i % len(index.businesses)]
+        info = business_info(business, index.host)
+        if i >= len(index.businesses):
+            # Repeated prospects would only measure the caches
+            info["business_name"] = f"{info['business_name']} #{i // len(index.businesses) + 1}"
+        body = {
+            "callback_url": callback_url,
+            "business_info": info,
+            "max_rounds": args.max_rounds,
+            "execution_mode": args.execution_mode,
+            "llm_mode": args.llm_mode,
+        }
+        submitted_at = time.monotonic()
+        async with session.post(f"{service_url}/submit-task", json=body) as response:
+            response.raise_for_status()
+            return (await response.json())["task_id"], submitted_at
+
+    return dict(await asyncio.gather(*(submit(i) for i in range(args.tasks))))
+
+
+def node_latencies(metrics: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    spans = metrics.get("spans", {})
+    return {
+        f"{kind}:{name}": figures["latency_seconds"]
+        for kind in ("node", "llm", "provider")
+        for name, figures in spans.get(kind, {}).items()
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    index = FixtureIndex(host=f"http://{HOST}:{args.port_base + 4}")
+    workdir = tempfile.mkdtemp(prefix="research-benchmark-")
+    if not seed_tiktoken_cache(os.path.join(workdir, "tiktoken")):
+        print("No recorded tiktoken encoding found; token counting will need network access")
+
+    faults = {"jitter": args.jitter, "error_rate": args.error_rate, "rate_limit_rate": args.rate_limit_rate}
+    sink = CallbackSink()
+    runners = [
+        await start_app(openai_api.create_app(args.batch_delay, args.recordings, latency=args.llm_latency, **faults),
+                        args.port_base),
+        await start_app(search_api.create_app(index, latency=args.search_latency, **faults), args.port_base + 1),
+        await start_app(reader_api.create_app(index, latency=args.fetch_latency, **faults), args.port_base + 2),
+        await start_app(sink.create_app(), args.port_base + 3),
+        await start_app(site.create_app(index, spa_rate=args.spa_rate, latency=args.site_latency, **faults),
+                        args.port_base + 4),
+    ]
+    service_url = f"http://{HOST}:{args.service_port}"
+    log_path = os.path.join(workdir, "service.log")
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", HOST, "--port", str(args.service_port)],
+            cwd=SERVICE_DIR, env=service_env(args, workdir), stdout=log, stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+        )
+    try:
+        async with aiohttp.ClientSession() as session:
+            cold_start, service_cold_start = await wait_until_ready(session, service_url, process, args.startup_timeout)
+            started = time.monotonic()
+            submitted = await submit_tasks(session, service_url, f"http://{HOST}:{args.port_base + 3}/callback",
+                                           index, args)
+            finished = await sink.wait_for(submitted, args.timeout)
+            elapsed = time.monotonic() - started
+            async with session.get(f"{service_url}/metrics") as response:
+                metrics = await response.json()
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        for runner in runners:
+            await runner.cleanup()
+
+    results = {task_id: sink.results[task_id] for task_id in submitted if task_id in sink.results}
+    latencies = [results[t]["received_at"] - submitted[t] for t in results]
+    completed = sum(1 for r in results.values() if r["payload"].get("status") == "completed")
+    if results:
+        span = max(r["received_at"] for r in results.values()) - min(submitted.values())
+    else:
+        span = elapsed
+    return {
+        "config": vars(args),
+        "all_finished": finished,
+        "cold_start_seconds": round(cold_start, 3),
+        "service_cold_start": service_cold_start,
+        "tasks": {"submitted": len(submitted), "completed": completed, "errors": len(results) - completed,
+                  "missing": len(submitted) - len(results)},
+        "tasks_per_minute": round(len(results) / span * 60, 2) if span else 0.0,
+        "task_latency_seconds": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+                                 "p99": percentile(latencies, 99), "max": percentile(latencies, 100)},
+        "span_latency_seconds": node_latencies(metrics),
+        "event_loop_lag_seconds": metrics.get("event_loop_lag_seconds"),
+        "service_peak_memory_mb": metrics.get("peak_memory_mb"),
+        "workdir": workdir,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    tasks = report["tasks"]
+    service = report["service_cold_start"]
+    print(f"Cold start:      {report['cold_start_seconds']} s (app imported after "
+          f"{service.get('imported_after_seconds')} s, startup {service.get('startup_seconds')} s)")
+    print(f"Tasks:           {tasks['completed']} completed, {tasks['errors']} errors, {tasks['missing']} missing")
+    print(f"Throughput:      {report['tasks_per_minute']} tasks/min")
+    latency = report["task_latency_seconds"]
+    print(f"Task latency:    p50 {latency['p50']} s, p95 {latency['p95']} s, p99 {latency['p99']} s")
+    lag = report["event_loop_lag_seconds"] or {}
+    print(f"Event loop lag:  p95 {lag.get('p95')} s, max {lag.get('max')} s")
+    print(f"Peak memory:     {report['service_peak_memory_mb']} MB")
+    print("Spans (p50 / p95 / p99 s):")
+    for name, figures in sorted(report["span_latency_seconds"].items()):
+        print(f"  {name:<40} {figures['p50']:>8} {figures['p95']:>8} {figures['p99']:>8}  ({figures['count']})")
+    print(f"Service log and databases: {report['workdir']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=20, help="research tasks to submit at once")
+    parser.add_argument("--workers", type=int, default=8, help="RESEARCH_WORKERS of the service")
+    parser.add_argument("--max-rounds", type=int, default=1)
+    parser.add_argument("--execution-mode", choices=["staged", "pipelined"], default="staged")
+    parser.add_argument("--llm-mode", choices=["realtime", "batch"], default="realtime")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per OpenAI request")
+    parser.add_argument("--search-latency", type=float, default=0.3, help="seconds per search request")
+    parser.add_argument("--fetch-latency", type=float, default=1.0, help="seconds per reader proxy fetch")
+    parser.add_argument("--site-latency", type=float, default=0.2, help="seconds per request to a website")
+    parser.add_argument("--fetch-backend", choices=["NATIVE", "JINA", "FIRECRAWL"], default="NATIVE",
+                        help="FETCH_BACKEND of the service")
+    parser.add_argument("--spa-rate", type=float, default=0.0,
+                        help="share of website pages served as JavaScript app shells")
+    parser.add_argument("--jitter", type=float, default=0.0, help="± seconds added to every latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stand-in requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of stand-in requests answered 429")
+    parser.add_argument("--batch-delay", type=float, default=5.0, help="seconds until a stand-in batch completes")
+    parser.add_argument("--recordings", help="JSON lines of recorded LLM completions to replay")
+    parser.add_argument("--telemetry", action="store_true", help="export the service's spans to the workdir")
+    parser.add_argument("--port-base", type=int, default=8900, help="first of five ports for the stand-ins")
+    parser.add_argument("--service-port", type=int, default=8800)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--timeout", type=float, default=900.0, help="seconds to wait for all callbacks")
+    parser.add_argument("--output", help="also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
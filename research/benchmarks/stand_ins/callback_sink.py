@@ -0,0 +1,46 @@
+"""
+callback_sink.py
+
+Receives the research service's result callbacks and records when each
+task finished, so the benchmark can measure end-to-end latency.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict
+
+from aiohttp import web
+
+
+class CallbackSink:
+    def __init__(self):
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self._changed = asyncio.Event()
+
+    async def receive(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        for item in payload.get("batch", [payload]):
+            self.results[item["task_id"]] = {"received_at": time.monotonic(), "payload": item}
+        self._changed.set()
+        return web.json_response({"ok": True})
+
+    async def wait_for(self, task_ids, timeout: float) -> bool:
+        """
+        Waits until a callback arrived for every task id, or the timeout passed.
+        """
+        deadline = time.monotonic() + timeout
+        while not set(task_ids) <= self.results.keys():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/callback", self.receive)
+        return app
@@ -0,0 +1,35 @@
+"""
+faults.py
+
+Latency and error injection shared by the stand-ins.
+"""
+
+import asyncio
+import random
+
+from aiohttp import web
+
+
+def fault_middleware(latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                     rate_limit_rate: float = 0.0, seed: int = 0):
+    """
+    Delays every request by `latency` ± `jitter` seconds, then fails a
+    `rate_limit_rate` share of them with 429 (Retry-After: 1) and an
+    `error_rate` share with 500.
+    """
+    rng = random.Random(seed)
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        delay = max(0.0, latency + rng.uniform(-jitter, jitter))
+        if delay:
+            await asyncio.sleep(delay)
+        roll = rng.random()
+        if roll < rate_limit_rate:
+            return web.json_response({"error": {"message": "Rate limit reached (stand-in)"}}, status=429,
+                                     headers={"Retry-After": "1"})
+        if roll < rate_limit_rate + error_rate:
+            return web.json_response({"error": {"message": "Injected failure (stand-in)"}}, status=500)
+        return await handler(request)
+
+    return middleware
@@ -0,0 +1,191 @@
+"""
+openai_api.py
+
+Local stand-in for the parts of the OpenAI API the research service uses:
+chat completions, file upload/download and the Batch API.
+
+Completions are replayed from a recordings file (JSON lines of
+{"prompt_sha256", "content"}) when the prompt was recorded, and otherwise
+made up from the JSON schema in the prompt's format instructions: every
+field gets a placeholder value of its type, and list fields asking for
+results or URLs get the URLs found in the prompt. Batches complete after
+--batch-delay seconds.
+
+    python -m benchmarks.stand_ins.openai_api --port 8900
+
+Point the service at it with OPENAI_BASE_URL / OPENAI_BATCH_BASE_URL set to
+http://localhost:8900/v1 and any OPENAI_API_KEY.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from benchmarks.stand_ins.faults import fault_middleware
+
+
+_SCHEMA_BLOCK = re.compile(r"output schema:\s*```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL | re.IGNORECASE)
+_URL = re.compile(r"https?://[^\s\"'<>)\]]+")
+_ids = itertools.count(1)
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}-{next(_ids)}"
+
+
+def placeholder(schema: Dict[str, Any], definitions: Dict[str, Any], urls: List[str],
+                name: str = "") -> Any:
+    """
+    A value of the schema's shape: strings, one-element lists, true, 0.
+    """
+    if "$ref" in schema:
+        return placeholder(definitions[schema["$ref"].split("/")[-1]], definitions, urls, name)
+    if "anyOf" in schema:
+        return placeholder(schema["anyOf"][0], definitions, urls, name)
+    kind = schema.get("type", "object")
+    if kind == "object":
+        return {prop_name: placeholder(prop, definitions, urls, prop_name)
+                for prop_name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        if urls and ("result" in name or "url" in name):
+            return urls[:schema.get("maxItems", 4)]
+        return [placeholder(schema.get("items", {"type": "string"}), definitions, urls)]
+    if kind == "boolean":
+        return True
+    if kind in ("integer", "number"):
+        return 0
+    return "stub"
+
+
+def complete(prompt: str) -> str:
+    match = _SCHEMA_BLOCK.search(prompt)
+    if not match:
+        return "{}"
+    schema = json.loads(match.group(1))
+    # URLs in the prompt outside of the format instructions, in order of appearance
+    urls = list(dict.fromkeys(_URL.findall(prompt[:match.start()] + prompt[match.end():])))
+    return json.dumps(placeholder(schema, schema.get("$defs", {}), urls))
+
+
+def load_recordings(path: Optional[str]) -> Dict[str, str]:
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {r["prompt_sha256"]: r["content"] for r in map(json.loads, filter(str.strip, f))}
+
+
+def chat_completion(body: Dict[str, Any], recordings: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+    recorded = (recordings or {}).get(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+    content = recorded if recorded is not None else complete(prompt)
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+    return {
+        "id": _new_id("chatcmpl"),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stand-in"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+class StandInOpenAI:
+    def __init__(self, batch_delay: float, recordings: Dict[str, str]):
+        self.batch_delay = batch_delay
+        self.recordings = recordings
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+    def _store_file(self, filename: str, purpose: str, data: bytes) -> Dict[str, Any]:
+        file = {"id": _new_id("file"), "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+        self.files[file["id"]] = {**file, "data": data}
+        return file
+
+    async def chat_completions(self, request: web.Request) -> web.Response:
+        return web.json_response(chat_completion(await request.json(), self.recordings))
+
+    async def upload_file(self, request: web.Request) -> web.Response:
+        purpose, filename, data = "batch", "upload.jsonl", b""
+        async for part in await request.multipart():
+            if part.name == "purpose":
+                purpose = (await part.read()).decode()
+            elif part.name == "file":
+                filename = part.filename or filename
+                data = await part.read()
+        return web.json_response(self._store_file(filename, purpose, data))
+
+    async def file_content(self, request: web.Request) -> web.Response:
+        file = self.files.get(request.match_info["file_id"])
+        if file is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=file["data"], content_type="application/octet-stream")
+
+    async def create_batch(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if body.get("input_file_id") not in self.files:
+            raise web.HTTPBadRequest(text="unknown input_file_id")
+        batch = {
+            "id": _new_id("batch"), "object": "batch", "endpoint": body["endpoint"],
+            "completion_window": body.get("completion_window", "24h"), "input_file_id": body["input_file_id"],
+            "status": "in_progress", "created_at": int(time.time()), "output_file_id": None,
+            "error_file_id": None, "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        self.batches[batch["id"]] = batch
+        asyncio.create_task(self._process(batch))
+        return web.json_response(batch)
+
+    async def get_batch(self, request: web.Request) -> web.Response:
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None:
+            raise web.HTTPNotFound()
+        return web.json_response(batch)
+
+    async def _process(self, batch: Dict[str, Any]):
+        await asyncio.sleep(self.batch_delay)
+        lines = self.files[batch["input_file_id"]]["data"].decode().splitlines()
+        output = []
+        for line in filter(str.strip, lines):
+            request = json.loads(line)
+            output.append(json.dumps({
+                "id": _new_id("batch_req"), "custom_id": request["custom_id"], "error": None,
+                "response": {"status_code": 200, "request_id": _new_id("req"),
+                             "body": chat_completion(request["body"], self.recordings)},
+            }))
+        output_file = self._store_file("batch_output.jsonl", "batch_output", "\n".join(output).encode())
+        batch.update({
+            "status": "completed", "output_file_id": output_file["id"], "completed_at": int(time.time()),
+            "request_counts": {"total": len(output), "completed": len(output), "failed": 0},
+        })
+
+
+def create_app(batch_delay: float = 5.0, recordings: Optional[str] = None, **faults) -> web.Application:
+    api = StandInOpenAI(batch_delay, load_recordings(recordings))
+    app = web.Application(client_max_size=200 * 1024 * 1024, middlewares=[fault_middleware(**faults)])
+    app.router.add_post("/v1/chat/completions", api.chat_completions)
+    app.router.add_post("/v1/files", api.upload_file)
+    app.router.add_get("/v1/files/{file_id}/content", api.file_content)
+    app.router.add_post("/v1/batches", api.create_batch)
+    app.router.add_get("/v1/batches/{batch_id}", api.get_batch)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--batch-delay", type=float, default=5.0, help="seconds until a batch completes")
+    parser.add_argument("--recordings", help="JSON lines of recorded completions to replay")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 500")
+    args = parser.parse_args()
+    web.run_app(create_app(args.batch_delay, args.recordings, latency=args.latency, error_rate=args.error_rate),
+                port=args.port)
@@ -0,0 +1,35 @@
+"""
+reader_api.py
+
+Local stand-in for the Jina reader (GET /<url>) and Firecrawl
+(GET /fetch?url=<url>), serving the benchmark fixture pages as markdown.
+
+    JINA_READER_URL=http://localhost:8902/
+    FIRECRAWL_URL=http://localhost:8902/fetch
+"""
+
+from aiohttp import web
+
+from benchmarks.fixtures import FixtureIndex
+from benchmarks.stand_ins.faults import fault_middleware
+
+
+def create_app(index: FixtureIndex, **faults) -> web.Application:
+    def page_response(url: str) -> web.Response:
+        content = index.page(url)
+        if content is None:
+            return web.Response(status=404, text=f"No fixture for {url}")
+        return web.Response(text=f"Title: {content.splitlines()[0].lstrip('# ')}\nURL Source: {url}\n"
+                                 f"Markdown Content:\n{content}", content_type="text/plain")
+
+    async def firecrawl(request: web.Request) -> web.Response:
+        return page_response(request.query.get("url", ""))
+
+    async def jina(request: web.Request) -> web.Response:
+        # The target URL is the whole path, query string included
+        return page_response(request.raw_path[1:])
+
+    app = web.Application(middlewares=[fault_middleware(**faults)])
+    app.router.add_get("/fetch", firecrawl)
+    app.router.add_get("/{url:.+}", jina)
+    return app
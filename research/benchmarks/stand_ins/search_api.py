@@ -0,0 +1,34 @@
+"""
+search_api.py
+
+Local stand-in for Google's Custom Search JSON API and SerpAPI, answering
+queries from the benchmark fixtures.
+
+    GOOGLE_SEARCH_URL=http://localhost:8901/customsearch/v1
+    SERPAPI_URL=http://localhost:8901/search
+"""
+
+from aiohttp import web
+
+from benchmarks.fixtures import FixtureIndex
+from benchmarks.stand_ins.faults import fault_middleware
+
+
+def create_app(index: FixtureIndex, **faults) -> web.Application:
+    async def google(request: web.Request) -> web.Response:
+        num = int(request.query.get("num", "10"))
+        return web.json_response({"kind": "customsearch#search",
+                                  "items": index.search(request.query.get("q", ""), num)})
+
+    async def serpapi(request: web.Request) -> web.Response:
+        results = [
+            {"position": rank, "title": item["title"], "link": item["link"], "snippet": item["snippet"],
+             "displayed_link": item["displayLink"]}
+            for rank, item in enumerate(index.search(request.query.get("q", "")), start=1)
+        ]
+        return web.json_response({"organic_results": results})
+
+    app = web.Application(middlewares=[fault_middleware(**faults)])
+    app.router.add_get("/customsearch/v1", google)
+    app.router.add_get("/search", serpapi)
+    return app
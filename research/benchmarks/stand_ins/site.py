@@ -0,0 +1,104 @@
+"""
+site.py
+
+Local stand-in for the prospects' own websites, serving the benchmark
+fixture pages as HTML for the native fetcher:
+
+- every page is wrapped in the boilerplate real sites carry (navigation,
+  cookie banner, footer, scripts), which extraction has to drop,
+- responses carry an ETag and Last-Modified and answer conditional
+  requests with 304,
+- a `spa_rate` share of the pages is served as a JavaScript app shell with
+  no content, which the native fetcher has to hand to a reader proxy.
+
+The fixture index has to be built with this stand-in's address as host:
+
+    FixtureIndex(host="http://localhost:8904")
+"""
+
+import hashlib
+import html
+import re
+
+from aiohttp import web
+
+from benchmarks.fixtures import FixtureIndex
+from benchmarks.stand_ins.faults import fault_middleware
+
+LAST_MODIFIED = "Mon, 06 Jan 2025 09:00:00 GMT"
+
+_LINK = re.compile(r"\[([^\]]*)\]\(([^)]*)\)")
+_BOLD = re.compile(r"\*\*([^*]+)\*\*")
+
+_SPA_SHELL = """<!doctype html>
+<html><head><title>Loading…</title><script src="/static/app.js" defer></script></head>
+<body><div id="root"></div><noscript>Please enable JavaScript.</noscript></body></html>"""
+
+
+def _inline(text: str) -> str:
+    text = html.escape(text, quote=False)
+    text = _BOLD.sub(r"<strong>\1</strong>", text)
+    return _LINK.sub(r'<a href="\2">\1</a>', text)
+
+
+def markdown_to_html(markdown: str) -> str:
+    """
+    Renders the fixture markdown (headings, lists, paragraphs, links).
+    """
+    blocks = []
+    for block in markdown.split("\n\n"):
+        lines = block.strip().splitlines()
+        if not lines:
+            continue
+        if lines[0].startswith("#"):
+            level = len(lines[0]) - len(lines[0].lstrip("#"))
+            blocks.append(f"<h{level}>{_inline(lines[0].lstrip('# '))}</h{level}>")
+        elif all(line.startswith("- ") for line in lines):
+            items = "".join(f"<li>{_inline(line[2:])}</li>" for line in lines)
+            blocks.append(f"<ul>{items}</ul>")
+        else:
+            blocks.append(f"<p>{_inline(' '.join(lines))}</p>")
+    return "\n".join(blocks)
+
+
+def page_html(title: str, body: str, base: str) -> str:
+    return f"""<!doctype html>
+<html lang="en"><head><meta charset="utf-8"><title>{html.escape(title)}</title>
+<style>body {{ font-family: sans-serif; }}</style>
+<script>window.dataLayer = window.dataLayer || []; function gtag() {{ dataLayer.push(arguments); }}</script>
+</head><body>
+<header><a href="{base}">Home</a> <a href="{base}/about">About</a> <a href="{base}/reviews">Reviews</a></header>
+<div class="cookie-banner">We use cookies to improve your experience. <button>Accept all</button></div>
+<nav><ul><li><a href="{base}">Home</a></li><li><a href="{base}/about">About us</a></li>
+<li><a href="{base}/reviews">Reviews</a></li></ul></nav>
+<main><article>
+{body}
+</article></main>
+<aside class="sidebar"><h3>Follow us</h3><a href="https://facebook.com/">Facebook</a></aside>
+<footer><p>© 2025 {html.escape(title)}. All rights reserved.</p><a href="/imprint">Imprint</a></footer>
+<script src="/static/analytics.js"></script>
+</body></html>"""
+
+
+def create_app(index: FixtureIndex, spa_rate: float = 0.0, **faults) -> web.Application:
+    async def page(request: web.Request) -> web.Response:
+        url = f"{index.host}{request.path}"
+        content = index.page(url)
+        if content is None:
+            return web.Response(status=404, text=f"No fixture for {url}")
+        digest = hashlib.sha256(url.encode("utf-8")).digest()
+        if digest[0] / 256 < spa_rate:
+            return web.Response(text=_SPA_SHELL, content_type="text/html")
+
+        etag = f'"{hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]}"'
+        headers = {"ETag": etag, "Last-Modified": LAST_MODIFIED}
+        if request.headers.get("If-None-Match") == etag or request.headers.get("If-Modified-Since") == LAST_MODIFIED:
+            return web.Response(status=304, headers=headers)
+        title = content.splitlines()[0].lstrip("# ")
+        base = url.rsplit("/", 1)[0] if url.endswith(("/about", "/reviews")) else url
+        return web.Response(text=page_html(title, markdown_to_html(content), base), content_type="text/html",
+                            charset="utf-8", headers=headers)
+
+    app = web.Application(middlewares=[fault_middleware(**faults)])
+    app.router.add_get("/{path:.+}", page)
+    return app
@@ -1,14 +1,16 @@
-import requests_cache
-from datetime import timedelta
 from termcolor import colored
-import tiktoken  # For token counting
 import asyncio
-from typing import Dict, Any
+import os
+import time
+from functools import lru_cache
+from typing import Dict, Any, NamedTuple, Optional, Tuple, Type
 
-from state import ProspectingAgentState
+from pydantic import BaseModel
 
-# Install caching to optimize repeated requests
-requests_cache.install_cache('cache', backend='sqlite', expire_after=timedelta(days=7))
+from state import ProspectingAgentState
+from tokenization import count_tokens, estimate_cost
+from telemetry import telemetry, count
+from budget import BudgetGovernor, BudgetExhausted, ESTIMATED_COMPLETION_TOKENS
 
 # Import prompts and schemas
 from prompts import (
@@ -17,7 +19,8 @@ from prompts import (
     query_generation_agent_prompt,
     select_search_results_prompt,
     extract_info_prompt,
-    finalization_agent_prompt
+    finalization_agent_prompt,
+    page_usefulness_prompt
 )
 
 from schemas import (
@@ -26,52 +29,213 @@ from schemas import (
     QueryGenerationOutput,
     SelectedSearchResults,
     ExtractedInfo,
-    FinalReportOutput
+    FinalReportOutput,
+    PageUsefulness
 )
 
 # LangChain components
-from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
+from langchain_core.utils.json import parse_json_markdown
 
 # Import your abstracted backends
-from search_backends import search
+from search_backends import search, merge_results, render_results
+from reranker import RERANK_SHORTLIST, RERANK_TOP_K, SELECTION_MODE, rerank
 from fetch_backends import fetch_page
+from native_fetch import native_fetcher
+from worker_pool import run_cpu_bound
+from page_processing import prepare_page, merge_extracted_info
+from relevance import best_passages, term_coverage
+from dedup import SIMHASH_MAX_DISTANCE, fingerprint, find_url, find_content, hamming_distance, visited_entry
+from research_store import research_store, probe, is_stale
+from cache import canonicalize_url
+from content_store import content_store
+from rate_limiter import RateLimited, model_limiter, parse_retry_after
+from llm_cache import llm_cache, cache_keys, schema_fingerprint
+from llm_batch import batch_collector
+from settings import get_settings
+from model_routing import model_router
+
+# The LLM clients are built per model on first use (see model_routing.py)
+
+# Page pre-filter: pages covering less than this fraction of the query terms
+# are skipped. Off by default: exact term overlap misses paraphrases and pages
+# in another language than the question. The LLM check on a snippet is opt-in
+# per task or via env.
+PREFILTER_MIN_COVERAGE = float(os.getenv("PREFILTER_MIN_COVERAGE", "0"))
+PREFILTER_LLM = os.getenv("PREFILTER_LLM", "0") == "1"
+PREFILTER_SNIPPET_WORDS = 300
+
+
+@lru_cache(maxsize=1)
+def _transient_llm_errors() -> Tuple[type, ...]:
+    """
+    Transient server-side failures retried by _invoke_llm; openai is only
+    imported once the first call is made.
+    """
+    import openai
+    return openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError
+
+###########################
+# Precompiled prompts
+###########################
+
+class CompiledPrompt(NamedTuple):
+    prompt: PromptTemplate
+    schema: Type[BaseModel]
+    schema_fingerprint: str
+
+
+def _compile_prompt(template: str, schema: Type[BaseModel]) -> CompiledPrompt:
+    """
+    Builds the prompt template with the schema's format instructions baked in.
+    """
+    parser = JsonOutputParser(pydantic_object=schema)
+    prompt = PromptTemplate.from_template(
+        template, partial_variables={"format_instructions": parser.get_format_instructions()}
+    )
+    return CompiledPrompt(prompt, schema, schema_fingerprint(schema))
+
 
-# Configure LangChain LLM
-llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
+# One entry per agent, built once at import time
+PROMPT_REGISTRY: Dict[str, CompiledPrompt] = {
+    "interpretation": _compile_prompt(interpretation_agent_prompt, InterpretationOutput),
+    "planner": _compile_prompt(planner_agent_prompt, PlannerOutput),
+    "query_generation": _compile_prompt(query_generation_agent_prompt, QueryGenerationOutput),
+    "select_search_results": _compile_prompt(select_search_results_prompt, SelectedSearchResults),
+    "extract_info": _compile_prompt(extract_info_prompt, ExtractedInfo),
+    "finalization": _compile_prompt(finalization_agent_prompt, FinalReportOutput),
+    "page_usefulness": _compile_prompt(page_usefulness_prompt, PageUsefulness),
+}
 
-def count_tokens(prompt_text: str, completion_text: str = "", model_name: str = "gpt-4o-mini") -> int:
+
+async def _invoke_llm(prompt_text: str, model: str, attempts: int = 3):
+    """
+    Sends a rendered prompt to the model, translating 429s into RateLimited
+    for the limiter and retrying transient failures.
     """
-    Approximate token counting for the prompt and completion using tiktoken.
+    import openai
+    for attempt in range(attempts):
+        try:
+            chat_model = await model_router.chat_model(model)
+            return await chat_model.ainvoke(prompt_text)
+        except openai.RateLimitError as e:
+            raise RateLimited("openai", parse_retry_after(e.response.headers.get("retry-after")))
+        except _transient_llm_errors():
+            if attempt == attempts - 1:
+                raise
+            count("retries")
+            await asyncio.sleep(2 ** attempt)
+
+async def _complete(prompt_text: str, mode: str, estimated_tokens: int, agent: str, route: str, chain):
     """
-    encoder = tiktoken.get_encoding("cl100k_base")
-    prompt_tokens = len(encoder.encode(prompt_text))
-    completion_tokens = len(encoder.encode(completion_text))
-    return prompt_tokens + completion_tokens
+    Runs one completion in the given LLM mode on the agent's model chain.
+    Returns a tuple: (content, usage, model) with usage as {"prompt_tokens",
+    "completion_tokens"}, or None if the response didn't report it.
 
-async def call_llm(prompt_template, input_data, schema):
+    Batch calls go to the first model of the chain; slow answers are what
+    batch mode trades for its price, so they don't fall back.
     """
-    Calls the LLM with a prompt and parses the output using the specified Pydantic schema.
+    if mode == "batch":
+        model = chain[0]
+        content, usage = await batch_collector.complete(prompt_text, model, get_settings().llm_temperature)
+        if not usage:
+            return content, None, model
+        usage = {"prompt_tokens": usage["prompt_tokens"], "completion_tokens": usage["completion_tokens"]}
+        return content, usage, model
+
+    async def attempt(model: str, slo: Optional[float]):
+        # Only the last model of the chain (no SLO) waits out rate limits and retries
+        last = slo is None
+        return await model_limiter(model).call(_invoke_llm, prompt_text, model, attempts=3 if last else 1,
+                                               tokens=estimated_tokens, retries=None if last else 0, timeout=slo)
+
+    message, model = await model_router.run(agent, route, chain, attempt)
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return message.content, None, model
+    usage = {"prompt_tokens": usage["input_tokens"], "completion_tokens": usage["output_tokens"]}
+    return message.content, usage, model
+
+async def call_llm(agent: str, input_data, governor: BudgetGovernor = None, force: bool = False,
+                   mode: str = "realtime", routes: Optional[Dict[str, str]] = None):
+    """
+    Calls the LLM with the agent's precompiled prompt and parses the output
+    according to its Pydantic schema.
     Returns a tuple: (parsed_output, tokens_used).
+
+    In "batch" mode the call is queued for the OpenAI Batch API and waits
+    until its batch has been processed (see llm_batch.py).
+
+    Responses are served from the LLM cache when possible; cached responses
+    cost no tokens.
+
+    If a governor is given, the prompt tokens plus an estimated completion are
+    reserved before the call and BudgetExhausted is raised if they don't fit.
+
+    The model comes from the agent's route (see model_routing.py), which
+    per-task `routes` can override; realtime calls fall back along the
+    route's model chain.
+
+    Every call runs in an "llm" telemetry span carrying its tokens, cost,
+    cache hit and retries.
     
     Note: This function does NOT update the state.
     """
-    parser = JsonOutputParser(pydantic_object=schema)
-    prompt = PromptTemplate(
-        template=prompt_template,
-        input_variables=[k for k in input_data.keys()],
-        partial_variables={"format_instructions": parser.get_format_instructions()}
-    )
+    compiled = PROMPT_REGISTRY[agent]
     formatted_input = {k: v for k, v in input_data.items() if k != "state"}
-    prompt_text = prompt.format(**formatted_input)
-    
-    chain = prompt | llm | parser
-    output_obj = await chain.ainvoke(formatted_input)
-    
-    completion_text = str(output_obj)
-    used_tokens = count_tokens(prompt_text, completion_text)
-    return output_obj, used_tokens
+    prompt_text = compiled.prompt.format(**formatted_input)
+
+    route, chain = model_router.route(agent, routes)
+    async with telemetry.span("llm", agent, provider="openai", model=chain[0], route=route, mode=mode) as span:
+        # Keyed by the route's first model, whichever model of the chain answers
+        keys = cache_keys(agent, chain[0], get_settings().llm_temperature, compiled.schema_fingerprint,
+                          prompt_text, formatted_input)
+        cached_output = await llm_cache.lookup(agent, keys)
+        if cached_output is not None:
+            span.set("cache_hit", True)
+            return cached_output, 0
+
+        prompt_tokens = await run_cpu_bound(count_tokens, prompt_text)
+        estimated_tokens = prompt_tokens + ESTIMATED_COMPLETION_TOKENS
+        reserved = 0
+        if governor is not None:
+            reserved = estimated_tokens
+            if not governor.reserve("tokens", reserved, force=force):
+                raise BudgetExhausted("tokens")
+
+        try:
+            content, usage, model = await _complete(prompt_text, mode, estimated_tokens, agent, route, chain)
+            # Parsing can run in the CPU pool
+            output_obj = await run_cpu_bound(parse_json_markdown, content)
+        except BaseException:
+            if governor is not None:
+                governor.settle("tokens", reserved, 0)
+            raise
+
+        if usage is None:
+            usage = {"prompt_tokens": prompt_tokens,
+                     "completion_tokens": await run_cpu_bound(count_tokens, content)}
+        used_tokens = usage["prompt_tokens"] + usage["completion_tokens"]
+        span.set("prompt_tokens", usage["prompt_tokens"])
+        span.set("completion_tokens", usage["completion_tokens"])
+        model_router.record_usage(agent, model, usage["prompt_tokens"], usage["completion_tokens"])
+        span.set("model", model)
+        span.set("cost_usd", estimate_cost(model, usage["prompt_tokens"], usage["completion_tokens"],
+                                           batch=mode == "batch"))
+        if governor is not None:
+            governor.settle("tokens", reserved, used_tokens)
+        await llm_cache.store(agent, keys, output_obj)
+        return output_obj, used_tokens
+
+def llm_mode(state: ProspectingAgentState) -> str:
+    return state.get("llm_mode") or "realtime"
+
+def model_routes(state: ProspectingAgentState) -> Optional[Dict[str, str]]:
+    return state.get("model_routes")
+
+def selection_mode(state: ProspectingAgentState) -> str:
+    return state.get("selection_mode") or SELECTION_MODE
 
 ###########################
 # Refactored Agents as Async Functions
@@ -85,13 +249,23 @@ async def interpretation_agent(state: ProspectingAgentState) -> Dict[str, Any]:
         "seller_profile": state.get("seller_profile", ""),
         "business_info": state.get("business_info", {}),
         "report_draft": state.get("report_draft", ""),
-        "exploration_results": state.get("exploration_results", "")
+        "exploration_results": await content_store.get_many(state.get("exploration_results") or [])
     }
-    response, tokens_used = await call_llm(interpretation_agent_prompt, input_data, InterpretationOutput)
+    # Always interpret what was gathered, even when the budget ran dry.
+    governor = BudgetGovernor(state)
+    response, tokens_used = await call_llm("interpretation", input_data, governor=governor, force=True,
+                                          mode=llm_mode(state), routes=model_routes(state))
     print(colored("Report draft updated with exploration results.", 'cyan'))
-    # Return a partial state update:
+    # Return a partial state update. The round's questions, queries, URLs and
+    # exploration results are consumed; the planner starts the next round
+    # from a clean slate.
     return {
         "report_draft": response["report_draft"],
+        "round_count": state.get("round_count", 0) + 1,
+        "research_questions": "DELETE",
+        "queries_with_contexts": "DELETE",
+        "urls_with_contexts": "DELETE",
+        "exploration_results": [],
         "total_tokens_used": tokens_used
     }
 
@@ -107,7 +281,13 @@ async def planner_agent(state: ProspectingAgentState) -> Dict[str, Any]:
         "scratchpad": state.get("scratchpad", "")
     }
     
-    response, tokens_used = await call_llm(planner_agent_prompt, input_data, PlannerOutput)
+    governor = BudgetGovernor(state)
+    try:
+        response, tokens_used = await call_llm("planner", input_data, governor=governor, mode=llm_mode(state),
+                                              routes=model_routes(state))
+    except BudgetExhausted:
+        print(colored("Token budget exhausted, skipping planning.", 'yellow'))
+        return {"budget_exhausted": True}
     print("Response", response, tokens_used)
     return {
         "scratchpad": response["scratchpad"],
@@ -115,26 +295,95 @@ async def planner_agent(state: ProspectingAgentState) -> Dict[str, Any]:
         "total_tokens_used": tokens_used
     }
 
+async def generate_queries(state: ProspectingAgentState, question: str, governor: BudgetGovernor):
+    """
+    Generates search queries and a search context for one research question.
+    Returns a tuple: (query_context, tokens_used). query_context is None if the
+    budget didn't allow the call; otherwise it holds the search queries and
+    the direct URLs the LLM suggested ("search_urls") separately.
+    """
+    input_data = {
+        "seller_profile": state.get("seller_profile", ""),
+        "business_info": state.get("business_info", {}),
+        "report_draft": state.get("report_draft", ""),
+        "scratchpad": state.get("scratchpad", ""),
+        "research_question": question
+    }
+    print("QG: Calling llm with, Input data", input_data)
+    try:
+        response, tokens_used = await call_llm("query_generation", input_data, governor=governor,
+                                              mode=llm_mode(state), routes=model_routes(state))
+    except BudgetExhausted:
+        return None, 0
+    return ({
+        "research_question": question,
+        "search_queries": [q for q in response["search_queries"] if not q.startswith("http")],
+        "search_urls": [u for u in response["search_queries"] if u.startswith("http")],
+        "search_context": response["search_context"],
+    }, tokens_used)
+
+async def search_and_select(state: ProspectingAgentState, query_context: Dict[str, Any],
+                            governor: BudgetGovernor):
+    """
+    Runs the searches of one research question in parallel and selects
+    promising results: the LLM picks among all of them, the local reranker
+    picks alone, or the LLM picks among the reranker's shortlist, depending
+    on the task's selection mode (see reranker.py). Results found by several
+    queries are shown once, in a dense rendering instead of the raw API items.
+    Returns a tuple: (urls_with_context, searches_made, tokens_used, tokens_saved)
+    where tokens_saved estimates the prompt tokens the raw items would have cost
+    on top. urls_with_context is None if nothing was found or the budget ran out.
+    """
+    # Create tasks for parallel searches, as far as the search budget allows
+    search_tasks = [
+        search(q) for q in query_context["search_queries"]
+        if governor.reserve("google_searches")
+    ]
+
+    # Execute searches in parallel
+    result_lists = await asyncio.gather(*search_tasks)
+    search_results = merge_results(result_lists)
+
+    if not search_results:
+        return None, len(search_tasks), 0, 0
+
+    raw_tokens = sum(result["raw_tokens"] for results in result_lists for result in results)
+    urls_and_context = {
+        "research_question": query_context["research_question"],
+        "search_context": query_context["search_context"]
+    }
+    mode = selection_mode(state)
+    if mode != "llm":
+        ranked = await rerank(search_results, query_context["research_question"], query_context["search_context"],
+                              query_context["search_queries"], (state.get("business_info") or {}).get("website"))
+        shortlist = [result for result, _ in ranked[:RERANK_TOP_K if mode == "local" else RERANK_SHORTLIST]]
+        # Nothing for the LLM to break a tie on
+        if mode == "local" or len(shortlist) <= RERANK_TOP_K:
+            urls_and_context["search_urls"] = [result["url"] for result in shortlist[:RERANK_TOP_K]]
+            return urls_and_context, len(search_tasks), 0, raw_tokens
+        search_results = shortlist
+
+    # Process results with LLM
+    rendered = render_results(search_results)
+    tokens_saved = max(0, raw_tokens - count_tokens(rendered))
+    input_data = {
+        "research_question": query_context["research_question"],
+        "search_context": query_context["search_context"],
+        "search_results": rendered
+    }
+    try:
+        response, tokens_used = await call_llm("select_search_results", input_data, governor=governor,
+                                              mode=llm_mode(state), routes=model_routes(state))
+    except BudgetExhausted:
+        return None, len(search_tasks), 0, 0
+    urls_and_context["search_urls"] = response["selected_results"]
+    return urls_and_context, len(search_tasks), tokens_used, tokens_saved
+
 async def query_generation_agent(state: ProspectingAgentState) -> Dict[str, Any]:
     """
     Generates Google search queries and a search context for each research question.
     """
-    async def process_question(question: str, s: Dict[str, Any]):
-        input_data = {
-            "seller_profile": s.get("seller_profile", ""),
-            "business_info": s.get("business_info", {}),
-            "report_draft": s.get("report_draft", ""),
-            "scratchpad": s.get("scratchpad", ""),
-            "research_question": question
-        }
-        print("QG: Calling llm with, Input data", input_data)
-        response, tokens_used = await call_llm(query_generation_agent_prompt, input_data, QueryGenerationOutput)
-        return ({
-            "research_question": question,
-            "search_queries": response["search_queries"],
-            "search_context": response["search_context"],
-        }, tokens_used)
-
+    governor = BudgetGovernor(state)
     queries_with_contexts = []
     urls_with_contexts = []
     total_tokens_spent = 0
@@ -142,22 +391,21 @@ async def query_generation_agent(state: ProspectingAgentState) -> Dict[str, Any]
     # Ensure we have at most 2 research questions
     assert(len(state.get("research_questions", [])) <= 2)
 
-    tasks = [process_question(question, state) for question in state.get("research_questions", [])]
+    tasks = [generate_queries(state, question, governor) for question in state.get("research_questions", [])]
     
     for task in asyncio.as_completed(tasks):
         result, tokens_used = await task
-        
-        queries = [q for q in result["search_queries"] if not q.startswith("http")]
-        urls = [u for u in result["search_queries"] if u.startswith("http")]
+        if result is None:
+            continue
         
         queries_with_contexts.append({
             "research_question": result["research_question"],
-            "search_queries": queries,
+            "search_queries": result["search_queries"],
             "search_context": result["search_context"]
         })
         urls_with_contexts.append({
             "research_question": result["research_question"],
-            "search_urls": urls,
+            "search_urls": result["search_urls"],
             "search_context": result["search_context"]
         })
 
@@ -165,11 +413,14 @@ async def query_generation_agent(state: ProspectingAgentState) -> Dict[str, Any]
 
     print(colored("Generated search queries for research questions.", 'cyan'))
 
-    return {
+    update = {
         "queries_with_contexts": queries_with_contexts,
         "urls_with_contexts": urls_with_contexts,
         "total_tokens_used": total_tokens_spent
     }
+    if governor.exhausted:
+        update["budget_exhausted"] = True
+    return update
 
 async def select_search_results_agent(state: ProspectingAgentState) -> Dict[str, Any]:
     """
@@ -177,128 +428,411 @@ async def select_search_results_agent(state: ProspectingAgentState) -> Dict[str,
     """
     urls_with_contexts = []
     total_tokens_spent = 0
+    total_tokens_saved = 0
     google_searches_made = 0
+    governor = BudgetGovernor(state)
 
-    async def process_query_context(query_context: Dict[str, Any]):
-        # Create tasks for parallel searches
-        search_tasks = [search(q) for q in query_context["search_queries"]]
-        
-        # Execute searches in parallel
-        all_search_results = []
-        for coro in asyncio.as_completed(search_tasks):
-            results = await coro
-            nonlocal google_searches_made
-            google_searches_made += 1
-            all_search_results.extend(results)
-
-        # Process results with LLM
-        input_data = {
-            "research_question": query_context["research_question"],
-            "search_context": query_context["search_context"],
-            "search_results": all_search_results
-        }
-        response, tokens_used = await call_llm(select_search_results_prompt, input_data, SelectedSearchResults)
-        urls_and_context = {
-            "research_question": query_context["research_question"],
-            "search_urls": response["selected_results"],
-            "search_context": query_context["search_context"]
-        }
-        return urls_and_context, tokens_used
-
-    tasks = [process_query_context(qc) for qc in state.get("queries_with_contexts", [])]
+    tasks = [search_and_select(state, qc, governor) for qc in state.get("queries_with_contexts", [])]
     
     for task in asyncio.as_completed(tasks):
-        result, tokens = await task
-        urls_with_contexts.append(result)
+        result, searches, tokens, tokens_saved = await task
+        if result is not None:
+            urls_with_contexts.append(result)
+        google_searches_made += searches
         total_tokens_spent += tokens
+        total_tokens_saved += tokens_saved
 
-    return {
+    if total_tokens_saved:
+        print(colored(f"Compact search results saved ~{total_tokens_saved} prompt tokens.", 'cyan'))
+    update = {
         "urls_with_contexts": urls_with_contexts,
         "num_google_searches": google_searches_made,
-        "total_tokens_used": total_tokens_spent
+        "total_tokens_used": total_tokens_spent,
+        "search_tokens_saved": total_tokens_saved
     }
+    if governor.exhausted:
+        update["budget_exhausted"] = True
+    return update
+
+async def prefilter_page(state: ProspectingAgentState, url_context: Dict[str, Any], page_text: str,
+                         governor: BudgetGovernor):
+    """
+    Decides whether a page deserves full extraction. First, if enabled, a
+    local check of how many query terms the page covers, then, if enabled, a
+    cheap LLM usefulness check on the best-matching snippet.
+    Returns a tuple: (useful, tokens_used).
+    """
+    query = f"{url_context['research_question']} {url_context['search_context']}"
+    if PREFILTER_MIN_COVERAGE > 0 and term_coverage(query, page_text) < PREFILTER_MIN_COVERAGE:
+        return False, 0
+
+    if not state.get("prefilter_llm", PREFILTER_LLM):
+        return True, 0
+
+    input_data = {
+        "research_question": url_context["research_question"],
+        "search_context": url_context["search_context"],
+        "page_content": best_passages(query, page_text, PREFILTER_SNIPPET_WORDS)
+    }
+    try:
+        response, tokens_used = await call_llm("page_usefulness", input_data, governor=governor,
+                                              mode=llm_mode(state), routes=model_routes(state))
+    except BudgetExhausted:
+        # Can't afford the check; the extraction below will hit the same wall
+        return True, 0
+    return bool(response.get("useful")), tokens_used
+
+async def extract_page_info(state: ProspectingAgentState, url_context: Dict[str, Any], content: str,
+                            governor: BudgetGovernor) -> Dict[str, Any]:
+    """
+    Strips and chunks a fetched page, runs the pre-filter, then extracts info
+    from the chunks in parallel and merges the results.
+
+    Returns a dict with the merged ExtractedInfo under "info" (None if the
+    page was filtered out or no chunk fit the token budget), "tokens_used",
+    and for filtered pages "filtered" and the estimated "tokens_saved".
+    """
+    chunks = await run_cpu_bound(prepare_page, content)
+    useful, filter_tokens = await prefilter_page(state, url_context, "\n\n".join(chunks), governor)
+    if not useful:
+        chunk_tokens = sum([await run_cpu_bound(count_tokens, chunk) for chunk in chunks])
+        estimated_cost = chunk_tokens + len(chunks) * ESTIMATED_COMPLETION_TOKENS
+        return {"info": None, "tokens_used": filter_tokens, "filtered": True,
+                "tokens_saved": max(0, estimated_cost - filter_tokens)}
+
+    calls = []
+    for chunk in chunks:
+        input_data = {
+            "seller_profile": state.get("seller_profile", ""),
+            "business_info": state.get("business_info", {}),
+            "research_question": url_context["research_question"],
+            "search_context": url_context["search_context"],
+            "page_content": chunk
+        }
+        calls.append(call_llm("extract_info", input_data, governor=governor, mode=llm_mode(state),
+                              routes=model_routes(state)))
+
+    # Chunks that no longer fit the token budget are dropped
+    results = await asyncio.gather(*calls, return_exceptions=True)
+    responses = []
+    tokens_used = filter_tokens
+    for result in results:
+        if isinstance(result, BudgetExhausted):
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        responses.append(result[0])
+        tokens_used += result[1]
+
+    info = merge_extracted_info(responses) if responses else None
+    return {"info": info, "tokens_used": tokens_used}
+
+def summarize_page(url: str, research_question: str, response: Dict[str, Any]) -> Optional[str]:
+    """
+    Renders the info extracted from one page for the interpretation agent.
+    """
+    summary_lines = []
+    if response["relevant_info"]:
+        summary_lines.append("**Relevant Info:**")
+        summary_lines.extend(f"- {info}" for info in response["relevant_info"])
+    if response["conflicts"]:
+        summary_lines.append("**Conflicts Detected:**")
+        summary_lines.extend(f"- {c}" for c in response["conflicts"])
+    if response["interesting_insights"]:
+        summary_lines.append("**Interesting Insights:**")
+        summary_lines.extend(f"- {insight}" for insight in response["interesting_insights"])
+    if response["seller_benefit_possibilities"]:
+        summary_lines.append("**Seller Benefit Possibilities:**")
+        summary_lines.extend(f"- {possibility}" for possibility in response["seller_benefit_possibilities"])
+
+    if not summary_lines:
+        return None
+    return (
+        f"### Extracted info from: {url}\n"
+        f"### Trying to research: {research_question}\n"
+        + "\n".join(summary_lines)
+    )
+
+class RoundExplorer:
+    """
+    Fetches and extracts the pages of one research round, page by page, and
+    keeps the round's counters. Shared by the staged extract_info node and
+    the pipelined research_pipeline node.
+
+    Pages already visited in an earlier round, by URL or by near-duplicate
+    content, are neither fetched nor extracted again; their earlier
+    extraction is reused when it was made for a different research question.
+    """
+
+    def __init__(self, state: ProspectingAgentState, governor: BudgetGovernor):
+        self.state = state
+        self.governor = governor
+        self.round_number = state.get("round_count", 0) + 1
+        self.visited = state.get("visited_pages") or {}
+        self.new_visited: Dict[str, Dict[str, Any]] = {}
+        # (research question, canonical URL) pairs explored this round
+        self.claimed = set()
+
+        self.items_extracted = 0
+        # Content store references of the round's page extractions
+        self.summaries = []
+        self.tokens_used = 0
+        self.page_fetches = 0
+        self.pages_filtered = 0
+        self.tokens_saved = 0
+        self.url_duplicates = 0
+        self.content_duplicates = 0
+
+    def _reuse(self, earlier: Dict[str, Any], question: str):
+        # Same question: the interpretation agent has already seen this page
+        if earlier.get("summary_ref") and earlier["research_question"] != question:
+            self.summaries.append(earlier["summary_ref"])
+
+    async def explore(self, url: str, url_context: Dict[str, Any]):
+        """
+        Fetches one page and extracts from it as soon as its content arrives.
+        """
+        question = url_context["research_question"]
+        canonical = canonicalize_url(url)
+        if (question, canonical) in self.claimed:
+            return
+        self.claimed.add((question, canonical))
+
+        earlier = find_url(self.visited, url)
+        if earlier is not None:
+            self.url_duplicates += 1
+            self._reuse(earlier, question)
+            return
+        # Only fetch as many pages as the fetch budget allows
+        if not self.governor.reserve("page_fetches"):
+            return
+
+        content = await fetch_page(url)
+        self.page_fetches += 1
+        if not content:
+            return
+
+        page_fingerprint = await run_cpu_bound(fingerprint, content)
+        earlier = find_content(self.visited, page_fingerprint)
+        if earlier is not None:
+            self.content_duplicates += 1
+            self._reuse(earlier, question)
+            etag, last_modified = native_fetcher.validators(url)
+            self.new_visited[canonical] = {**earlier, "url": url, "etag": etag, "last_modified": last_modified,
+                                           "probed": False}
+            return
+
+        result = await extract_page_info(self.state, url_context, content, self.governor)
+        self.tokens_used += result["tokens_used"]
+        if result.get("filtered"):
+            self.pages_filtered += 1
+            self.tokens_saved += result["tokens_saved"]
+        response = result["info"]
+        summary_ref = None
+        if response is not None:
+            self.items_extracted += len(response["relevant_info"])
+            page_summary = summarize_page(url, question, response)
+            if page_summary:
+                summary_ref = await content_store.put(page_summary)
+                self.summaries.append(summary_ref)
+        etag, last_modified = native_fetcher.validators(url)
+        self.new_visited[canonical] = visited_entry(url, question, url_context["search_context"],
+                                                    self.round_number, page_fingerprint, summary_ref,
+                                                    etag, last_modified)
+
+    async def explore_all(self, url_context: Dict[str, Any]):
+        await asyncio.gather(*(self.explore(url, url_context) for url in url_context.get("search_urls", [])))
+
+    def update(self) -> Dict[str, Any]:
+        """
+        The round's partial state update.
+        """
+        print(colored(f"Extracted info from {self.items_extracted} items.", 'cyan'))
+        if self.pages_filtered:
+            print(colored(f"Pre-filter skipped {self.pages_filtered} pages, "
+                          f"saving ~{self.tokens_saved} tokens.", 'cyan'))
+        if self.url_duplicates or self.content_duplicates:
+            print(colored(f"Skipped {self.url_duplicates} already visited URLs and "
+                          f"{self.content_duplicates} duplicate pages.", 'cyan'))
+        update = {
+            # A page reused for several questions is interpreted once
+            "exploration_results": list(dict.fromkeys(self.summaries)),
+            "num_page_fetches": self.page_fetches,
+            "total_tokens_used": self.tokens_used,
+            "pages_filtered": self.pages_filtered,
+            "prefilter_tokens_saved": self.tokens_saved,
+            "visited_pages": self.new_visited,
+            "duplicates_avoided": [{"round": self.round_number, "urls": self.url_duplicates,
+                                    "content": self.content_duplicates}]
+        }
+        if self.governor.exhausted:
+            update["budget_exhausted"] = True
+        return update
 
 async def extract_info_agent(state: ProspectingAgentState) -> Dict[str, Any]:
     """
     Fetches webpage content and extracts relevant information using the LLM.
     """
-    extracted_info_all = []
-    exploration_summaries = []
-    total_tokens_spent = 0
-    page_fetches = 0
+    explorer = RoundExplorer(state, BudgetGovernor(state))
+    await asyncio.gather(*(explorer.explore_all(uc) for uc in state.get("urls_with_contexts", [])))
+    return explorer.update()
 
-    async def process_url_context(url_context: Dict[str, Any]):
-        nonlocal page_fetches
-        
-        fetches = [fetch_page(url) for url in url_context.get("search_urls", [])]
-        
-        # Wait for all fetches to complete
-        fetch_results = await asyncio.gather(*fetches)
-        page_fetches += len(fetch_results)
-        
-        processing_tasks = []
-        for url, content_coro in zip(url_context["search_urls"], fetch_results):
-            content = await content_coro
-            if not content:
-                continue
-
-            input_data = {
-                "seller_profile": state.get("seller_profile", ""),
-                "business_info": state.get("business_info", {}),
-                "research_question": url_context["research_question"],
-                "search_context": url_context["search_context"],
-                "page_content": content
-            }
-            processing_tasks.append(call_llm(extract_info_prompt, input_data, ExtractedInfo))
-
-        # Process all pages in parallel
-        results = await asyncio.gather(*processing_tasks)
-        
-        local_summaries = []
-        local_info = []
-        
-        for (response, tokens_used), url in zip(results, url_context["search_urls"]):
-            nonlocal total_tokens_spent
-            total_tokens_spent += tokens_used
-            local_info.extend(response["relevant_info"])
-
-            summary_lines = []
-            if response["relevant_info"]:
-                summary_lines.append("**Relevant Info:**")
-                summary_lines.extend(f"- {info}" for info in response["relevant_info"])
-            if response["conflicts"]:
-                summary_lines.append("**Conflicts Detected:**")
-                summary_lines.extend(f"- {c}" for c in response["conflicts"])
-            if response["interesting_insights"]:
-                summary_lines.append("**Interesting Insights:**")
-                summary_lines.extend(f"- {insight}" for insight in response["interesting_insights"])
-            if response["seller_benefit_possibilities"]:
-                summary_lines.append("**Seller Benefit Possibilities:**")
-                summary_lines.extend(f"- {possibility}" for possibility in response["seller_benefit_possibilities"])
-
-            if summary_lines:
-                page_summary = (
-                    f"### Extracted info from: {url}\n"
-                    f"### Trying to research: {url_context['research_question']}\n"
-                    + "\n".join(summary_lines)
+async def _cancel_all(tasks):
+    """
+    Cancels the tasks and waits until they have finished unwinding.
+    """
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def research_pipeline_agent(state: ProspectingAgentState) -> Dict[str, Any]:
+    """
+    Pipelined alternative to query_generation -> select_search_results ->
+    extract_info: every research question flows through its own pipeline.
+    Direct URLs from query generation are fetched while the searches still
+    run, and each page is extracted as soon as its content arrives, so one
+    slow search or page no longer holds back the whole round.
+    """
+    governor = BudgetGovernor(state)
+    explorer = RoundExplorer(state, governor)
+    google_searches_made = 0
+    search_tokens_saved = 0
+
+    async def run_question(question: str):
+        nonlocal google_searches_made, search_tokens_saved
+        query_context, tokens_used = await generate_queries(state, question, governor)
+        explorer.tokens_used += tokens_used
+        if query_context is None:
+            return
+
+        url_context = {
+            "research_question": question,
+            "search_context": query_context["search_context"],
+        }
+        # Direct URLs start fetching right away
+        explorations = [
+            asyncio.create_task(explorer.explore(url, url_context))
+            for url in query_context["search_urls"]
+        ]
+        try:
+            selected, searches, tokens_used, tokens_saved = await search_and_select(state, query_context, governor)
+            google_searches_made += searches
+            search_tokens_saved += tokens_saved
+            explorer.tokens_used += tokens_used
+            if selected is not None:
+                explorations.extend(
+                    asyncio.create_task(explorer.explore(url, url_context)) for url in selected["search_urls"]
                 )
-                local_summaries.append(page_summary)
-        
-        return local_info, local_summaries
+            await asyncio.gather(*explorations)
+        except BaseException:
+            await _cancel_all(explorations)
+            raise
 
-    tasks = [process_url_context(uc) for uc in state.get("urls_with_contexts", [])]
-    results = await asyncio.gather(*tasks)
-    
-    for info, summaries in results:
-        extracted_info_all.extend(info)
-        exploration_summaries.extend(summaries)
+    # Ensure we have at most 2 research questions
+    assert(len(state.get("research_questions", [])) <= 2)
+    questions = [asyncio.create_task(run_question(q)) for q in state.get("research_questions", [])]
+    try:
+        await asyncio.gather(*questions)
+    except BaseException:
+        # One question failed (or the round was cancelled): stop the others too
+        await _cancel_all(questions)
+        raise
+
+    update = explorer.update()
+    update["num_google_searches"] = google_searches_made
+    update["search_tokens_saved"] = search_tokens_saved
+    return update
+
+async def refresh_sources_agent(state: ProspectingAgentState) -> Dict[str, Any]:
+    """
+    Entry node of a refresh run. Loads the prospect's past research and
+    re-checks its sources instead of planning and searching again:
+    sources whose server confirms they are unchanged (ETag/Last-Modified),
+    or that are still fresh, are kept as they are; the rest are fetched, and
+    only those whose content actually changed are extracted again. The new
+    extractions become the exploration results, so the interpretation agent
+    only works through the delta.
+    """
+    stored = await research_store.load(state["prospect_key"])
+    if stored is None:
+        print(colored("No past research for this prospect, researching from scratch.", 'yellow'))
+        return {"refresh": False}
+
+    governor = BudgetGovernor(state)
+    counts = {"checked": 0, "unchanged": 0, "changed": 0, "failed": 0, "skipped": 0}
+    refreshed: Dict[str, Dict[str, Any]] = {}
+    # The store keeps extractions inline; the state only references them
+    texts: Dict[str, Optional[str]] = {}
+    changed = []
+    tokens_used = 0
+    page_fetches = 0
 
-    print(colored(f"Extracted info from {len(extracted_info_all)} items.", 'cyan'))
-    return {
-        "exploration_results": exploration_summaries, 
+    async def refresh(canonical: str, source: Dict[str, Any]):
+        nonlocal tokens_used, page_fetches
+        counts["checked"] += 1
+        source = {**source, "probed": True}
+        texts[canonical] = source.pop("summary", None)
+        refreshed[canonical] = source
+
+        verdict = "unknown"
+        if source.get("etag") or source.get("last_modified"):
+            verdict, source["etag"], source["last_modified"] = await probe(
+                source["url"], source.get("etag"), source.get("last_modified")
+            )
+        if verdict == "unchanged" or (verdict == "unknown" and not is_stale(source)):
+            counts["unchanged"] += 1
+            return
+
+        if not governor.reserve("page_fetches"):
+            counts["skipped"] += 1
+            return
+        content = await fetch_page(source["url"])
+        page_fetches += 1
+        if not content:
+            counts["failed"] += 1
+            return
+        page_fingerprint = await run_cpu_bound(fingerprint, content)
+        source["fetched_at"] = time.time()
+        etag, last_modified = native_fetcher.validators(source["url"])
+        if etag or last_modified:
+            source["etag"], source["last_modified"] = etag, last_modified
+        if source.get("fingerprint") and hamming_distance(source["fingerprint"], page_fingerprint) <= SIMHASH_MAX_DISTANCE:
+            counts["unchanged"] += 1
+            return
+
+        url_context = {"research_question": source["research_question"],
+                       "search_context": source.get("search_context", "")}
+        result = await extract_page_info(state, url_context, content, governor)
+        tokens_used += result["tokens_used"]
+        source["fingerprint"] = page_fingerprint
+        texts[canonical] = None
+        if result["info"] is not None:
+            texts[canonical] = summarize_page(source["url"], source["research_question"], result["info"])
+        if texts[canonical]:
+            changed.append(canonical)
+        counts["changed"] += 1
+
+    await asyncio.gather(*(refresh(canonical, source) for canonical, source in stored["sources"].items()))
+    print(colored(f"Refreshed {counts['checked']} sources: {counts['changed']} changed, "
+                  f"{counts['unchanged']} unchanged.", 'cyan'))
+    for canonical, source in refreshed.items():
+        source["summary_ref"] = await content_store.put(texts[canonical]) if texts[canonical] else None
+    summaries = [refreshed[canonical]["summary_ref"] for canonical in changed]
+
+    update = {
+        # A report draft sent with the request takes precedence over the stored one
+        "report_draft": state.get("report_draft") or stored["report_draft"],
+        "scratchpad": state.get("scratchpad") or stored["scratchpad"],
+        "final_report": stored["final_report"],
+        "exploration_results": summaries,
+        "visited_pages": refreshed,
+        "sources_refreshed": counts,
         "num_page_fetches": page_fetches,
-        "total_tokens_used": total_tokens_spent
+        "total_tokens_used": tokens_used,
     }
+    if governor.exhausted:
+        update["budget_exhausted"] = True
+    return update
 
 async def finalization_agent(state: ProspectingAgentState) -> Dict[str, Any]:
     """
@@ -310,7 +844,10 @@ async def finalization_agent(state: ProspectingAgentState) -> Dict[str, Any]:
         "report_draft": state.get("report_draft", ""),
         "scratchpad": state.get("scratchpad", "")
     }
-    response, tokens_used = await call_llm(finalization_agent_prompt, input_data, FinalReportOutput)
+    # The report is the deliverable: finalization is never cut by the budget.
+    governor = BudgetGovernor(state)
+    response, tokens_used = await call_llm("finalization", input_data, governor=governor, force=True,
+                                          mode=llm_mode(state), routes=model_routes(state))
     print(colored("Final report refined and ready.", 'green'))
     return {
         "final_report": response["final_report"],
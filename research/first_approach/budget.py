@@ -0,0 +1,174 @@
+"""
+budget.py
+
+Enforces the token, search and page-fetch budgets of a research run.
+
+Every node builds a `BudgetGovernor` from its state and reserves from it
+before calling out to the LLM, the search backend or the fetch backend.
+The governor checks two budgets:
+
+1. The per-run limits stored in `ProspectingAgentState` (`max_tokens`,
+   `max_google_searches`, `max_page_fetches`) minus what the run has used.
+2. The process-wide `process_budget`, an hourly allowance shared by every
+   concurrent task. Once half of a window is used up, no task may take more
+   than its fair share, so one heavy prospect cannot starve the others.
+"""
+
+import os
+import time
+from typing import Dict, Optional, Set
+
+from state import ProspectingAgentState
+
+# resource -> (state field holding usage, state field holding the limit)
+BUDGET_FIELDS = {
+    "tokens": ("total_tokens_used", "max_tokens"),
+    "google_searches": ("num_google_searches", "max_google_searches"),
+    "page_fetches": ("num_page_fetches", "max_page_fetches"),
+}
+
+# Completion tokens reserved up front for an LLM call, settled afterwards.
+ESTIMATED_COMPLETION_TOKENS = 1000
+
+
+def _env_limit(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+class BudgetExhausted(Exception):
+    """
+    Raised when a call cannot be made without exceeding a budget.
+    """
+
+    def __init__(self, resource: str):
+        super().__init__(f"Budget exhausted for {resource}")
+        self.resource = resource
+
+
+class ProcessBudget:
+    """
+    Hourly allowance per resource shared by all tasks of this process.
+    A limit of None means unlimited.
+    """
+
+    def __init__(self, limits: Dict[str, Optional[int]], window_seconds: float = 3600,
+                 borrow_fraction: float = 0.5):
+        self.limits = limits
+        self.window_seconds = window_seconds
+        self.borrow_fraction = borrow_fraction
+        self.active_tasks: Set[str] = set()
+        self._reset_window()
+
+    def _reset_window(self):
+        self.window_start = time.monotonic()
+        self.used: Dict[str, int] = {resource: 0 for resource in self.limits}
+        self.used_by_task: Dict[str, Dict[str, int]] = {resource: {} for resource in self.limits}
+
+    def _roll_window(self):
+        if time.monotonic() - self.window_start >= self.window_seconds:
+            self._reset_window()
+
+    def register_task(self, task_id: str):
+        self.active_tasks.add(task_id)
+
+    def unregister_task(self, task_id: str):
+        self.active_tasks.discard(task_id)
+        for per_task in self.used_by_task.values():
+            per_task.pop(task_id, None)
+
+    def try_reserve(self, task_id: Optional[str], resource: str, amount: int, force: bool = False) -> bool:
+        self._roll_window()
+        limit = self.limits.get(resource)
+        task_used = self.used_by_task[resource].get(task_id, 0)
+
+        if limit is not None and not force:
+            if self.used[resource] + amount > limit:
+                return False
+            fair_share = limit / max(1, len(self.active_tasks))
+            over_share = task_used + amount > fair_share
+            if over_share and self.used[resource] + amount > limit * self.borrow_fraction:
+                return False
+
+        self.used[resource] += amount
+        self.used_by_task[resource][task_id] = task_used + amount
+        return True
+
+    def release(self, task_id: Optional[str], resource: str, amount: int):
+        """
+        Gives back the unused part of a reservation.
+        """
+        self.used[resource] = max(0, self.used[resource] - amount)
+        per_task = self.used_by_task[resource]
+        if task_id in per_task:
+            per_task[task_id] = max(0, per_task[task_id] - amount)
+
+    def stats(self) -> Dict:
+        self._roll_window()
+        return {
+            "active_tasks": len(self.active_tasks),
+            "window_seconds": self.window_seconds,
+            "resources": {
+                resource: {"used": self.used[resource], "limit": self.limits[resource]}
+                for resource in self.limits
+            },
+        }
+
+
+process_budget = ProcessBudget({
+    "tokens": _env_limit("GLOBAL_MAX_TOKENS_PER_HOUR"),
+    "google_searches": _env_limit("GLOBAL_MAX_GOOGLE_SEARCHES_PER_HOUR"),
+    "page_fetches": _env_limit("GLOBAL_MAX_PAGE_FETCHES_PER_HOUR"),
+})
+
+
+class BudgetGovernor:
+    """
+    Tracks what a single node invocation may still spend for its run.
+    Build one per node call and share it across that node's fan-out.
+    """
+
+    def __init__(self, state: ProspectingAgentState, process: ProcessBudget = process_budget):
+        self.task_id = state.get("task_id")
+        self.process = process
+        self.remaining: Dict[str, Optional[int]] = {}
+        for resource, (used_field, limit_field) in BUDGET_FIELDS.items():
+            limit = state.get(limit_field)
+            self.remaining[resource] = None if limit is None else limit - state.get(used_field, 0)
+        self.denied: Set[str] = set()
+
+    def reserve(self, resource: str, amount: int = 1, force: bool = False) -> bool:
+        """
+        Reserves `amount` of `resource`. Forced reservations are always granted
+        but still counted; they are used for the calls a usable report cannot
+        do without (interpretation and finalization).
+        """
+        remaining = self.remaining[resource]
+        if not force and remaining is not None and amount > remaining:
+            self.denied.add(resource)
+            return False
+        if not self.process.try_reserve(self.task_id, resource, amount, force=force):
+            self.denied.add(resource)
+            return False
+        if remaining is not None:
+            self.remaining[resource] = remaining - amount
+        return True
+
+    def settle(self, resource: str, reserved: int, actual: int):
+        """
+        Replaces an estimated reservation with the actual amount used.
+        """
+        difference = actual - reserved
+        if difference < 0:
+            self.process.release(self.task_id, resource, -difference)
+        else:
+            self.process.try_reserve(self.task_id, resource, difference, force=True)
+        if self.remaining[resource] is not None:
+            self.remaining[resource] -= difference
+
+    @property
+    def exhausted(self) -> bool:
+        """
+        True once any reservation of this node has been denied.
+        """
+        return bool(self.denied)
@@ -0,0 +1,227 @@
+"""
+cache.py
+
+Async, content-addressed response cache for the search and fetch backends.
+
+Entries are keyed by a hash of a normalized request (canonicalized URL or
+lower-cased query plus the backend name), expire after a per-backend TTL and
+are evicted least-recently-used once the cache holds more than its entry or
+byte cap.
+Concurrent requests for the same key share a single in-flight call.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from telemetry import annotate
+
+
+# Time-to-live per backend namespace. Search results drift faster than
+# company pages, so they expire earlier.
+CACHE_TTLS: Dict[str, timedelta] = {
+    "google": timedelta(days=3),
+    "serpapi": timedelta(days=3),
+    "jina": timedelta(days=7),
+    "firecrawl": timedelta(days=7),
+    # Revalidated with ETag / Last-Modified once expired, see native_fetch.py
+    "native": timedelta(hours=6),
+}
+DEFAULT_TTL = timedelta(days=1)
+
+MAX_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+# Pages can be up to MAX_PAGE_BYTES each, so the entry cap alone doesn't bound memory
+MAX_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Query parameters that never change the content of a page.
+_TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "ref", "ref_src"}
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalizes a URL so trivially different spellings share a cache entry:
+    lower-cased scheme and host, no default port, no fragment, no tracking
+    parameters, sorted query string and no trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ""))
+
+
+def domain_of(url: str) -> str:
+    """
+    Lower-cased host of a URL without a leading "www.".
+    """
+    host = urlsplit(url if "//" in url else f"//{url}").hostname or ""
+    return host.lower().removeprefix("www.")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Lower-cases a search query and collapses whitespace.
+    """
+    return " ".join(query.lower().split())
+
+
+def size_of(value: Any) -> int:
+    """
+    Approximate memory held by a cached value: pages are strings, search
+    results are JSON-like lists of dicts.
+    """
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    return sys.getsizeof(json.dumps(value, default=str))
+
+
+def make_key(namespace: str, normalized: str) -> str:
+    """
+    Content address of a request: sha256 over the backend namespace and the
+    normalized request.
+    """
+    return hashlib.sha256(f"{namespace}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+class AsyncResponseCache:
+    """
+    In-process LRU cache with per-entry expiry and request coalescing.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHE_ENTRIES, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (expires_at, namespace, value, size in bytes)
+        self._entries: "OrderedDict[str, tuple[float, str, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, namespace: str, field: str):
+        counters = self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "evictions": 0})
+        counters[field] += 1
+
+    def _remove(self, key: str):
+        _, _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value, _ = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[timedelta] = None):
+        ttl = ttl or CACHE_TTLS.get(namespace, DEFAULT_TTL)
+        size = size_of(value)
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            # Would evict everything else and still not fit
+            return
+        self._entries[key] = (time.monotonic() + ttl.total_seconds(), namespace, value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            evicted_key, (_, evicted_namespace, _, _) = next(iter(self._entries.items()))
+            self._remove(evicted_key)
+            self._count(evicted_namespace, "evictions")
+
+    async def get_or_fetch(self, namespace: str, normalized: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the cached value for the request or awaits `fetch()` to produce it.
+        Empty results are treated as failures and are not cached.
+        """
+        key = make_key(namespace, normalized)
+        value = self.get(key)
+        if value is not None:
+            self._count(namespace, "hits")
+            annotate("cache_hit", True)
+            return value
+
+        # Someone else is already fetching the same thing: wait for their result.
+        while key in self._inflight:
+            inflight = self._inflight[key]
+            try:
+                value = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Their fetch was abandoned (e.g. a hedged fetch that lost); fetch ourselves
+                if inflight.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+            self._count(namespace, "hits")
+            annotate("cache_hit", True)
+            return value
+
+        self._count(namespace, "misses")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+            if value:
+                self.set(namespace, key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be waiting on the future; mark the exception as retrieved.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for namespace, counters in self._stats.items():
+            lookups = counters["hits"] + counters["misses"]
+            namespaces[namespace] = {
+                **counters,
+                "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+            }
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "namespaces": namespaces,
+        }
+
+
+# Shared by every workflow running in this process
+response_cache = AsyncResponseCache()
+
+
+def cached(namespace: str, normalize: Callable[[str], str]):
+    """
+    Decorator placing `response_cache` in front of a single-argument backend
+    coroutine such as `search_with_google_custom(query)` or `fetch_with_jina(url)`.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(arg):
+            return await response_cache.get_or_fetch(namespace, normalize(arg), lambda: fn(arg))
+        return wrapper
+    return decorator
@@ -0,0 +1,133 @@
+"""
+callbacks.py
+
+Delivers task results to their callback URLs without blocking the event loop.
+
+Results are first written to the durable outbox in the task store, then a
+background dispatcher POSTs them through the shared HTTP session. Failed
+deliveries are retried with exponential backoff until CALLBACK_MAX_ATTEMPTS
+is reached. With CALLBACK_BATCH_SIZE > 1, results due for the same callback
+URL are sent together as {"batch": [...]}.
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from http_client import get_session
+from metrics import LatencyWindow
+from task_store import task_store
+
+
+CALLBACK_MAX_ATTEMPTS = int(os.getenv("CALLBACK_MAX_ATTEMPTS", "8"))
+CALLBACK_BACKOFF_BASE_SECONDS = float(os.getenv("CALLBACK_BACKOFF_BASE_SECONDS", "2"))
+CALLBACK_BACKOFF_MAX_SECONDS = float(os.getenv("CALLBACK_BACKOFF_MAX_SECONDS", "600"))
+# 1 keeps the one-request-per-task payload the Node server expects
+CALLBACK_BATCH_SIZE = int(os.getenv("CALLBACK_BATCH_SIZE", "1"))
+CALLBACK_POLL_SECONDS = float(os.getenv("CALLBACK_POLL_SECONDS", "1"))
+
+
+def backoff_delay(attempts: int) -> float:
+    """
+    Exponential backoff with full jitter for the given number of failed attempts.
+    """
+    ceiling = min(CALLBACK_BACKOFF_MAX_SECONDS, CALLBACK_BACKOFF_BASE_SECONDS * 2 ** attempts)
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class CallbackDispatcher:
+    def __init__(self, batch_size: int = CALLBACK_BATCH_SIZE, max_attempts: int = CALLBACK_MAX_ATTEMPTS):
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max_attempts
+        self._wakeup = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+        # Time from enqueueing a result to its successful delivery
+        self.delivery_latency = LatencyWindow()
+        self.delivered = 0
+        self.failed_attempts = 0
+
+    async def start(self):
+        self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+
+    async def enqueue(self, task_id: str, callback_url: str, payload: Dict[str, Any]):
+        """
+        Durably records a result for delivery and wakes the dispatcher.
+        """
+        await task_store.enqueue_callback(task_id, callback_url, payload)
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await self._dispatch_due()
+            except Exception as e:
+                print(f"Callback dispatcher error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=CALLBACK_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _dispatch_due(self):
+        due = await task_store.due_callbacks()
+        if not due:
+            return
+
+        by_url: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for entry in due:
+            by_url[entry["callback_url"]].append(entry)
+
+        deliveries = []
+        for callback_url, entries in by_url.items():
+            for i in range(0, len(entries), self.batch_size):
+                deliveries.append(self._deliver(callback_url, entries[i:i + self.batch_size]))
+        await asyncio.gather(*deliveries)
+
+    async def _deliver(self, callback_url: str, entries: List[Dict[str, Any]]):
+        ids = [entry["id"] for entry in entries]
+        if self.batch_size > 1:
+            body = {"batch": [entry["payload"] for entry in entries]}
+        else:
+            body = entries[0]["payload"]
+
+        try:
+            session = await get_session()
+            async with session.post(callback_url, json=body) as response:
+                if response.status >= 300:
+                    raise RuntimeError(f"callback returned status {response.status}")
+        except Exception as e:
+            self.failed_attempts += 1
+            attempts = max(entry["attempts"] for entry in entries) + 1
+            give_up = attempts >= self.max_attempts
+            print(f"Callback to {callback_url} failed (attempt {attempts}): {e}")
+            await task_store.reschedule_callbacks(
+                ids, time.time() + backoff_delay(attempts), str(e), give_up
+            )
+            return
+
+        await task_store.mark_callbacks_delivered(ids)
+        now = time.time()
+        for entry in entries:
+            self.delivery_latency.add(now - entry["created_at"])
+        self.delivered += len(entries)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "outbox": await task_store.count_callbacks_by_status(),
+            "delivered": self.delivered,
+            "failed_attempts": self.failed_attempts,
+            "batch_size": self.batch_size,
+            "delivery_latency_seconds": self.delivery_latency.summary(),
+        }
+
+
+callback_dispatcher = CallbackDispatcher()
@@ -0,0 +1,111 @@
+"""
+content_store.py
+
+Content-addressed store for bulky text that would otherwise be copied into
+every LangGraph checkpoint: the rendered page extractions behind
+exploration_results and visited_pages. The state only holds references
+("sha256:<hex>"), so checkpoints stay small however many pages a run
+visits, and text shared by several pages or runs is stored once.
+
+Entries expire CONTENT_STORE_TTL_DAYS after they were last written.
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+CONTENT_STORE_PATH = os.getenv("CONTENT_STORE_PATH", "content_store.sqlite")
+CONTENT_STORE_TTL_SECONDS = float(os.getenv("CONTENT_STORE_TTL_DAYS", "30")) * 86400
+
+# Expire old entries every this many inserts
+_EVICTION_INTERVAL = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS content (
+    ref TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS content_stored_idx ON content(stored_at);
+"""
+
+
+def content_ref(text: str) -> str:
+    return "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ContentStore:
+    def __init__(self, path: str = CONTENT_STORE_PATH, ttl_seconds: float = CONTENT_STORE_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _put(self, ref: str, text: str):
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            # Re-writing known text only refreshes its expiry
+            conn.execute(
+                "INSERT INTO content (ref, text, stored_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(ref) DO UPDATE SET stored_at = excluded.stored_at",
+                (ref, text, now),
+            )
+            self._inserts += 1
+            if self._inserts % _EVICTION_INTERVAL == 0:
+                conn.execute("DELETE FROM content WHERE stored_at < ?", (now - self.ttl_seconds,))
+            conn.commit()
+
+    def _get_many(self, refs: List[str]) -> Dict[str, str]:
+        with self._lock:
+            conn = self._connect()
+            placeholders = ",".join("?" * len(refs))
+            rows = conn.execute(f"SELECT ref, text FROM content WHERE ref IN ({placeholders})", refs).fetchall()
+        return dict(rows)
+
+    async def put(self, text: str) -> str:
+        """
+        Stores a text and returns its reference.
+        """
+        ref = content_ref(text)
+        await asyncio.to_thread(self._put, ref, text)
+        return ref
+
+    async def get_many(self, refs: Iterable[str]) -> List[str]:
+        """
+        The texts behind the given references, in order. Expired or unknown
+        references are left out.
+        """
+        refs = list(refs)
+        if not refs:
+            return []
+        texts = await asyncio.to_thread(self._get_many, list(dict.fromkeys(refs)))
+        return [texts[ref] for ref in refs if ref in texts]
+
+    async def get(self, ref: Optional[str]) -> Optional[str]:
+        if not ref:
+            return None
+        texts = await self.get_many([ref])
+        return texts[0] if texts else None
+
+
+content_store = ContentStore()
@@ -0,0 +1,91 @@
+"""
+dedup.py
+
+Per-run index of visited pages, so later research rounds neither re-fetch a
+URL nor re-extract a page whose content was already seen under another URL
+(mirrors, tracking redirects, print versions, syndicated articles).
+
+Pages are matched by canonical URL and by a 64-bit SimHash of their text;
+two fingerprints within SIMHASH_MAX_DISTANCE bits count as the same content.
+The index lives in ProspectingAgentState, so it is checkpointed with the run.
+"""
+
+import hashlib
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from cache import canonicalize_url
+from relevance import tokenize
+
+
+SIMHASH_BITS = 64
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", "3"))
+
+
+def simhash(text: str) -> int:
+    """
+    SimHash over word 3-shingles, weighted by how often each shingle occurs.
+    """
+    terms = tokenize(text)
+    shingles = Counter(" ".join(terms[i:i + 3]) for i in range(max(1, len(terms) - 2)))
+    weights = [0] * SIMHASH_BITS
+    for shingle, count in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+
+def fingerprint(text: str) -> str:
+    """
+    Hex SimHash of a page; stored as a string so it survives checkpoint serialization.
+    """
+    return f"{simhash(text):016x}"
+
+
+def hamming_distance(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def find_url(visited: Dict[str, Dict[str, Any]], url: str) -> Optional[Dict[str, Any]]:
+    """
+    The index entry for a URL visited in an earlier round, if any.
+    """
+    return visited.get(canonicalize_url(url))
+
+
+def find_content(visited: Dict[str, Dict[str, Any]], page_fingerprint: str,
+                 max_distance: int = SIMHASH_MAX_DISTANCE) -> Optional[Dict[str, Any]]:
+    """
+    The index entry of a page whose content is a near duplicate of the given fingerprint.
+    """
+    for entry in visited.values():
+        if entry.get("fingerprint") and hamming_distance(entry["fingerprint"], page_fingerprint) <= max_distance:
+            return entry
+    return None
+
+
+def visited_entry(url: str, research_question: str, search_context: str, round_number: int,
+                  page_fingerprint: Optional[str] = None, summary_ref: Optional[str] = None,
+                  etag: Optional[str] = None, last_modified: Optional[str] = None) -> Dict[str, Any]:
+    """
+    What the index remembers about a page: where its content came from and
+    a content store reference to the rendered extraction, so a duplicate can
+    reuse it without the text riding along in every checkpoint. The HTTP
+    validators come from the fetch; pages fetched without them are probed
+    when the run is saved to the research store.
+    """
+    return {
+        "url": url,
+        "research_question": research_question,
+        "search_context": search_context,
+        "round": round_number,
+        "fingerprint": page_fingerprint,
+        "summary_ref": summary_ref,
+        "fetched_at": time.time(),
+        "etag": etag,
+        "last_modified": last_modified,
+        "probed": False,
+    }
@@ -1,84 +1,167 @@
 """
 fetch_backends.py
 
-Provides an abstraction layer for different webpage fetching backends,
-such as Jina or Firecrawl.
+Provides an abstraction layer for different webpage fetching backends:
+the built-in native fetcher (see native_fetch.py), Jina or Firecrawl.
+
+Slow fetches are hedged with an alternate backend, and domains that keep
+failing are skipped for a while (see hedging.py).
 """
 
-from getpass import getpass
+import asyncio
 import os
-import aiohttp
-import requests
-from dotenv import load_dotenv
-
-
-def _getpass(env_var: str):
-    if not os.environ.get(env_var):
-        os.environ[env_var] = getpass(f"{env_var}=")
-
-
-# -----------------------------
-# Choose which fetch backend to use here:
-FETCH_BACKEND = "JINA"
-# Options: "JINA" or "FIRECRAWL"
-# -----------------------------
-load_dotenv("../.env")
-
-if FETCH_BACKEND == "JINA":
-    _getpass("JINA_API_KEY")
-    JINA_API_KEY = os.getenv("JINA_API_KEY")
-else:
-    _getpass("FIRECRAWL_API_KEY")
-    FIRECRAWL_API_KEY = os.getenv("FIRECRAWL_API_KEY")
-    
-
-    async def fetch_with_jina(url):
-        """
-        Fetch webpage content using Jina's service. 
-        Returns the text content or empty string on failure.
-        """
-        headers = {"Authorization": f"Bearer {JINA_API_KEY}"}
-        try:
-            async with aiohttp.CachedSession() as session:
-                async with session.get(f"https://r.jina.ai/{url}", headers=headers, timeout=30) as response:
-                    if response.status == 200:
-                        return await response.text()
-                    else:
-                        print(f"Jina returned status {response.status} for URL: {url}")
-                        return ""
-        except Exception as e:
-            print(f"Error fetching page {url} using Jina: {e}")
-            return ""
+import time
 
+from settings import credential, get_settings, has_credential
+from http_client import failure_kind, get_session, read_text_capped
+from cache import cached, canonicalize_url, domain_of
+from rate_limiter import RateLimited, parse_retry_after, rate_limited
+from telemetry import annotate, telemetry
+from hedging import DOMAIN_FAILURES, domain_tracker, hedged
+from native_fetch import fetch_native
 
-    async def fetch_with_firecrawl(url):
-        """
-        Fetch webpage content using Firecrawl's service.
-        Returns the text content or empty string on failure.
-        """
-        headers = {"Authorization": f"Bearer {FIRECRAWL_API_KEY}"}
-        try:
-            async with aiohttp.CachedSession() as session:
-                async with session.get(f"https://api.firecrawl.com/fetch?url={url}", 
-                                    headers=headers, timeout=30) as response:
-                    if response.status == 200:
-                        return await response.text()
-                    else:
-                        print(f"Firecrawl returned status {response.status} for URL: {url}")
-                        return ""
-        except Exception as e:
-            print(f"Error fetching page {url} using Firecrawl: {e}")
-            return ""
+
+# The fetch backend is chosen with FETCH_BACKEND ("NATIVE", "JINA" or
+# "FIRECRAWL", see settings.py); proxy API keys are only looked up once the
+# proxy is used.
+
+# Endpoints, overridable to point at local stand-ins (see benchmarks/)
+JINA_READER_URL = os.getenv("JINA_READER_URL", "https://r.jina.ai/")
+FIRECRAWL_URL = os.getenv("FIRECRAWL_URL", "https://api.firecrawl.com/fetch")
+
+# Backend that hedges slow fetches: "AUTO" hedges the native fetcher with a
+# proxy whose API key is set, and a proxy with the other proxy if its key is
+# set, else the native fetcher; "NONE" turns hedging off.
+FETCH_HEDGE_BACKEND = os.getenv("FETCH_HEDGE_BACKEND", "AUTO").upper()
+# Upper bound for one page, hedge included
+FETCH_TIMEOUT_SECONDS = float(os.getenv("FETCH_TIMEOUT_SECONDS", "45"))
+
+
+@cached("jina", canonicalize_url)
+@rate_limited("jina", fallback="")
+async def fetch_with_jina(url):
+    """
+    Fetch webpage content using Jina's service. 
+    Returns the text content or empty string on failure.
+    """
+    headers = {"Authorization": f"Bearer {credential('JINA_API_KEY')}"}
+    try:
+        session = await get_session()
+        async with session.get(f"{JINA_READER_URL}{url}", headers=headers) as response:
+            if response.status == 200:
+                return await read_text_capped(response)
+            elif response.status == 429:
+                raise RateLimited("jina", parse_retry_after(response.headers.get("Retry-After")))
+            else:
+                print(f"Jina returned status {response.status} for URL: {url}")
+                annotate("fetch_error", failure_kind(status=response.status))
+                return ""
+    except RateLimited:
+        raise
+    except Exception as e:
+        print(f"Error fetching page {url} using Jina: {e}")
+        annotate("fetch_error", failure_kind(e))
+        return ""
+
+
+@cached("firecrawl", canonicalize_url)
+@rate_limited("firecrawl", fallback="")
+async def fetch_with_firecrawl(url):
+    """
+    Fetch webpage content using Firecrawl's service.
+    Returns the text content or empty string on failure.
+    """
+    headers = {"Authorization": f"Bearer {credential('FIRECRAWL_API_KEY')}"}
+    try:
+        session = await get_session()
+        async with session.get(f"{FIRECRAWL_URL}?url={url}", 
+                            headers=headers) as response:
+            if response.status == 200:
+                return await read_text_capped(response)
+            elif response.status == 429:
+                raise RateLimited("firecrawl", parse_retry_after(response.headers.get("Retry-After")))
+            else:
+                print(f"Firecrawl returned status {response.status} for URL: {url}")
+                annotate("fetch_error", failure_kind(status=response.status))
+                return ""
+    except RateLimited:
+        raise
+    except Exception as e:
+        print(f"Error fetching page {url} using Firecrawl: {e}")
+        annotate("fetch_error", failure_kind(e))
+        return ""
+
+
+# Backend name -> (fetch function, provider, API key variable)
+BACKENDS = {
+    "JINA": (fetch_with_jina, "jina", "JINA_API_KEY"),
+    "FIRECRAWL": (fetch_with_firecrawl, "firecrawl", "FIRECRAWL_API_KEY"),
+    "NATIVE": (fetch_native, "native", None),
+}
+
+
+def hedge_backend(primary: str):
+    """
+    Name of the backend that hedges fetches of the primary one, or None.
+    """
+    backend = FETCH_HEDGE_BACKEND
+    if backend == "AUTO":
+        if primary == "NATIVE":
+            proxies = [p for p in ("JINA", "FIRECRAWL") if has_credential(BACKENDS[p][2])]
+            backend = proxies[0] if proxies else "NONE"
+        else:
+            other = "FIRECRAWL" if primary == "JINA" else "JINA"
+            backend = other if has_credential(BACKENDS[other][2]) else "NATIVE"
+    if backend in ("NONE", primary):
+        return None
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown hedge backend '{backend}'")
+    return backend
 
 
 async def fetch_page(url):
     """
     Main abstraction function that calls the appropriate backend
-    based on the FETCH_BACKEND setting at the top of this file.
+    based on the FETCH_BACKEND setting (see settings.py).
+    If it hasn't answered within the domain's usual latency, or fails, the
+    hedge backend is asked too and the first page to arrive wins. Pages the
+    native fetcher can't extract (JavaScript apps, PDFs) go to the proxy
+    right away.
     """
-    if FETCH_BACKEND == "JINA":
-        return fetch_with_jina(url)
-    elif FETCH_BACKEND == "FIRECRAWL":
-        return fetch_with_firecrawl(url)
-    else:
-        raise ValueError(f"Unknown fetch backend '{FETCH_BACKEND}'")
\ No newline at end of file
+    backend = get_settings().fetch_backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown fetch backend '{backend}'")
+    fetch_fn, provider, key_var = BACKENDS[backend]
+    if key_var:
+        # Fail loudly rather than count every page as a failed fetch
+        credential(key_var)
+    alternate = hedge_backend(backend)
+    hedge = None
+    if alternate:
+        hedge_fn, hedge_provider, _ = BACKENDS[alternate]
+        hedge = (hedge_provider, hedge_fn)
+    domain = domain_of(url)
+    async with telemetry.span("fetch", provider, provider=provider, url=url) as span:
+        if not domain_tracker.allow(domain):
+            span.set("circuit_open", True)
+            return ""
+        delay = domain_tracker.hedge_delay(domain)
+        started = time.monotonic()
+        try:
+            content, winner = await asyncio.wait_for(
+                hedged(url, (provider, fetch_fn), hedge, delay),
+                FETCH_TIMEOUT_SECONDS,
+            )
+        except asyncio.TimeoutError:
+            content, winner = "", None
+            span.set("timed_out", True)
+        # Only timeouts, connection errors and 5xx count against the domain;
+        # a 404 on a guessed URL or a PDF says nothing about its health.
+        # Cache hits say nothing about the domain's latency.
+        failed = not content and (span.attributes.get("timed_out")
+                                  or span.attributes.get("fetch_error") in DOMAIN_FAILURES)
+        domain_tracker.record(domain, time.monotonic() - started, not failed,
+                              sample=bool(content) and not span.attributes.get("cache_hit"))
+        span.set("backend", winner)
+        span.set("bytes", len(content or ""))
+        return content
\ No newline at end of file
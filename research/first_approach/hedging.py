@@ -0,0 +1,173 @@
+"""
+hedging.py
+
+Per-domain latency tracking, hedged requests and circuit breaking for page
+fetches (see fetch_page in fetch_backends.py).
+
+A fetch that hasn't answered after the domain's p95 latency is hedged: the
+same page is requested from an alternate backend and whichever returns
+content first wins; the other request is cancelled. A fetch that fails
+quickly falls through to the alternate right away.
+
+Domains that keep failing or timing out trip a circuit breaker: their pages
+are skipped for CIRCUIT_OPEN_SECONDS, then a single trial fetch decides
+whether the circuit closes again. Only timeouts, connection errors and 5xx
+responses count as failures; a 404 or a PDF is the page's problem, not the
+domain's.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from metrics import LatencyWindow, percentile
+
+
+FETCH_HEDGE_PERCENTILE = float(os.getenv("FETCH_HEDGE_PERCENTILE", "95"))
+# Hedge delay before enough latencies were seen, and its bounds afterwards
+FETCH_HEDGE_DEFAULT_DELAY = float(os.getenv("FETCH_HEDGE_DEFAULT_DELAY", "4"))
+FETCH_HEDGE_MIN_DELAY = float(os.getenv("FETCH_HEDGE_MIN_DELAY", "1"))
+FETCH_HEDGE_MAX_DELAY = float(os.getenv("FETCH_HEDGE_MAX_DELAY", "15"))
+FETCH_HEDGE_MIN_SAMPLES = int(os.getenv("FETCH_HEDGE_MIN_SAMPLES", "5"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "300"))
+# Domains tracked at once; the least recently fetched are forgotten first
+MAX_TRACKED_DOMAINS = 5000
+# Fetch errors (see http_client.failure_kind) that count against a domain
+DOMAIN_FAILURES = frozenset({"timeout", "connection", "server_error"})
+
+Fetch = Callable[[str], Awaitable[str]]
+
+
+class DomainHealth:
+    def __init__(self):
+        self.latencies = LatencyWindow(max_samples=50)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+
+class DomainTracker:
+    def __init__(self):
+        self._domains: "OrderedDict[str, DomainHealth]" = OrderedDict()
+        # Latencies across all domains, for domains without enough samples yet
+        self.latencies = LatencyWindow()
+        # Alternate requests fired because the primary was slow / had failed
+        self.hedges = 0
+        self.fallbacks = 0
+        self.alternate_wins = 0
+        self.circuit_skips = 0
+        self.circuits_opened = 0
+
+    def _health(self, domain: str) -> DomainHealth:
+        health = self._domains.get(domain)
+        if health is None:
+            health = self._domains[domain] = DomainHealth()
+            while len(self._domains) > MAX_TRACKED_DOMAINS:
+                self._domains.popitem(last=False)
+        self._domains.move_to_end(domain)
+        return health
+
+    def hedge_delay(self, domain: str) -> float:
+        """
+        Seconds to wait for the primary backend before hedging: the domain's
+        latency percentile, else the percentile over all domains.
+        """
+        for window in (self._health(domain).latencies, self.latencies):
+            samples = window.samples()
+            if len(samples) >= FETCH_HEDGE_MIN_SAMPLES:
+                delay = percentile(samples, FETCH_HEDGE_PERCENTILE)
+                return min(FETCH_HEDGE_MAX_DELAY, max(FETCH_HEDGE_MIN_DELAY, delay))
+        return FETCH_HEDGE_DEFAULT_DELAY
+
+    def allow(self, domain: str) -> bool:
+        """
+        False while the domain's circuit is open. Once it may close again,
+        lets a single trial fetch through and keeps the circuit open for the
+        rest until the trial's outcome is recorded.
+        """
+        health = self._health(domain)
+        if health.consecutive_failures < CIRCUIT_FAILURE_THRESHOLD:
+            return True
+        now = time.monotonic()
+        if now >= health.open_until:
+            health.open_until = now + CIRCUIT_OPEN_SECONDS
+            return True
+        self.circuit_skips += 1
+        return False
+
+    def record(self, domain: str, seconds: float, ok: bool, sample: bool = True):
+        """
+        Records a fetch's outcome; `ok` False counts towards the circuit
+        breaker, `sample` False keeps its latency out of the windows (e.g.
+        for cache hits).
+        """
+        health = self._health(domain)
+        if ok:
+            if sample:
+                health.latencies.add(seconds)
+                self.latencies.add(seconds)
+            health.consecutive_failures = 0
+            return
+        health.consecutive_failures += 1
+        if health.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+            health.open_until = time.monotonic() + CIRCUIT_OPEN_SECONDS
+            self.circuits_opened += 1
+            print(f"Skipping {domain} for {CIRCUIT_OPEN_SECONDS:.0f}s after "
+                  f"{health.consecutive_failures} failed fetches")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        open_circuits = sorted(d for d, h in self._domains.items()
+                               if h.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD and h.open_until > now)
+        return {
+            "domains_tracked": len(self._domains),
+            "latency_seconds": self.latencies.summary(),
+            "hedges": self.hedges,
+            "fallbacks": self.fallbacks,
+            "alternate_wins": self.alternate_wins,
+            "circuits_opened": self.circuits_opened,
+            "circuit_skips": self.circuit_skips,
+            "open_circuits": open_circuits[:50],
+        }
+
+
+domain_tracker = DomainTracker()
+
+
+async def hedged(url: str, primary: Tuple[str, Fetch], alternate: Optional[Tuple[str, Fetch]],
+                 delay: float) -> Tuple[str, Optional[str]]:
+    """
+    Fetches a page from the primary backend, hedging with the alternate one
+    after `delay` seconds or as soon as the primary fails. Returns a tuple:
+    (content, name of the backend that delivered it). The content is empty
+    and the name None if no backend returned anything.
+    """
+    tasks: Dict[asyncio.Task, str] = {asyncio.create_task(primary[1](url)): primary[0]}
+    hedge_started = False
+    try:
+        while tasks:
+            timeout = None if hedge_started or alternate is None else delay
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = tasks.pop(task)
+                content = task.result() if task.exception() is None else ""
+                if content:
+                    if hedge_started and name == alternate[0]:
+                        domain_tracker.alternate_wins += 1
+                    return content, name
+            if alternate is not None and not hedge_started:
+                # The primary is slow (nothing done) or came back empty
+                hedge_started = True
+                if done:
+                    domain_tracker.fallbacks += 1
+                else:
+                    domain_tracker.hedges += 1
+                tasks[asyncio.create_task(alternate[1](url))] = alternate[0]
+        return "", None
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
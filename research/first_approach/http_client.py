@@ -0,0 +1,154 @@
+"""
+http_client.py
+
+Owns the single aiohttp session shared by the search and fetch backends.
+
+The session is opened by the FastAPI lifespan hook in main.py and closed on
+shutdown, so every call to googleapis.com, serpapi.com or r.jina.ai reuses
+pooled keep-alive connections instead of paying a new TCP+TLS handshake.
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urljoin
+
+import aiohttp
+
+from url_safety import UnsafeURL, check_public_url
+
+
+# Pool sizing, overridable from the environment
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "30"))
+HTTP_DNS_CACHE_SECONDS = int(os.getenv("HTTP_DNS_CACHE_SECONDS", "300"))
+# Pages are read up to this many bytes; the rest is never downloaded
+MAX_PAGE_BYTES = int(os.getenv("MAX_PAGE_BYTES", str(1024 * 1024)))
+# Redirects followed by open_public, each hop checked on its own
+MAX_REDIRECTS = int(os.getenv("MAX_REDIRECTS", "5"))
+
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=30)
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+async def open_session() -> aiohttp.ClientSession:
+    """
+    Creates the shared session. Safe to call more than once.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+            ttl_dns_cache=HTTP_DNS_CACHE_SECONDS,
+            use_dns_cache=True,
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=DEFAULT_TIMEOUT)
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """
+    Returns the shared session. Outside of the FastAPI app (notebooks,
+    scripts) the session is opened lazily on first use.
+    """
+    if _session is None or _session.closed:
+        return await open_session()
+    return _session
+
+
+@asynccontextmanager
+async def open_public(method: str, url: str, **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+    """
+    Requests a URL taken from search results or LLM output. The URL and
+    every redirect target must pass url_safety.check_public_url, otherwise
+    UnsafeURL is raised before anything is sent to that host.
+    """
+    session = await get_session()
+    for _ in range(MAX_REDIRECTS + 1):
+        await check_public_url(url)
+        response = await session.request(method, url, allow_redirects=False, **kwargs)
+        location = response.headers.get("Location")
+        if response.status in (301, 302, 303, 307, 308) and location:
+            response.release()
+            url = urljoin(str(response.url), location)
+            continue
+        try:
+            yield response
+        finally:
+            response.release()
+        return
+    raise UnsafeURL(f"More than {MAX_REDIRECTS} redirects")
+
+
+async def read_bytes_capped(response: aiohttp.ClientResponse, max_bytes: int = MAX_PAGE_BYTES) -> bytes:
+    """
+    Streams a response body, stopping after `max_bytes`.
+    """
+    body = bytearray()
+    async for chunk in response.content.iter_chunked(64 * 1024):
+        body.extend(chunk[:max_bytes - len(body)])
+        if len(body) >= max_bytes:
+            break
+    return bytes(body)
+
+
+async def read_text_capped(response: aiohttp.ClientResponse, max_bytes: int = MAX_PAGE_BYTES) -> str:
+    """
+    Streams a response body, stopping after `max_bytes`, and decodes it with
+    the response's charset. A multi-byte character cut at the cap is dropped.
+    """
+    body = await read_bytes_capped(response, max_bytes)
+    try:
+        return body.decode(response.get_encoding(), errors="ignore")
+    except (RuntimeError, LookupError):
+        # No declared charset (aiohttp won't sniff an unread body) or an unknown one
+        return body.decode("utf-8", errors="ignore")
+
+
+def failure_kind(error: Optional[BaseException] = None, status: Optional[int] = None) -> str:
+    """
+    Classifies a failed request for the per-domain circuit breaker (see
+    hedging.DOMAIN_FAILURES): "timeout", "connection", "server_error",
+    "client_error" or "error".
+    """
+    if error is None:
+        return "server_error" if status is not None and status >= 500 else "client_error"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, (aiohttp.ClientConnectionError, OSError)):
+        return "connection"
+    return "error"
+
+
+def pool_stats() -> Dict[str, int]:
+    """
+    Reports connections currently in use (open), kept alive for reuse (idle)
+    and requests queued for a free connection (waiting).
+    """
+    if _session is None or _session.closed:
+        return {"open": 0, "idle": 0, "waiting": 0, "limit": HTTP_POOL_LIMIT,
+                "limit_per_host": HTTP_POOL_LIMIT_PER_HOST}
+
+    # aiohttp has no public API for this; read the connector bookkeeping.
+    connector = _session.connector
+    idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+    waiting = sum(len(waiters) for waiters in getattr(connector, "_waiters", {}).values())
+    return {
+        "open": len(getattr(connector, "_acquired", ())),
+        "idle": idle,
+        "waiting": waiting,
+        "limit": HTTP_POOL_LIMIT,
+        "limit_per_host": HTTP_POOL_LIMIT_PER_HOST,
+    }
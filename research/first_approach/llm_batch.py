@@ -0,0 +1,206 @@
+"""
+llm_batch.py
+
+Batch execution mode for LLM calls, for runs where throughput per dollar
+matters more than latency (overnight flows).
+
+Instead of a real-time chat completion, call_llm hands the rendered prompt
+to the BatchCollector and waits. The collector gathers the prompts of every
+workflow in the process and, every LLM_BATCH_FLUSH_SECONDS or once
+LLM_BATCH_MAX_REQUESTS are waiting, uploads them as one JSONL file to the
+OpenAI Batch API. It then polls the batch until it is done and hands each
+waiting call its completion.
+
+OPENAI_BATCH_BASE_URL points the client at a stand-in server for local runs
+(see benchmarks/stand_ins/openai_api.py).
+
+Batches in flight live only in memory: after a restart, the interrupted
+workflows resume from their checkpoint and submit their calls again.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from metrics import LatencyWindow
+
+
+LLM_BATCH_FLUSH_SECONDS = float(os.getenv("LLM_BATCH_FLUSH_SECONDS", "60"))
+LLM_BATCH_MAX_REQUESTS = int(os.getenv("LLM_BATCH_MAX_REQUESTS", "5000"))
+LLM_BATCH_POLL_SECONDS = float(os.getenv("LLM_BATCH_POLL_SECONDS", "30"))
+LLM_BATCH_COMPLETION_WINDOW = os.getenv("LLM_BATCH_COMPLETION_WINDOW", "24h")
+OPENAI_BATCH_BASE_URL = os.getenv("OPENAI_BATCH_BASE_URL") or None
+
+# Batch states after which no more results will appear
+_TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchRequestFailed(Exception):
+    """
+    Raised to a waiting call whose request failed or was missing from the batch output.
+    """
+
+
+class BatchCollector:
+    def __init__(self, flush_seconds: float = LLM_BATCH_FLUSH_SECONDS,
+                 max_requests: int = LLM_BATCH_MAX_REQUESTS, poll_seconds: float = LLM_BATCH_POLL_SECONDS,
+                 base_url: Optional[str] = OPENAI_BATCH_BASE_URL):
+        self.flush_seconds = flush_seconds
+        self.max_requests = max_requests
+        self.poll_seconds = poll_seconds
+        self.base_url = base_url
+        self._client: Optional["openai.AsyncOpenAI"] = None
+        self._ids = itertools.count()
+        # custom_id -> (request line, future awaiting its completion)
+        self._pending: Dict[str, Tuple[Dict[str, Any], asyncio.Future]] = {}
+        self._full = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._batch_tasks = set()
+        # Time from a call entering the collector to its completion
+        self.turnaround = LatencyWindow()
+        self.batches_submitted = 0
+        self.requests_completed = 0
+        self.requests_failed = 0
+
+    @property
+    def client(self) -> "openai.AsyncOpenAI":
+        if self._client is None:
+            # Imported on first use, it takes a noticeable part of startup
+            import openai
+            self._client = openai.AsyncOpenAI(base_url=self.base_url)
+        return self._client
+
+    async def start(self):
+        self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = [t for t in (self._loop_task, *self._batch_tasks) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+        self._batch_tasks.clear()
+        for _, future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+
+    async def complete(self, prompt_text: str, model: str, temperature: float) -> Tuple[str, Optional[Dict[str, int]]]:
+        """
+        Queues a chat completion for the next batch and waits for it.
+        Returns a tuple: (content, usage) with usage as OpenAI reports it.
+        """
+        if self._loop_task is None:
+            # Outside of the FastAPI app (notebooks, scripts) start on first use
+            await self.start()
+        custom_id = f"req-{next(self._ids)}-{int(time.time())}"
+        line = {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                "temperature": temperature,
+                "messages": [{"role": "user", "content": prompt_text}],
+            },
+        }
+        future = asyncio.get_running_loop().create_future()
+        self._pending[custom_id] = (line, future)
+        if len(self._pending) >= self.max_requests:
+            self._full.set()
+
+        started = time.monotonic()
+        try:
+            return await future
+        finally:
+            self._pending.pop(custom_id, None)
+            self.turnaround.add(time.monotonic() - started)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            self._flush()
+
+    def _flush(self):
+        waiting = {cid: entry for cid, entry in self._pending.items() if not entry[1].done()}
+        for cid in waiting:
+            self._pending.pop(cid)
+        if not waiting:
+            return
+        task = asyncio.create_task(self._submit_and_wait(waiting))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def _submit_and_wait(self, requests: Dict[str, Tuple[Dict[str, Any], asyncio.Future]]):
+        try:
+            jsonl = "\n".join(json.dumps(line) for line, _ in requests.values()).encode("utf-8")
+            input_file = await self.client.files.create(file=("batch.jsonl", jsonl), purpose="batch")
+            batch = await self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window=LLM_BATCH_COMPLETION_WINDOW,
+            )
+            self.batches_submitted += 1
+            print(f"Submitted LLM batch {batch.id} with {len(requests)} requests")
+
+            while batch.status not in _TERMINAL_STATES:
+                await asyncio.sleep(self.poll_seconds)
+                batch = await self.client.batches.retrieve(batch.id)
+
+            results = {}
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    results.update(await self._read_results(file_id))
+            self._resolve(requests, results, batch.status)
+        except asyncio.CancelledError:
+            for _, future in requests.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in requests.values():
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _read_results(self, file_id: str) -> Dict[str, Dict[str, Any]]:
+        content = await self.client.files.content(file_id)
+        results = {}
+        for line in content.text.splitlines():
+            if line.strip():
+                result = json.loads(line)
+                results[result["custom_id"]] = result
+        return results
+
+    def _resolve(self, requests: Dict[str, Tuple[Dict[str, Any], asyncio.Future]],
+                 results: Dict[str, Dict[str, Any]], batch_status: str):
+        for custom_id, (_, future) in requests.items():
+            if future.done():
+                continue
+            result = results.get(custom_id)
+            response = (result or {}).get("response") or {}
+            if result is None or result.get("error") or response.get("status_code") != 200:
+                self.requests_failed += 1
+                detail = (result or {}).get("error") or response.get("body") or f"batch {batch_status}"
+                future.set_exception(BatchRequestFailed(f"{custom_id}: {detail}"))
+                continue
+            body = response["body"]
+            self.requests_completed += 1
+            future.set_result((body["choices"][0]["message"]["content"], body.get("usage")))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "waiting_to_submit": len(self._pending),
+            "batches_in_flight": len(self._batch_tasks),
+            "batches_submitted": self.batches_submitted,
+            "requests_completed": self.requests_completed,
+            "requests_failed": self.requests_failed,
+            "turnaround_seconds": self.turnaround.summary(),
+        }
+
+
+batch_collector = BatchCollector()
@@ -0,0 +1,193 @@
+"""
+llm_cache.py
+
+Disk-backed cache of parsed LLM responses for call_llm.
+
+Exact mode keys an entry on the model, temperature, output schema and a hash
+of the fully rendered prompt, so re-running a flow for the same business or
+the same search results costs nothing. Near-duplicate mode (opt-in with
+LLM_CACHE_NEAR_DUPLICATES=1) additionally lets extract_info calls share an
+entry whenever the page content, research question, search context and
+prospect match, ignoring whitespace and the rest of the prompt.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_DAYS", "14")) * 86400
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+LLM_CACHE_NEAR_DUPLICATES = os.getenv("LLM_CACHE_NEAR_DUPLICATES", "0") == "1"
+
+# Agents whose calls may be served from near-duplicate entries
+NEAR_DUPLICATE_AGENTS = {"extract_info"}
+
+# Check the size cap every this many inserts
+_EVICTION_INTERVAL = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    agent TEXT,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS llm_cache_access_idx ON llm_cache(last_access);
+"""
+
+
+def _sha256(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def _normalize_text(text: Any) -> str:
+    return " ".join(str(text).lower().split())
+
+
+def schema_fingerprint(schema) -> str:
+    """
+    Stable hash of a Pydantic schema; compute once per schema.
+    """
+    return _sha256(schema.__name__, json.dumps(schema.model_json_schema(), sort_keys=True))
+
+
+def exact_key(model: str, temperature: float, schema_hash: str, prompt_text: str) -> str:
+    return _sha256("exact", model, str(temperature), schema_hash, _sha256(prompt_text))
+
+
+def _normalize_value(value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        return _normalize_text(json.dumps(value, sort_keys=True, ensure_ascii=False))
+    return _normalize_text(value)
+
+
+def near_duplicate_key(model: str, schema_hash: str, input_data: Dict[str, Any]) -> str:
+    """
+    Key for extract_info over identical (whitespace/case-normalized) page
+    content, for the same research question, search context, seller and
+    prospect; two prospects reading the same page never share an entry.
+    """
+    return _sha256(
+        "near", model, schema_hash,
+        _normalize_text(input_data.get("research_question", "")),
+        _normalize_text(input_data.get("search_context", "")),
+        _normalize_text(input_data.get("seller_profile", "")),
+        _normalize_value(input_data.get("business_info", "")),
+        _sha256(_normalize_text(input_data.get("page_content", ""))),
+    )
+
+
+class LLMCache:
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            return json.loads(row[0])
+
+    def _set(self, key: str, agent: Optional[str], response: Any):
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, agent, response, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, agent, json.dumps(response), now, now),
+            )
+            self._inserts += 1
+            if self._inserts % _EVICTION_INTERVAL == 0:
+                self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def _count(self, agent: Optional[str], field: str):
+        counters = self._stats.setdefault(agent or "unknown", {"hits": 0, "near_hits": 0, "misses": 0})
+        counters[field] += 1
+
+    async def lookup(self, agent: Optional[str], keys: Dict[str, str]) -> Optional[Any]:
+        """
+        Looks up the exact key, then the near-duplicate key if one is given.
+        """
+        response = await asyncio.to_thread(self._get, keys["exact"])
+        if response is not None:
+            self._count(agent, "hits")
+            return response
+        if keys.get("near"):
+            response = await asyncio.to_thread(self._get, keys["near"])
+            if response is not None:
+                self._count(agent, "near_hits")
+                return response
+        self._count(agent, "misses")
+        return None
+
+    async def store(self, agent: Optional[str], keys: Dict[str, str], response: Any):
+        for key in keys.values():
+            if key:
+                await asyncio.to_thread(self._set, key, agent, response)
+
+    def stats(self) -> Dict[str, Any]:
+        agents = {}
+        for agent, counters in self._stats.items():
+            lookups = counters["hits"] + counters["near_hits"] + counters["misses"]
+            hits = counters["hits"] + counters["near_hits"]
+            agents[agent] = {**counters, "hit_rate": round(hits / lookups, 3) if lookups else 0.0}
+        return {
+            "near_duplicates": LLM_CACHE_NEAR_DUPLICATES,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "agents": agents,
+        }
+
+
+llm_cache = LLMCache()
+
+
+def cache_keys(agent: Optional[str], model: str, temperature: float, schema_hash: str,
+               prompt_text: str, input_data: Dict[str, Any]) -> Dict[str, str]:
+    keys = {"exact": exact_key(model, temperature, schema_hash, prompt_text)}
+    if LLM_CACHE_NEAR_DUPLICATES and agent in NEAR_DUPLICATE_AGENTS:
+        keys["near"] = near_duplicate_key(model, schema_hash, input_data)
+    return keys
@@ -1,86 +1,424 @@
+import asyncio
+import json
+import os
+import time
 import uuid
 import traceback
-from typing import Dict, Any
-from fastapi import FastAPI, BackgroundTasks, Request
-from pydantic import BaseModel
-import requests
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Literal, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 
 # Import your LangGraph workflow code
 from research_graph import create_research_graph
+from state import create_default_state
+from budget import process_budget
+from cache import response_cache
+from llm_cache import llm_cache
+from task_store import UNFINISHED_STATUSES, task_store
+from callbacks import callback_dispatcher
+from rate_limiter import limiter_stats
+from worker_pool import QueueFull, worker_pool, batch_mode_pool, pool_for, start_cpu_pool, stop_cpu_pool
+from llm_batch import batch_collector
+from research_store import research_store, prospect_key
+from hedging import domain_tracker
+from model_routing import model_router
+from native_fetch import native_fetcher
+from content_store import content_store
+from telemetry import telemetry
+from metrics import loop_lag, peak_memory_mb, process_age_seconds
+import http_client
 
-# Pre-compile the workflow at startup
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "checkpoints.sqlite")
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "200"))
+# A batch stream re-checks its tasks at least this often
+BATCH_STREAM_POLL_SECONDS = 5.0
+
+# The graph is built at import; it is compiled with its checkpointer on startup
 graph = create_research_graph()
-workflow = graph.compile()
+workflow = None
+# Notified whenever a task reaches a terminal state, to wake batch streams
+task_finished = asyncio.Condition()
+# Seconds from process start until the app was imported, until it was ready
+# and until the LLM clients were built
+cold_start: Dict[str, Optional[float]] = {}
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Opens the pooled HTTP session shared by the search and fetch backends,
+    the task store, the LangGraph checkpointer, the callback dispatcher and
+    the worker pool, then
+    resumes the tasks that were interrupted by the last shutdown. The LLM
+    clients are built in the background after that.
+    """
+    global workflow
+    cold_start["imported_after_seconds"] = process_age_seconds()
+    startup_began = time.monotonic()
+    await http_client.open_session()
+    await task_store.open()
+    await telemetry.start()
+    await loop_lag.start()
+    start_cpu_pool()
+    async with AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB_PATH) as checkpointer:
+        workflow = graph.compile(checkpointer=checkpointer)
+        await callback_dispatcher.start()
+        await batch_collector.start()
+        await worker_pool.start()
+        await batch_mode_pool.start()
+        await resume_unfinished_tasks()
+        cold_start["startup_seconds"] = round(time.monotonic() - startup_began, 3)
+        cold_start["ready_after_seconds"] = process_age_seconds()
+        print(f"Ready after {cold_start['ready_after_seconds']}s "
+              f"(startup {cold_start['startup_seconds']}s)")
+        warm_up = asyncio.create_task(warm_up_models())
+        yield
+        warm_up.cancel()
+        await batch_mode_pool.stop()
+        await worker_pool.stop()
+        await batch_collector.stop()
+        await callback_dispatcher.stop()
+    stop_cpu_pool()
+    await loop_lag.stop()
+    await telemetry.stop()
+    task_store.close()
+    research_store.close()
+    content_store.close()
+    await http_client.close_session()
 
-# Simple in-memory storage for tasks (not persistent!)
-TASKS: Dict[str, str] = {}
+async def warm_up_models():
+    await model_router.warm_up()
+    cold_start["models_warm_after_seconds"] = process_age_seconds()
 
-class TaskRequest(BaseModel):
-    # You can adjust fields as needed
+app = FastAPI(lifespan=lifespan)
+
+class ResearchOptions(BaseModel):
+    """
+    Settings of a research run, shared by single tasks and batches.
+    """
     callback_url: str
     seller_profile: str = "We offer AI-driven marketing automation solutions."
+    max_rounds: int = 1
+    # Per-run budgets; defaults come from create_default_state
+    max_tokens: Optional[int] = None
+    max_google_searches: Optional[int] = None
+    max_page_fetches: Optional[int] = None
+    # Higher priorities leave the admission queue first
+    priority: int = 0
+    # Cheap LLM usefulness check before full page extraction; defaults to PREFILTER_LLM
+    prefilter_llm: Optional[bool] = None
+    # "pipelined" streams each research question through search, selection and extraction
+    execution_mode: Optional[Literal["staged", "pipelined"]] = None
+    # "batch" sends LLM calls through the OpenAI Batch API: slower, but half the price
+    llm_mode: Optional[Literal["realtime", "batch"]] = None
+    # How search results are chosen: by the LLM, by the local reranker alone,
+    # or by the LLM from the reranker's shortlist; defaults to SELECTION_MODE
+    selection_mode: Optional[Literal["llm", "local", "hybrid"]] = None
+    # Model tier ("cheap", "strong") or model name per agent, e.g.
+    # {"finalization": "gpt-4o"}; defaults to the routing table in model_routing.py
+    model_routes: Optional[Dict[str, str]] = None
+    # Re-check the prospect's stored research instead of researching from scratch
+    refresh: bool = False
+
+    @field_validator("model_routes")
+    @classmethod
+    def check_model_routes(cls, routes: Optional[Dict[str, str]]) -> Optional[Dict[str, str]]:
+        if routes:
+            model_router.validate_routes(routes)
+        return routes
+
+class TaskRequest(ResearchOptions):
+    # You can adjust fields as needed
     business_info: dict = {
         "business_name": "Acme Corp",
         "website": "https://www.acmecorp.com"
     }
     report_draft: str = ""
     scratchpad: str = ""
-    max_rounds: int = 1
+    # Key of the prospect's stored research; defaults to its website host or name
+    prospect_id: Optional[str] = None
+
+class BatchRequest(ResearchOptions):
+    # One entry per prospect, all researched for the same seller
+    businesses: List[dict] = Field(min_length=1)
+
+# ResearchOptions fields copied into the initial state when set
+OPTIONAL_STATE_FIELDS = ("max_tokens", "max_google_searches", "max_page_fetches", "prefilter_llm",
+                         "execution_mode", "llm_mode", "selection_mode", "model_routes")
+
+def build_initial_state(task_id: str, options: ResearchOptions, business_info: dict,
+                        report_draft: str = "", scratchpad: str = "", prospect_id: Optional[str] = None) -> dict:
+    initial_state = create_default_state(options.seller_profile, business_info)
+    initial_state.update({
+        "task_id": task_id,
+        "prospect_key": prospect_key(business_info, prospect_id),
+        "refresh": options.refresh,
+        "report_draft": report_draft,
+        "scratchpad": scratchpad,
+        "log_steps": True,
+        "max_rounds": options.max_rounds,
+        "round_count": 0,
+    })
+    for optional_field in OPTIONAL_STATE_FIELDS:
+        if getattr(options, optional_field) is not None:
+            initial_state[optional_field] = getattr(options, optional_field)
+    return initial_state
 
 @app.post("/submit-task")
-async def submit_task(request: TaskRequest, background_tasks: BackgroundTasks):
+async def submit_task(request: TaskRequest):
     """
     Submits a task to run the LangGraph workflow in the background.
-    Returns a task_id immediately.
+    Returns a task_id immediately, or 429 if the admission queue is full.
     """
+    pool = pool_for(request.llm_mode)
+    if pool.is_full():
+        raise HTTPException(status_code=429, detail="Too many queued tasks, retry later",
+                            headers={"Retry-After": "30"})
     task_id = str(uuid.uuid4())
-    TASKS[task_id] = "pending"
 
     # Prepare initial state for the workflow
-    initial_state = {
-        "seller_profile": request.seller_profile,
-        "business_info": request.business_info,
-        "report_draft": request.report_draft,
-        "scratchpad": request.scratchpad,
-        "log_steps": True,
-        "max_rounds": request.max_rounds,
-        "round_count": 0,
-    }
+    initial_state = build_initial_state(task_id, request, request.business_info,
+                                        request.report_draft, request.scratchpad, request.prospect_id)
+    await task_store.create_task(task_id, request.callback_url, initial_state)
 
-    # Add a background task to run the workflow
-    background_tasks.add_task(run_workflow, task_id, request.callback_url, initial_state)
+    # Queue the workflow for the worker pool
+    try:
+        pool.submit(
+            task_id, lambda: run_workflow(task_id, request.callback_url, initial_state),
+            priority=request.priority,
+        )
+    except QueueFull as e:
+        await task_store.set_status(task_id, "rejected", error=str(e))
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
     
     return {"task_id": task_id, "status": "accepted"}
 
-async def run_workflow(task_id: str, callback_url: str, state: dict):
+@app.post("/submit-batch")
+async def submit_batch(request: BatchRequest):
+    """
+    Submits one task per prospect, all for the same seller, as one batch.
+    The batch is admitted as a whole or rejected with 429. Its tasks run
+    side by side, so searches, page fetches and LLM calls they share are
+    done once through the response and LLM caches. Every prospect gets its
+    own callback, and GET /batches/{batch_id}/stream streams the results
+    as they complete.
+    """
+    if len(request.businesses) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=422, detail=f"A batch holds at most {MAX_BATCH_SIZE} prospects")
+    pool = pool_for(request.llm_mode)
+    if pool.depth + len(request.businesses) > pool.max_queue:
+        raise HTTPException(status_code=429, detail="Too many queued tasks, retry later",
+                            headers={"Retry-After": "30"})
+    batch_id = str(uuid.uuid4())
+
+    tasks = []
+    for business_info in request.businesses:
+        task_id = str(uuid.uuid4())
+        initial_state = build_initial_state(task_id, request, business_info)
+        await task_store.create_task(task_id, request.callback_url, initial_state, batch_id=batch_id)
+        tasks.append((task_id, initial_state))
+
+    # The capacity check above holds: nothing else can submit between it and here
+    for task_id, initial_state in tasks:
+        pool.submit(
+            task_id,
+            lambda task_id=task_id, initial_state=initial_state: run_workflow(
+                task_id, request.callback_url, initial_state, batch_id=batch_id),
+            priority=request.priority,
+        )
+
+    return {"batch_id": batch_id, "task_ids": [task_id for task_id, _ in tasks], "status": "accepted"}
+
+@app.get("/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    """
+    Returns the status of every task in a batch.
+    """
+    tasks = await task_store.batch_tasks(batch_id)
+    if not tasks:
+        raise HTTPException(status_code=404, detail=f"Unknown batch '{batch_id}'")
+    counts: Dict[str, int] = {}
+    for task in tasks:
+        counts[task["status"]] = counts.get(task["status"], 0) + 1
+    return {"batch_id": batch_id, "status_counts": counts, "tasks": tasks}
+
+@app.get("/batches/{batch_id}/stream")
+async def stream_batch(batch_id: str):
+    """
+    Streams the batch's results as newline-delimited JSON, one line per
+    prospect as soon as its task finishes, and ends once all have finished.
+    """
+    if not await task_store.batch_tasks(batch_id):
+        raise HTTPException(status_code=404, detail=f"Unknown batch '{batch_id}'")
+
+    async def finished_tasks():
+        reported = set()
+        while True:
+            tasks = await task_store.batch_tasks(batch_id)
+            for task in tasks:
+                if task["task_id"] not in reported and task["status"] not in UNFINISHED_STATUSES:
+                    reported.add(task["task_id"])
+                    yield json.dumps(task) + "\n"
+            if len(reported) == len(tasks):
+                return
+            async with task_finished:
+                try:
+                    await asyncio.wait_for(task_finished.wait(), timeout=BATCH_STREAM_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    return StreamingResponse(finished_tasks(), media_type="application/x-ndjson")
+
+@app.get("/tasks/{task_id}")
+async def get_task(task_id: str):
+    """
+    Returns the status of a task, and its result once it has completed.
+    """
+    task = await task_store.get_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Unknown task '{task_id}'")
+    return task
+
+async def resume_unfinished_tasks():
+    """
+    Restarts every task that was pending or running when the service stopped.
+    Runs with a checkpoint continue from their last completed node.
+    """
+    for task in await task_store.unfinished_tasks():
+        print(f"Resuming task {task['task_id']}")
+        pool_for(task["initial_state"].get("llm_mode")).submit(
+            task["task_id"],
+            lambda task=task: run_workflow(task["task_id"], task["callback_url"], task["initial_state"],
+                                           resume=True, batch_id=task["batch_id"]),
+            force=True,
+        )
+
+@app.get("/healthz")
+async def healthz():
+    """
+    Readiness probe: 200 once the workflow is compiled and the worker pools
+    run, 503 before. Cheap enough to poll at a high rate.
+    """
+    if workflow is None:
+        raise HTTPException(status_code=503, detail="Starting up")
+    return {"status": "ok", "cold_start": cold_start}
+
+@app.get("/stats")
+async def get_stats():
+    """
+    Reports runtime statistics of the service's shared components.
+    """
+    return {
+        "response_cache": response_cache.stats(),
+        "llm_cache": llm_cache.stats(),
+        "http_pool": http_client.pool_stats(),
+        "process_budget": process_budget.stats(),
+        "tasks": await task_store.count_by_status(),
+        "worker_pool": worker_pool.stats(),
+        "batch_mode_pool": batch_mode_pool.stats(),
+        "llm_batches": batch_collector.stats(),
+        "callbacks": await callback_dispatcher.stats(),
+        "research_store": await research_store.stats(),
+        "fetch_domains": domain_tracker.stats(),
+        "native_fetch": native_fetcher.stats(),
+        "model_routes": model_router.stats(),
+        "rate_limits": limiter_stats(),
+        "cold_start": cold_start,
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Reports p50/p95/p99 latencies, errors, cache hits, tokens and cost per
+    graph node, LLM agent, search and fetch backend and provider, plus
+    event loop lag and peak memory.
+    """
+    return {
+        **telemetry.metrics(),
+        "event_loop_lag_seconds": loop_lag.lag.summary(),
+        "peak_memory_mb": peak_memory_mb(),
+    }
+
+def run_stats(final_state: dict) -> Dict[str, Any]:
+    """
+    What a finished run spent and saved, reported alongside the final report.
+    """
+    return {
+        "rounds": final_state.get("round_count", 0),
+        "total_tokens_used": final_state.get("total_tokens_used", 0),
+        "num_google_searches": final_state.get("num_google_searches", 0),
+        "num_page_fetches": final_state.get("num_page_fetches", 0),
+        "budget_exhausted": final_state.get("budget_exhausted", False),
+        "pages_filtered": final_state.get("pages_filtered", 0),
+        "prefilter_tokens_saved": final_state.get("prefilter_tokens_saved", 0),
+        "search_tokens_saved": final_state.get("search_tokens_saved", 0),
+        "duplicates_avoided": final_state.get("duplicates_avoided", []),
+        "sources_refreshed": final_state.get("sources_refreshed"),
+        # Size of the final checkpointed state; stays flat as rounds increase
+        "state_bytes": len(json.dumps(final_state, default=str)),
+    }
+
+async def run_workflow(task_id: str, callback_url: str, state: dict, resume: bool = False,
+                       batch_id: Optional[str] = None):
     """
     Background task that runs the LangGraph workflow and then sends the result
-    or an error to the callback URL.
+    or an error to the callback URL. The task id doubles as the checkpoint
+    thread id, so a resumed run picks up after its last completed node.
+    Callbacks of batch tasks carry their batch_id.
     """
+    batch_fields = {"batch_id": batch_id} if batch_id else {}
+    process_budget.register_task(task_id)
+    config = {"configurable": {"thread_id": task_id}}
     try:
-        TASKS[task_id] = "running"
+        await task_store.set_status(task_id, "running")
 
-        # Actually run the workflow
-        final_state = await workflow.ainvoke(state)
+        # Actually run the workflow, from its checkpoint if there is one
+        final_state = None
+        workflow_input = state
+        if resume:
+            snapshot = await workflow.aget_state(config)
+            if snapshot.values:
+                # Continue from the checkpoint; a run that already reached END only reports
+                workflow_input = None
+                if not snapshot.next:
+                    final_state = snapshot.values
+        if final_state is None:
+            async with telemetry.span("run", "research_workflow", trace_id=task_id, resume=resume):
+                final_state = await workflow.ainvoke(workflow_input, config)
         final_report = final_state.get("final_report")
+        result = {"final_report": final_report, "stats": run_stats(final_state)}
 
-        TASKS[task_id] = "completed"
-
-        # Send final result to the callback
-        requests.post(callback_url, json={
+        # Hand the final result to the callback outbox before marking the task
+        # done, so a crash in between redelivers instead of losing the report
+        await callback_dispatcher.enqueue(task_id, callback_url, {
             "task_id": task_id,
+            **batch_fields,
             "status": "completed",
-            "result": {"final_report": final_report}
+            "result": result
         })
+        await task_store.set_status(task_id, "completed", result=result)
+
+        # Keep the research for the next refresh of this prospect
+        try:
+            key = final_state.get("prospect_key") or prospect_key(final_state.get("business_info", {}))
+            await research_store.save_run(key, final_state)
+        except Exception as e:
+            print(f"Could not store the research of task {task_id}: {e}")
     except Exception as e:
-        TASKS[task_id] = "error"
         error_message = f"{type(e).__name__}: {str(e)}\nTraceback: {traceback.format_exc()}"
 
-        # Send error details to callback
-        requests.post(callback_url, json={
+        # Hand the error details to the callback outbox before marking the
+        # task failed, as for completed tasks
+        await callback_dispatcher.enqueue(task_id, callback_url, {
             "task_id": task_id,
+            **batch_fields,
             "status": "error",
             "message": error_message
-        })
\ No newline at end of file
+        })
+        await task_store.set_status(task_id, "error", error=error_message)
+    finally:
+        process_budget.unregister_task(task_id)
+        async with task_finished:
+            task_finished.notify_all()
@@ -0,0 +1,101 @@
+"""
+metrics.py
+
+Small helpers for the latency figures reported under /stats and /metrics.
+"""
+
+import asyncio
+import os
+import resource
+import sys
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+
+def percentile(samples: Iterable[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class LatencyWindow:
+    """
+    Keeps the most recent samples (in seconds) and summarizes them.
+    """
+
+    def __init__(self, max_samples: int = 1000):
+        self._samples: deque = deque(maxlen=max_samples)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def samples(self) -> list:
+        return list(self._samples)
+
+    def summary(self) -> Dict[str, float]:
+        samples = list(self._samples)
+        return {
+            "count": len(samples),
+            "avg": round(sum(samples) / len(samples), 3) if samples else 0.0,
+            "p50": round(percentile(samples, 50), 3),
+            "p95": round(percentile(samples, 95), 3),
+            "p99": round(percentile(samples, 99), 3),
+            "max": round(max(samples), 3) if samples else 0.0,
+        }
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: how much later than scheduled a periodic
+    wake-up runs. Sustained lag means something blocks the loop.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.lag = LatencyWindow()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            scheduled = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag.add(max(0.0, time.monotonic() - scheduled))
+
+
+loop_lag = LoopLagMonitor()
+
+
+def peak_memory_mb() -> float:
+    """
+    Peak resident set size of this process.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def process_age_seconds() -> Optional[float]:
+    """
+    Seconds since this process was started, from /proc (Linux only).
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces; fields resume after its ")"
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    return round(uptime - started, 3)
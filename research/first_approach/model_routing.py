@@ -0,0 +1,255 @@
+"""
+model_routing.py
+
+Routes each LLM agent to a model tier, with fallbacks.
+
+Every agent (graph node) is mapped to a tier, "cheap" or "strong"; a tier
+is an ordered chain of models. All agents default to the cheap tier
+(gpt-4o-mini, as before routing existed); the strong tier is opt-in through
+MODEL_ROUTES or a task's model_routes. A call goes to the first model of its chain
+that isn't cooling down after a 429. It falls through to the next model
+when the model fails (rate limit, connection or server error) or doesn't
+answer within the tier's latency SLO, counted from when its rate limiter
+lets the call start (each model has its own limiter, see rate_limiter.py).
+The last model of a chain gets no SLO, and gets the rate limiter's usual
+retries, so a call only fails when every model in its chain has failed.
+
+Configuration (env):
+- MODEL_TIER_CHEAP / MODEL_TIER_STRONG: comma-separated model chains,
+- MODEL_SLO_SECONDS_CHEAP / MODEL_SLO_SECONDS_STRONG: per-call latency SLOs,
+- MODEL_ROUTES: overrides of DEFAULT_ROUTES, e.g. "interpretation=strong,finalization=strong".
+
+Tasks can override routes too (TaskRequest.model_routes). A route may
+also name a model directly; the agent's tier chain then serves as its fallback.
+
+Latency, errors, SLO breaches and tokens are tracked per agent and model
+and reported under /stats.
+"""
+
+import asyncio
+import os
+import time
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from metrics import LatencyWindow
+from rate_limiter import RateLimited
+from settings import get_settings, load_env
+from tokenization import get_encoder
+
+
+DEFAULT_ROUTES: Dict[str, str] = {
+    "planner": "cheap",
+    "interpretation": "cheap",
+    "query_generation": "cheap",
+    "select_search_results": "cheap",
+    "page_usefulness": "cheap",
+    "extract_info": "cheap",
+    "finalization": "cheap",
+}
+DEFAULT_TIERS: Dict[str, str] = {
+    "cheap": "gpt-4o-mini,gpt-4.1-mini",
+    "strong": "gpt-4o,gpt-4o-mini",
+}
+DEFAULT_SLO_SECONDS: Dict[str, float] = {"cheap": 30.0, "strong": 90.0}
+# A model that answered 429 is skipped for this long if no Retry-After was given
+MODEL_COOLDOWN_SECONDS = float(os.getenv("MODEL_COOLDOWN_SECONDS", "10"))
+
+
+
+@lru_cache(maxsize=1)
+def fallback_errors() -> Tuple[type, ...]:
+    """
+    Failures that move a call on to the next model of its chain. Built on
+    first use: importing openai takes a noticeable part of startup.
+    """
+    import openai
+    return (RateLimited, asyncio.TimeoutError, openai.APIConnectionError, openai.APITimeoutError,
+            openai.InternalServerError, openai.NotFoundError, openai.PermissionDeniedError)
+
+
+def _parse_routes(value: str) -> Dict[str, str]:
+    routes = {}
+    for item in value.split(","):
+        if "=" in item:
+            agent, route = item.split("=", 1)
+            routes[agent.strip()] = route.strip()
+    return routes
+
+
+class RouteStats:
+    def __init__(self):
+        self.latencies = LatencyWindow(max_samples=500)
+        self.calls = 0
+        self.errors = 0
+        self.slo_breaches = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "slo_breaches": self.slo_breaches,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_seconds": self.latencies.summary(),
+        }
+
+
+class ModelRouter:
+    def __init__(self):
+        self._config: Optional[Tuple[Dict[str, str], Dict[str, List[str]], Dict[str, float]]] = None
+        self._clients: Dict[str, Any] = {}
+        self._cooldown_until: Dict[str, float] = {}
+        # (agent, model) -> stats
+        self._stats: Dict[Tuple[str, str], RouteStats] = {}
+        self._fallbacks: Dict[str, int] = {}
+
+    def _configuration(self) -> Tuple[Dict[str, str], Dict[str, List[str]], Dict[str, float]]:
+        """
+        Routes, tier chains and SLOs, read from the environment on first use.
+        """
+        if self._config is None:
+            load_env()
+            routes = {**DEFAULT_ROUTES, **_parse_routes(os.getenv("MODEL_ROUTES", ""))}
+            tiers = {
+                tier: [m.strip() for m in os.getenv(f"MODEL_TIER_{tier.upper()}", default).split(",") if m.strip()]
+                for tier, default in DEFAULT_TIERS.items()
+            }
+            slos = {tier: float(os.getenv(f"MODEL_SLO_SECONDS_{tier.upper()}", default))
+                    for tier, default in DEFAULT_SLO_SECONDS.items()}
+            self._config = routes, tiers, slos
+        return self._config
+
+    def validate_routes(self, overrides: Dict[str, str]):
+        """
+        Raises ValueError for overrides of unknown agents.
+        """
+        unknown = sorted(set(overrides) - set(DEFAULT_ROUTES))
+        if unknown:
+            raise ValueError(f"Unknown agents {unknown}; routable agents are {sorted(DEFAULT_ROUTES)}")
+
+    def route(self, agent: str, overrides: Optional[Dict[str, str]] = None) -> Tuple[str, List[str]]:
+        """
+        The agent's route (a tier or a model name) and its model chain.
+        """
+        routes, tiers, _ = self._configuration()
+        default_tier = routes.get(agent, "cheap")
+        route = (overrides or {}).get(agent) or default_tier
+        if route in tiers:
+            return route, tiers[route]
+        # A model named directly falls back to the agent's tier
+        fallback_tier = default_tier if default_tier in tiers else "cheap"
+        return route, [route] + [m for m in tiers[fallback_tier] if m != route]
+
+    def slo(self, route: str) -> float:
+        _, _, slos = self._configuration()
+        return slos.get(route, max(slos.values()))
+
+    async def chat_model(self, model: str):
+        """
+        The LangChain chat model for a model name, built on first use.
+        Retries on 429 are left to the shared rate limiter and the fallbacks.
+
+        Importing langchain_openai and building a client take long enough to
+        stall every request in flight, so both run in a thread.
+        """
+        client = self._clients.get(model)
+        if client is None:
+            client = await asyncio.to_thread(self._build_client, model)
+            client = self._clients.setdefault(model, client)
+        return client
+
+    def _build_client(self, model: str):
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model_name=model, temperature=get_settings().llm_temperature, max_retries=0)
+
+    async def warm_up(self):
+        """
+        Loads the token encoder and builds the clients of every model in the
+        tier chains, in threads, so the first requests don't block the event
+        loop on them. Run in the background once the service is ready;
+        failures (e.g. a missing API key) are left to the first call.
+        """
+        for warm in (get_encoder, fallback_errors):
+            try:
+                await asyncio.to_thread(warm)
+            except Exception as e:
+                print(f"Could not warm up {warm.__name__}: {e}")
+        _, tiers, _ = self._configuration()
+        for model in dict.fromkeys(m for chain in tiers.values() for m in chain):
+            try:
+                await self.chat_model(model)
+            except Exception as e:
+                print(f"Could not warm up {model}: {e}")
+                return
+
+    def _route_stats(self, agent: str, model: str) -> RouteStats:
+        stats = self._stats.get((agent, model))
+        if stats is None:
+            stats = self._stats[(agent, model)] = RouteStats()
+        return stats
+
+    async def run(self, agent: str, route: str, chain: List[str],
+                  call: Callable[[str, Optional[float]], Awaitable[Any]]) -> Tuple[Any, str]:
+        """
+        Runs `call(model, slo)` along the chain until a model answers.
+        The call should raise asyncio.TimeoutError when the model takes
+        longer than `slo` seconds once its rate limiter let it start, so
+        time spent queueing for a slot doesn't count against the model.
+        `slo` is None for the last model: it has no fallback left (and may retry).
+        Returns a tuple: (result, model that produced it).
+        """
+        now = time.monotonic()
+        available = [m for m in chain if self._cooldown_until.get(m, 0.0) <= now] or chain[-1:]
+        slo = self.slo(route)
+        for index, model in enumerate(available):
+            last = index == len(available) - 1
+            stats = self._route_stats(agent, model)
+            stats.calls += 1
+            started = time.monotonic()
+            try:
+                result = await call(model, None if last else slo)
+            except fallback_errors() as e:
+                stats.errors += 1
+                if isinstance(e, asyncio.TimeoutError):
+                    stats.slo_breaches += 1
+                elif isinstance(e, RateLimited):
+                    self._cooldown_until[model] = time.monotonic() + (e.retry_after or MODEL_COOLDOWN_SECONDS)
+                if last:
+                    raise
+                self._fallbacks[agent] = self._fallbacks.get(agent, 0) + 1
+                print(f"{agent}: {model} failed ({type(e).__name__}), falling back to {available[index + 1]}")
+                continue
+            except Exception:
+                stats.errors += 1
+                raise
+            elapsed = time.monotonic() - started
+            stats.latencies.add(elapsed)
+            if elapsed > slo:
+                stats.slo_breaches += 1
+            return result, model
+
+    def record_usage(self, agent: str, model: str, prompt_tokens: int, completion_tokens: int):
+        stats = self._route_stats(agent, model)
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += completion_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        routes, tiers, slos = self._configuration()
+        agents: Dict[str, Any] = {}
+        for (agent, model), stats in sorted(self._stats.items()):
+            entry = agents.setdefault(agent, {"route": routes.get(agent), "fallbacks": self._fallbacks.get(agent, 0),
+                                              "models": {}})
+            entry["models"][model] = stats.summary()
+        now = time.monotonic()
+        return {
+            "tiers": tiers,
+            "slo_seconds": slos,
+            "cooling_down": sorted(m for m, until in self._cooldown_until.items() if until > now),
+            "agents": agents,
+        }
+
+
+model_router = ModelRouter()
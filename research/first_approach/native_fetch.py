@@ -0,0 +1,517 @@
+"""
+native_fetch.py
+
+Built-in page fetcher: a direct GET of the page, without a reader proxy.
+
+- Only public http(s) addresses are fetched, redirects included
+  (see url_safety.py); anything else is refused and counted as blocked.
+- Conditional requests: the ETag / Last-Modified of every fetched page is
+  remembered, so a repeated fetch is answered with 304 and reuses the
+  earlier extraction.
+- Bodies are read up to MAX_PAGE_BYTES and decoded with the charset from
+  the Content-Type header, a byte order mark or a <meta charset>, in that order.
+- HTML is reduced to its main content (readability-style: paragraphs score
+  their containers, link-heavy and navigation blocks lose) and rendered as
+  markdown. Parsing runs off the event loop.
+
+Pages that come out nearly empty (JavaScript-rendered apps) or aren't HTML
+or text (PDFs) return "", so fetch_page falls back to a reader proxy.
+"""
+
+import codecs
+import os
+import re
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import aiohttp
+
+from cache import cached, canonicalize_url
+from http_client import MAX_PAGE_BYTES, failure_kind, open_public, read_bytes_capped
+from telemetry import annotate
+from url_safety import UnsafeURL
+from worker_pool import run_off_loop
+
+
+NATIVE_FETCH_TIMEOUT = aiohttp.ClientTimeout(total=float(os.getenv("NATIVE_FETCH_TIMEOUT_SECONDS", "15")))
+# Extractions shorter than this are treated as JavaScript-rendered pages
+NATIVE_MIN_TEXT_CHARS = int(os.getenv("NATIVE_MIN_TEXT_CHARS", "100"))
+# Pages whose validators and extraction are kept for conditional requests
+NATIVE_VALIDATOR_ENTRIES = int(os.getenv("NATIVE_VALIDATOR_ENTRIES", "1000"))
+NATIVE_USER_AGENT = os.getenv("NATIVE_USER_AGENT", "Mozilla/5.0 (compatible; ProspectResearch/1.0)")
+
+_TEXT_TYPES = ("text/plain", "text/markdown")
+_HTML_TYPES = ("text/html", "application/xhtml+xml")
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w:.-]+)""", re.IGNORECASE)
+_BOMS = ((codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+
+
+def _known_codec(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name.strip().strip("\"'")).name
+    except LookupError:
+        return None
+
+
+def decode_body(body: bytes, header_charset: Optional[str] = None) -> str:
+    """
+    Decodes a page with the header charset, else its byte order mark, else
+    its <meta charset>, else UTF-8 (Windows-1252 if it isn't valid UTF-8).
+    """
+    charset = _known_codec(header_charset)
+    if charset is None:
+        for bom, name in _BOMS:
+            if body.startswith(bom):
+                return body[len(bom):].decode(name, errors="replace")
+        match = _META_CHARSET.search(body[:4096])
+        charset = _known_codec(match.group(1).decode("ascii", "ignore")) if match else None
+    if charset is not None:
+        return body.decode(charset, errors="replace")
+    try:
+        return body.decode("utf-8")
+    except UnicodeDecodeError:
+        return body.decode("cp1252", errors="replace")
+
+
+###########################
+# Main-content extraction
+###########################
+
+_VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+# Never content; dropped with everything inside
+_DROPPED = {"script", "style", "noscript", "template", "svg", "iframe", "canvas", "nav", "footer", "header",
+            "aside", "form", "button", "select", "dialog", "object"}
+_BLOCKS = {"address", "article", "blockquote", "body", "dd", "div", "dl", "dt", "figcaption", "figure", "h1",
+           "h2", "h3", "h4", "h5", "h6", "hr", "li", "main", "ol", "p", "pre", "section", "table", "tbody",
+           "thead", "tfoot", "tr", "td", "th", "ul"}
+_HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+# Start tags that close an open element of the first set, unless one of
+# the second set lies in between (the open element's own list or table)
+_IMPLICITLY_CLOSES = {
+    "li": ({"li"}, {"ul", "ol", "menu"}),
+    "dt": ({"dt", "dd"}, {"dl"}),
+    "dd": ({"dt", "dd"}, {"dl"}),
+    "tr": ({"tr", "td", "th"}, {"table", "thead", "tbody", "tfoot"}),
+    "td": ({"td", "th"}, {"tr", "table"}),
+    "th": ({"td", "th"}, {"tr", "table"}),
+    "thead": ({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"table"}),
+    "tbody": ({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"table"}),
+    "tfoot": ({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"table"}),
+    "option": ({"option"}, {"select", "datalist", "optgroup"}),
+}
+# Blocks whose text scores their containers
+_PARAGRAPHS = {"p", "pre", "td", "blockquote", "dd", "li"}
+_UNLIKELY = re.compile(r"banner|breadcrumb|comment|consent|cookie|footer|header|menu|modal|nav|newsletter|"
+                       r"popup|related|share|sidebar|social|sponsor|subscribe|widget|advert", re.IGNORECASE)
+_LIKELY = re.compile(r"article|body|content|entry|main|post|story|text", re.IGNORECASE)
+# Containers of single-page apps that render everything with JavaScript
+_APP_ROOTS = re.compile(r"""<div[^>]+id=["'](?:root|app|__next|__nuxt)["'][^>]*>\s*</div>""", re.IGNORECASE)
+
+Child = Union["_Node", str]
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag: str, attrs: Dict[str, str], parent: Optional["_Node"]):
+        self.tag = tag
+        self.attrs = attrs
+        self.children: List[Child] = []
+        self.parent = parent
+
+
+class _TreeBuilder(HTMLParser):
+    """
+    Lenient HTML to tree parser; drops non-content elements while parsing.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node("document", {}, None)
+        self.current = self.root
+        self.title = ""
+        self._in_title = False
+        # Tag of the element being dropped and how deeply it nests in itself
+        self._dropped_tag: Optional[str] = None
+        self._dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._dropping:
+            if tag == self._dropped_tag:
+                self._dropping += 1
+            return
+        if tag == "title":
+            self._in_title = True
+            return
+        attributes = {k: v or "" for k, v in attrs}
+        hint = f"{attributes.get('class', '')} {attributes.get('id', '')} {attributes.get('role', '')}"
+        if tag in _DROPPED or (tag not in ("body", "main", "article") and _UNLIKELY.search(hint)
+                               and not _LIKELY.search(hint)):
+            if tag not in _VOID:
+                self._dropped_tag, self._dropping = tag, 1
+            return
+        # A new block closes an open paragraph, and a list item, row or cell
+        # closes its open sibling, as browsers do
+        if tag in _BLOCKS and self.current.tag == "p":
+            self.current = self.current.parent
+        if tag in _IMPLICITLY_CLOSES:
+            closes, scope = _IMPLICITLY_CLOSES[tag]
+            node = self.current
+            while node is not self.root and node.tag not in scope:
+                if node.tag in closes:
+                    # Keep going: a new row closes the open cell and its row
+                    self.current = node.parent
+                node = node.parent
+        node = _Node(tag, attributes, self.current)
+        self.current.children.append(node)
+        if tag not in _VOID:
+            self.current = node
+
+    def handle_endtag(self, tag):
+        if self._dropping:
+            if tag == self._dropped_tag:
+                self._dropping -= 1
+            return
+        if tag == "title":
+            self._in_title = False
+            return
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._dropping:
+            self.current.children.append(data)
+
+
+def _walk(node: _Node):
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(child for child in reversed(current.children) if isinstance(child, _Node))
+
+
+def _text(node: Child) -> str:
+    if isinstance(node, str):
+        return node
+    parts, stack = [], [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, str):
+            parts.append(current)
+        else:
+            if current.tag in _BLOCKS or current.tag == "br":
+                parts.append(" ")
+            stack.extend(reversed(current.children))
+    return " ".join("".join(parts).split())
+
+
+class _TextStats:
+    """
+    Length and comma count of a node's text (as _text would return it) and
+    the length of its link text, for every node of a tree.
+
+    Computed once, bottom-up, from each child's summary instead of
+    re-extracting the text of every candidate container, which is
+    quadratic in the nesting depth.
+    """
+
+    def __init__(self, root: _Node):
+        # id(node) -> (text length, commas, link text length)
+        self._stats: Dict[int, Tuple[int, int, int]] = {}
+        # id(node) -> (text length, leading space, trailing space, has text), whitespace collapsed
+        summaries: Dict[int, Tuple[int, bool, bool, bool]] = {}
+        stack: List[Tuple[_Node, bool]] = [(root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if not children_done:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children if isinstance(child, _Node))
+                continue
+            summary = (0, True, True, False) if node.tag in _BLOCKS or node.tag == "br" else (0, False, False, False)
+            commas = links = 0
+            for child in node.children:
+                if isinstance(child, str):
+                    summary = _join(summary, _summarize(child))
+                    commas += child.count(",")
+                else:
+                    _, child_commas, child_links = self._stats[id(child)]
+                    summary = _join(summary, summaries.pop(id(child)))
+                    commas += child_commas
+                    links += child_links
+            length = summary[0]
+            self._stats[id(node)] = (length, commas, length if node.tag == "a" else links)
+            summaries[id(node)] = summary
+
+    def length(self, node: _Node) -> int:
+        return self._stats[id(node)][0]
+
+    def commas(self, node: _Node) -> int:
+        return self._stats[id(node)][1]
+
+    def link_density(self, node: _Node) -> float:
+        length, _, links = self._stats[id(node)]
+        if not length:
+            return 1.0
+        return min(1.0, links / length)
+
+
+def _summarize(text: str) -> Tuple[int, bool, bool, bool]:
+    words = text.split()
+    if not words:
+        return 0, bool(text), bool(text), False
+    return sum(map(len, words)) + len(words) - 1, text[0].isspace(), text[-1].isspace(), True
+
+
+def _join(first: Tuple[int, bool, bool, bool], second: Tuple[int, bool, bool, bool]) -> Tuple[int, bool, bool, bool]:
+    length, leading, trailing, has_text = first
+    second_length, second_leading, second_trailing, second_has_text = second
+    if not has_text:
+        return (second_length, leading or second_leading,
+                second_trailing if second_has_text else trailing or second_trailing, second_has_text)
+    if not second_has_text:
+        return length, leading, trailing or second_leading, True
+    return length + second_length + (trailing or second_leading), leading, second_trailing, True
+
+
+def main_content(root: _Node) -> _Node:
+    """
+    The element holding the page's main content: the largest <main> or
+    <article> holding enough of the page's text, else the best scoring
+    container.
+    """
+    stats = _TextStats(root)
+    landmarks = [(stats.length(n), n) for n in _walk(root) if n.tag in ("main", "article")]
+    if landmarks:
+        length, landmark = max(landmarks, key=lambda pair: pair[0])
+        if length >= NATIVE_MIN_TEXT_CHARS or length >= stats.length(root) / 2:
+            return landmark
+
+    scores: Dict[int, Tuple[_Node, float]] = {}
+    for node in _walk(root):
+        if node.tag not in _PARAGRAPHS and not (
+            node.tag == "div" and not any(isinstance(c, _Node) and c.tag in _BLOCKS for c in node.children)
+        ):
+            continue
+        length = stats.length(node)
+        if length < 25:
+            continue
+        score = 1 + stats.commas(node) + min(length // 100, 3)
+        for ancestor, share in ((node.parent, 1.0), (node.parent.parent if node.parent else None, 0.5)):
+            if ancestor is not None and ancestor is not root:
+                _, current = scores.get(id(ancestor), (ancestor, 0.0))
+                scores[id(ancestor)] = (ancestor, current + score * share)
+    if not scores:
+        return root
+
+    def final_score(entry: Tuple[_Node, float]) -> float:
+        node, score = entry
+        return score * (1 - stats.link_density(node))
+
+    best, _ = max(scores.values(), key=final_score)
+    return best
+
+
+class _MarkdownRenderer:
+    def __init__(self):
+        self.blocks: List[str] = []
+        self._inline: List[str] = []
+
+    def flush(self):
+        text = " ".join("".join(self._inline).split())
+        self._inline = []
+        if text:
+            self.blocks.append(text)
+
+    def render(self, node: _Node) -> str:
+        self.walk(node)
+        self.flush()
+        markdown = []
+        for previous, block in zip([""] + self.blocks, self.blocks):
+            # List items and table rows stay on consecutive lines
+            tight = block[:2] in ("- ", "| ") and previous[:2] == block[:2]
+            markdown.append(("\n" if tight else "\n\n") + block if markdown else block)
+        return "".join(markdown)
+
+    def walk(self, node: _Node):
+        # Iterative, so deeply nested pages can't exhaust the recursion limit;
+        # None marks the end of a block
+        stack: List[Optional[Child]] = list(reversed(node.children))
+        while stack:
+            child = stack.pop()
+            if child is None:
+                self.flush()
+                continue
+            if isinstance(child, str):
+                self._inline.append(child)
+                continue
+            tag = child.tag
+            if tag == "br":
+                self._inline.append(" ")
+            elif tag in _HEADINGS:
+                self.flush()
+                text = _text(child)
+                if text:
+                    self.blocks.append(f"{'#' * _HEADINGS[tag]} {text}")
+            elif tag == "li":
+                self.flush()
+                text = _text(child)
+                if text:
+                    self.blocks.append(f"- {text}")
+            elif tag == "tr":
+                self.flush()
+                cells = [_text(c) for c in child.children if isinstance(c, _Node) and c.tag in ("td", "th")]
+                if any(cells):
+                    self.blocks.append("| " + " | ".join(cells) + " |")
+            elif tag == "pre":
+                self.flush()
+                text = "".join(_raw_text(child)).strip("\n")
+                if text.strip():
+                    self.blocks.append(f"```\n{text}\n```")
+            elif tag in _BLOCKS:
+                self.flush()
+                stack.append(None)
+                stack.extend(reversed(child.children))
+            else:
+                stack.extend(reversed(child.children))
+
+
+def _raw_text(node: _Node) -> List[str]:
+    parts, stack = [], list(reversed(node.children))
+    while stack:
+        current = stack.pop()
+        if isinstance(current, str):
+            parts.append(current)
+        else:
+            stack.extend(reversed(current.children))
+    return parts
+
+
+def html_to_markdown(html: str) -> Tuple[str, bool]:
+    """
+    Markdown of a page's main content. Returns a tuple: (markdown, usable)
+    where usable is False for pages with too little text to extract from,
+    typically apps rendered by JavaScript.
+    """
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    markdown = _MarkdownRenderer().render(main_content(builder.root))
+    title = " ".join(builder.title.split())
+    if title and not markdown.startswith("# "):
+        markdown = f"# {title}\n\n{markdown}" if markdown else f"# {title}"
+    usable = len(markdown) >= NATIVE_MIN_TEXT_CHARS and not (
+        _APP_ROOTS.search(html) and len(markdown) < 2 * NATIVE_MIN_TEXT_CHARS
+    )
+    return markdown, usable
+
+
+###########################
+# Fetching
+###########################
+
+class NativeFetcher:
+    def __init__(self, max_entries: int = NATIVE_VALIDATOR_ENTRIES):
+        self.max_entries = max_entries
+        # canonical URL -> (etag, last_modified, markdown)
+        self._validators: "OrderedDict[str, Tuple[Optional[str], Optional[str], str]]" = OrderedDict()
+        self.counts = {"fetched": 0, "not_modified": 0, "needs_javascript": 0, "unsupported_type": 0,
+                       "blocked": 0, "failed": 0}
+
+    def _remember(self, key: str, etag: Optional[str], last_modified: Optional[str], markdown: str):
+        if not (etag or last_modified):
+            return
+        self._validators[key] = (etag, last_modified, markdown)
+        self._validators.move_to_end(key)
+        while len(self._validators) > self.max_entries:
+            self._validators.popitem(last=False)
+
+    async def fetch(self, url: str) -> str:
+        """
+        Fetches a page and returns the markdown of its main content, or ""
+        if it failed, was refused or the page needs a reader proxy.
+        """
+        key = canonicalize_url(url)
+        headers = {"User-Agent": NATIVE_USER_AGENT,
+                   "Accept": "text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.5"}
+        known = self._validators.get(key)
+        if known is not None:
+            etag, last_modified, _ = known
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        try:
+            async with open_public("GET", url, headers=headers, timeout=NATIVE_FETCH_TIMEOUT) as response:
+                if response.status == 304 and known is not None:
+                    self.counts["not_modified"] += 1
+                    annotate("not_modified", True)
+                    self._validators.move_to_end(key)
+                    return known[2]
+                if response.status != 200:
+                    print(f"Native fetch returned status {response.status} for URL: {url}")
+                    self.counts["failed"] += 1
+                    annotate("fetch_error", failure_kind(status=response.status))
+                    return ""
+                content_type = response.headers.get("Content-Type", "text/html").split(";")[0].strip().lower()
+                if content_type not in _HTML_TYPES + _TEXT_TYPES:
+                    self.counts["unsupported_type"] += 1
+                    annotate("content_type", content_type)
+                    return ""
+                body = await read_bytes_capped(response, MAX_PAGE_BYTES)
+                charset = response.charset
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except UnsafeURL as e:
+            print(f"Refusing to fetch {url}: {e}")
+            self.counts["blocked"] += 1
+            return ""
+        except Exception as e:
+            print(f"Error fetching page {url} natively: {e}")
+            self.counts["failed"] += 1
+            annotate("fetch_error", failure_kind(e))
+            return ""
+
+        text = await run_off_loop(decode_body, body, charset)
+        if content_type in _TEXT_TYPES:
+            markdown, usable = text, bool(text.strip())
+        else:
+            markdown, usable = await run_off_loop(html_to_markdown, text)
+        if not usable:
+            self.counts["needs_javascript"] += 1
+            annotate("needs_javascript", True)
+            return ""
+        self.counts["fetched"] += 1
+        self._remember(key, etag, last_modified, markdown)
+        return markdown
+
+    def validators(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        The ETag and Last-Modified the page was last fetched with, if any.
+        """
+        known = self._validators.get(canonicalize_url(url))
+        return (known[0], known[1]) if known is not None else (None, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counts, "validators": len(self._validators)}
+
+
+native_fetcher = NativeFetcher()
+
+
+@cached("native", canonicalize_url)
+async def fetch_native(url):
+    """
+    Fetch a webpage directly and extract its main content as markdown.
+    Returns the text content or empty string on failure.
+    """
+    return await native_fetcher.fetch(url)
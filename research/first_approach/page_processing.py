@@ -0,0 +1,119 @@
+"""
+page_processing.py
+
+Prepares fetched pages for extract_info: strips boilerplate, splits the page
+into token-bounded, overlapping chunks, and merges the per-chunk
+ExtractedInfo results back into one.
+
+With PAGE_CHUNK_TOKENS * MAX_CHUNKS_PER_PAGE page tokens at most, every page
+has a firm ceiling on the prompt tokens it can cost.
+"""
+
+import os
+import re
+from typing import Any, Dict, List
+
+from tokenization import get_encoder
+
+
+PAGE_CHUNK_TOKENS = int(os.getenv("PAGE_CHUNK_TOKENS", "3000"))
+PAGE_CHUNK_OVERLAP_TOKENS = int(os.getenv("PAGE_CHUNK_OVERLAP_TOKENS", "200"))
+MAX_CHUNKS_PER_PAGE = int(os.getenv("MAX_CHUNKS_PER_PAGE", "4"))
+
+# Fields of ExtractedInfo merged across chunks
+EXTRACTED_INFO_FIELDS = ("relevant_info", "conflicts", "interesting_insights", "seller_benefit_possibilities")
+
+_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+# What may surround the links of a navigation line: bullets and separators
+_NAVIGATION_LEFTOVER = re.compile(r"[\s|·•*+-]*")
+_BLANK_LINES = re.compile(r"\n{3,}")
+# Header lines added by the Jina reader
+_READER_HEADER = re.compile(r"^(URL Source|Published Time|Markdown Content):.*$")
+
+
+def is_link_only(line: str) -> bool:
+    """
+    True for navigation lines: one or more links, with nothing but bullets
+    and separators around them. Linear in the line length.
+    """
+    without_links, links = _LINK.subn("", line)
+    return links > 0 and _NAVIGATION_LEFTOVER.fullmatch(without_links) is not None
+
+
+def strip_boilerplate(text: str) -> str:
+    """
+    Removes what carries no information for extraction: images, navigation
+    lines made only of links, reader headers, and lines repeated across the
+    page (menus, footers, cookie notices). Inline links keep their text.
+    """
+    seen_counts: Dict[str, int] = {}
+    for line in text.splitlines():
+        key = line.strip().lower()
+        if key:
+            seen_counts[key] = seen_counts.get(key, 0) + 1
+
+    kept = []
+    emitted = set()
+    for line in text.splitlines():
+        key = line.strip().lower()
+        if not key:
+            kept.append("")
+            continue
+        if _READER_HEADER.match(line.strip()) or is_link_only(line):
+            continue
+        # Keep the first occurrence of a repeated line, drop the rest
+        if seen_counts[key] > 2 and key in emitted:
+            continue
+        emitted.add(key)
+        line = _LINK.sub(r"\1", _IMAGE.sub("", line)).rstrip()
+        if line.strip():
+            kept.append(line)
+
+    return _BLANK_LINES.sub("\n\n", "\n".join(kept)).strip()
+
+
+def chunk_by_tokens(text: str, max_tokens: int = PAGE_CHUNK_TOKENS,
+                    overlap_tokens: int = PAGE_CHUNK_OVERLAP_TOKENS,
+                    max_chunks: int = MAX_CHUNKS_PER_PAGE) -> List[str]:
+    """
+    Splits text into at most `max_chunks` windows of `max_tokens` tokens,
+    consecutive windows sharing `overlap_tokens`. Text beyond the last
+    window is dropped.
+    """
+    encoder = get_encoder()
+    tokens = encoder.encode(text)
+    if len(tokens) <= max_tokens:
+        return [text] if text else []
+
+    step = max(1, max_tokens - overlap_tokens)
+    chunks = []
+    for start in range(0, len(tokens), step):
+        chunks.append(encoder.decode(tokens[start:start + max_tokens]))
+        if len(chunks) == max_chunks or start + max_tokens >= len(tokens):
+            break
+    return chunks
+
+
+def prepare_page(content: str) -> List[str]:
+    """
+    Boilerplate stripping and chunking in one step, so it can run in the CPU pool.
+    """
+    return chunk_by_tokens(strip_boilerplate(content))
+
+
+def merge_extracted_info(responses: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Concatenates the per-chunk ExtractedInfo results, dropping items that
+    repeat (case- and whitespace-insensitively), e.g. facts from chunk overlaps.
+    """
+    merged: Dict[str, List[str]] = {field: [] for field in EXTRACTED_INFO_FIELDS}
+    seen = {field: set() for field in EXTRACTED_INFO_FIELDS}
+    for response in responses:
+        for field in EXTRACTED_INFO_FIELDS:
+            for item in response.get(field) or []:
+                key = " ".join(str(item).lower().split())
+                if key not in seen[field]:
+                    seen[field].add(key)
+                    merged[field].append(item)
+    return merged
@@ -194,7 +194,7 @@ You are an expert researcher selecting promising search results for further expl
 **Search Context:**
 {search_context}
 
-**Google Search Results:**
+**Search Results (number. title (domain), URL, snippet):**
 {search_results}
 
 **Instructions:**
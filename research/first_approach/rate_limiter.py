@@ -0,0 +1,258 @@
+"""
+rate_limiter.py
+
+Provider-aware rate limiting shared by every workflow in the process.
+
+Each provider (Google, SerpAPI, Jina, Firecrawl) and each OpenAI model, whose
+quotas OpenAI sets per model, gets:
+- a requests-per-minute and a tokens-per-minute token bucket, and
+- an AIMD concurrency limit: it grows by roughly one slot per window of
+  successful calls and is halved when the provider answers 429, in which
+  case new calls also wait out the Retry-After period.
+
+Calls that were rate limited are retried instead of surfacing as empty
+results.
+"""
+
+import asyncio
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from functools import wraps
+from typing import Any, Dict, Optional
+
+from telemetry import count
+
+
+class RateLimited(Exception):
+    """
+    Raised by a backend when its provider answered 429.
+    """
+
+    def __init__(self, provider: str, retry_after: Optional[float] = None):
+        super().__init__(f"{provider} rate limited the request")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header given either in seconds or as an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Continuously refilling bucket holding up to `per_minute` units.
+    """
+
+    def __init__(self, per_minute: Optional[int]):
+        self.per_minute = per_minute
+        self._available = float(per_minute or 0)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._available = min(self.per_minute, self._available + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1):
+        if not self.per_minute or amount <= 0:
+            return
+        # A single request larger than the bucket may still go once it is full
+        amount = min(amount, self.per_minute)
+        async with self._lock:
+            self._refill()
+            while self._available < amount:
+                await asyncio.sleep((amount - self._available) * 60 / self.per_minute)
+                self._refill()
+            self._available -= amount
+
+    @property
+    def available(self) -> int:
+        if not self.per_minute:
+            return 0
+        self._refill()
+        return int(self._available)
+
+
+class AdaptiveConcurrency:
+    """
+    Additive-increase / multiplicative-decrease limit on calls in flight.
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_throttle(self):
+        # Calls already in flight when the first 429 arrived will likely fail
+        # too; count them as one congestion event.
+        now = time.monotonic()
+        if now - self._last_decrease > 1.0:
+            self.limit = max(self.minimum, self.limit / 2)
+            self._last_decrease = now
+
+
+class ProviderLimiter:
+    def __init__(self, provider: str, rpm: Optional[int], tpm: Optional[int] = None,
+                 initial_concurrency: int = 8, max_concurrency: int = 32, max_retries: int = 4):
+        self.provider = provider
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, max_concurrency)
+        self.max_retries = max_retries
+        self.paused_until = 0.0
+        self.throttled = 0
+        self.calls = 0
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0):
+        """
+        Waits until a call with the given token estimate may start.
+        """
+        await self.concurrency.acquire()
+        try:
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self.requests.acquire(1)
+            await self.tokens.acquire(tokens)
+            self.calls += 1
+            yield
+        finally:
+            await self.concurrency.release()
+
+    def on_success(self):
+        self.concurrency.on_success()
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> float:
+        """
+        Records a 429 and returns how long the caller should wait before retrying.
+        """
+        self.throttled += 1
+        self.concurrency.on_throttle()
+        delay = retry_after if retry_after is not None else 2.0
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+    async def call(self, fn, *args, tokens: int = 0, retries: Optional[int] = None,
+                   timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Runs `fn(*args, **kwargs)` within the limits, retrying on RateLimited
+        up to `retries` times (default: the limiter's max_retries).
+        `timeout` bounds each run of `fn` once it has its slot, not the wait
+        for the slot (asyncio.TimeoutError).
+        """
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                async with self.slot(tokens):
+                    result = await asyncio.wait_for(fn(*args, **kwargs), timeout)
+                self.on_success()
+                return result
+            except RateLimited as e:
+                delay = self.on_throttle(e.retry_after)
+                if attempt == retries:
+                    raise
+                count("retries")
+                print(f"{self.provider} rate limited, retrying in {delay:.1f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests_per_minute": self.requests.per_minute,
+            "requests_available": self.requests.available,
+            "tokens_per_minute": self.tokens.per_minute,
+            "tokens_available": self.tokens.available,
+            "concurrency_limit": int(self.concurrency.limit),
+            "in_flight": self.concurrency.in_flight,
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "paused_for_seconds": round(max(0.0, self.paused_until - time.monotonic()), 1),
+        }
+
+
+def _env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+# Defaults follow the providers' documented entry-tier quotas; override per deployment.
+LIMITERS: Dict[str, ProviderLimiter] = {
+    "google": ProviderLimiter("google", _env_int("GOOGLE_SEARCH_RPM", 100)),
+    "serpapi": ProviderLimiter("serpapi", _env_int("SERPAPI_RPM", 60)),
+    "jina": ProviderLimiter("jina", _env_int("JINA_RPM", 200)),
+    "firecrawl": ProviderLimiter("firecrawl", _env_int("FIRECRAWL_RPM", 20), initial_concurrency=4),
+}
+
+
+def model_limiter(model: str) -> ProviderLimiter:
+    """
+    The limiter of an OpenAI model, registered as "openai:<model>" on first
+    use. OPENAI_RPM / OPENAI_TPM apply to every model; OPENAI_RPM_<MODEL> /
+    OPENAI_TPM_<MODEL> (e.g. OPENAI_TPM_GPT_4O) override them per model.
+    """
+    key = f"openai:{model}"
+    limiter = LIMITERS.get(key)
+    if limiter is None:
+        suffix = re.sub(r"[^A-Z0-9]+", "_", model.upper())
+        limiter = LIMITERS[key] = ProviderLimiter(
+            key,
+            _env_int(f"OPENAI_RPM_{suffix}", _env_int("OPENAI_RPM", 500)),
+            _env_int(f"OPENAI_TPM_{suffix}", _env_int("OPENAI_TPM", 200000)),
+            initial_concurrency=16, max_concurrency=64,
+        )
+    return limiter
+
+
+def rate_limited(provider: str, fallback: Any = None):
+    """
+    Decorator running a backend coroutine under the provider's limiter.
+    If the provider still rate limits after all retries, `fallback` is returned.
+    """
+    limiter = LIMITERS[provider]
+
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await limiter.call(fn, *args, **kwargs)
+            except RateLimited as e:
+                print(f"Giving up after repeated rate limiting: {e}")
+                return fallback
+        return wrapper
+    return decorator
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    return {provider: limiter.stats() for provider, limiter in LIMITERS.items()}
@@ -0,0 +1,113 @@
+"""
+relevance.py
+
+Cheap, local lexical relevance scoring: tokenization, query-term coverage
+and BM25 over a small set of documents (page passages or search results).
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Sequence
+
+_TERM = re.compile(r"[^\W_]+", re.UNICODE)
+
+# English and German function words; prospects are often German businesses.
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have how if in into is it its
+of on or our that the their them there these they this those to was we were what when where which who
+why will with would you your about more most other some such than then also any all not no only
+der die das den dem des ein eine einer eines einem und oder aber ist sind war wird werden mit von zu
+zum zur im in auf für fur bei aus als wie was wer wo nicht auch noch nur sich sie es er wir ihr
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased word tokens without stopwords and single characters.
+    """
+    return [t for t in _TERM.findall(str(text).lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def term_coverage(query: str, text: str) -> float:
+    """
+    Fraction of the query's distinct terms that occur in the text.
+    """
+    query_terms = set(tokenize(query))
+    if not query_terms:
+        return 1.0
+    return len(query_terms & set(tokenize(text))) / len(query_terms)
+
+
+class BM25:
+    """
+    Okapi BM25 over an in-memory list of documents.
+    """
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_terms = [Counter(tokenize(doc)) for doc in documents]
+        self.doc_lengths = [sum(terms.values()) for terms in self.doc_terms]
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        document_frequency: Dict[str, int] = Counter()
+        for terms in self.doc_terms:
+            document_frequency.update(terms.keys())
+        n = len(self.doc_terms)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        query_terms = set(tokenize(query))
+        results = []
+        for terms, length in zip(self.doc_terms, self.doc_lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for term in query_terms:
+                tf = terms.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+
+def split_passages(text: str, passage_words: int = 120) -> List[str]:
+    """
+    Splits text into passages of roughly `passage_words` words along paragraph breaks.
+    """
+    passages, current, count = [], [], 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = len(paragraph.split())
+        if not words:
+            continue
+        if count and count + words > passage_words:
+            passages.append("\n\n".join(current))
+            current, count = [], 0
+        current.append(paragraph)
+        count += words
+    if current:
+        passages.append("\n\n".join(current))
+    return passages
+
+
+def best_passages(query: str, text: str, max_words: int = 300) -> str:
+    """
+    The highest-scoring passages for the query, in page order, up to `max_words`.
+    """
+    passages = split_passages(text)
+    if not passages:
+        return ""
+    scores = BM25(passages).scores(query)
+    ranked = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+    chosen, words = [], 0
+    for i in ranked:
+        passage_words = len(passages[i].split())
+        if chosen and words + passage_words > max_words:
+            break
+        if passage_words > max_words:
+            passages[i] = " ".join(passages[i].split()[:max_words])
+        chosen.append(i)
+        words += passage_words
+    return "\n\n".join(passages[i] for i in sorted(chosen))
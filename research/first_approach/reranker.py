@@ -0,0 +1,117 @@
+"""
+reranker.py
+
+Local ranking of search results for select_search_results, so choosing a
+research question's URLs doesn't need an LLM round-trip.
+
+A result's score combines:
+- BM25 of its title and snippet against the research question, search
+  context and queries, normalized to the best result,
+- the search engine's own rank,
+- domain priors: a boost for the prospect's own website, penalties for
+  business directories and social networks (thin or login-walled pages),
+- optionally, cosine similarity from a small local embedding model
+  (RERANK_EMBEDDING_MODEL, needs sentence-transformers).
+
+Selection modes, per task or via SELECTION_MODE:
+- "llm": the LLM picks from all results (the original behaviour),
+- "local": the top RERANK_TOP_K results are taken as they are,
+- "hybrid": the LLM picks from a local shortlist of RERANK_SHORTLIST results.
+"""
+
+import asyncio
+import os
+from typing import Iterable, List, Optional, Tuple
+
+from cache import domain_of
+from relevance import BM25
+from search_backends import SearchResult
+
+
+SELECTION_MODE = os.getenv("SELECTION_MODE", "llm")
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "4"))
+RERANK_SHORTLIST = int(os.getenv("RERANK_SHORTLIST", "8"))
+RERANK_RANK_WEIGHT = float(os.getenv("RERANK_RANK_WEIGHT", "0.3"))
+RERANK_WEBSITE_BOOST = float(os.getenv("RERANK_WEBSITE_BOOST", "1.0"))
+RERANK_DIRECTORY_PENALTY = float(os.getenv("RERANK_DIRECTORY_PENALTY", "0.4"))
+RERANK_SOCIAL_PENALTY = float(os.getenv("RERANK_SOCIAL_PENALTY", "0.6"))
+RERANK_EMBEDDING_MODEL = os.getenv("RERANK_EMBEDDING_MODEL", "")
+RERANK_EMBEDDING_WEIGHT = float(os.getenv("RERANK_EMBEDDING_WEIGHT", "0.5"))
+
+# Listings that rarely say more about a business than its own site does
+DIRECTORY_DOMAINS = frozenset("""
+yelp.com yelp.de yellowpages.com gelbeseiten.de dasoertliche.de dastelefonbuch.de 11880.com
+golocal.de cylex.de meinestadt.de kompass.com northdata.de northdata.com firmenwissen.de
+wlw.de europages.com europages.de manta.com bbb.org trustpilot.com tripadvisor.com tripadvisor.de
+""".split())
+# Mostly login-walled or too thin to extract from
+SOCIAL_DOMAINS = frozenset("""
+facebook.com instagram.com twitter.com x.com tiktok.com pinterest.com youtube.com linkedin.com
+xing.com threads.net
+""".split())
+
+
+def _matches(domain: str, domains: Iterable[str]) -> bool:
+    return any(domain == d or domain.endswith(f".{d}") for d in domains)
+
+
+def domain_prior(domain: str, website_domain: Optional[str]) -> float:
+    if website_domain and _matches(domain, (website_domain,)):
+        return RERANK_WEBSITE_BOOST
+    if _matches(domain, DIRECTORY_DOMAINS):
+        return -RERANK_DIRECTORY_PENALTY
+    if _matches(domain, SOCIAL_DOMAINS):
+        return -RERANK_SOCIAL_PENALTY
+    return 0.0
+
+
+_embedder = None
+_embedder_failed = False
+
+
+def _get_embedder():
+    global _embedder, _embedder_failed
+    if _embedder is None and RERANK_EMBEDDING_MODEL and not _embedder_failed:
+        try:
+            from sentence_transformers import SentenceTransformer
+            _embedder = SentenceTransformer(RERANK_EMBEDDING_MODEL)
+        except Exception as e:
+            _embedder_failed = True
+            print(f"Reranking without embeddings, could not load {RERANK_EMBEDDING_MODEL}: {e}")
+    return _embedder
+
+
+def _similarities(query: str, documents: List[str]) -> List[float]:
+    embedder = _get_embedder()
+    if embedder is None:
+        return [0.0] * len(documents)
+    vectors = embedder.encode([query, *documents], normalize_embeddings=True)
+    return [float(vector @ vectors[0]) for vector in vectors[1:]]
+
+
+async def rerank(results: List[SearchResult], research_question: str, search_context: str = "",
+                 queries: Iterable[str] = (), website: Optional[str] = None) -> List[Tuple[SearchResult, float]]:
+    """
+    Scores the results and returns (result, score) pairs, best first.
+    """
+    if not results:
+        return []
+    query = " ".join([research_question, search_context, *queries])
+    documents = [f"{result['title']} {result['snippet']}" for result in results]
+    lexical = BM25(documents).scores(query)
+    best = max(lexical) or 1.0
+    similarities = [0.0] * len(results)
+    if RERANK_EMBEDDING_MODEL:
+        similarities = await asyncio.to_thread(_similarities, query, documents)
+
+    website_domain = domain_of(website) if website else None
+    scored = []
+    for result, lexical_score, similarity in zip(results, lexical, similarities):
+        score = (
+            lexical_score / best
+            + RERANK_RANK_WEIGHT / max(1, result["rank"])
+            + domain_prior(result["domain"], website_domain)
+            + RERANK_EMBEDDING_WEIGHT * similarity
+        )
+        scored.append((result, score))
+    return sorted(scored, key=lambda pair: pair[1], reverse=True)
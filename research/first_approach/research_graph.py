@@ -1,5 +1,6 @@
 from langgraph.graph import StateGraph, END, START
 from state import ProspectingAgentState
+from telemetry import traced_node
 # Import the newly refactored agent functions
 from agents import (
     planner_agent,
@@ -7,6 +8,8 @@ from agents import (
     query_generation_agent,
     select_search_results_agent,
     extract_info_agent,
+    research_pipeline_agent,
+    refresh_sources_agent,
     finalization_agent
 )
 
@@ -32,33 +35,60 @@ def create_research_graph():
     graph = StateGraph(ProspectingAgentState)
 
     # 1) Add the Planner node (replaces Strategy as the first step)
-    graph.add_node("planner", planner_agent)
+    graph.add_node("planner", traced_node("planner", planner_agent))
 
     # 2) Interpretation node
-    graph.add_node("interpretation", interpretation_agent)
+    graph.add_node("interpretation", traced_node("interpretation", interpretation_agent))
 
     # 3) Standard research steps
-    graph.add_node("query_generation", query_generation_agent)
-    graph.add_node("select_search_results", select_search_results_agent)
-    graph.add_node("extract_info", extract_info_agent)
+    graph.add_node("query_generation", traced_node("query_generation", query_generation_agent))
+    graph.add_node("select_search_results", traced_node("select_search_results", select_search_results_agent))
+    graph.add_node("extract_info", traced_node("extract_info", extract_info_agent))
+    # Pipelined variant of the three steps above (execution_mode "pipelined")
+    graph.add_node("research_pipeline", traced_node("research_pipeline", research_pipeline_agent))
+
+    # Refresh runs re-check the prospect's stored sources first
+    graph.add_node("refresh_sources", traced_node("refresh_sources", refresh_sources_agent))
 
     # 4) Finalization
-    graph.add_node("finalization", finalization_agent)
+    graph.add_node("finalization", traced_node("finalization", finalization_agent))
 
     # -------------------------
     # Define the edges (flow)
     # -------------------------
-    # Start with Planner
-    graph.set_entry_point("planner")
+    # Start with Planner, or with the stored sources when refreshing
+    def entry_check(state):
+        return "refresh_sources" if state.get("refresh") else "planner"
+
+    graph.add_conditional_edges(START, entry_check)
+
+    def refresh_check(state):
+        """
+        Interpret what changed since the last run. If nothing did, the stored
+        report stands; without stored research, research from scratch.
+        """
+        if not state.get("refresh"):
+            return "planner"
+        if state.get("exploration_results"):
+            return "interpretation"
+        if state.get("final_report"):
+            print("No source changed, keeping the stored report")
+            return END
+        return "finalization"
+
+    graph.add_conditional_edges("refresh_sources", refresh_check)
 
     # After Interpretation, conditionally decide next step
     def round_check(state):
         """
-        If there are research questions and we haven't reached the max number of rounds,
-        continue with planner again. Otherwise, proceed to finalization.
+        If we haven't reached the max number of rounds and the budget isn't
+        exhausted, continue with planner again; it decides whether more
+        research is needed. Otherwise, proceed to finalization.
         """
-        state["round_count"] += 1
-        if state.get("research_questions") and state["round_count"] < state["max_rounds"]:
+        if state.get("budget_exhausted"):
+            print("Budget exhausted, proceeding to finalization")
+            return "finalization"
+        if state.get("round_count", 0) < state["max_rounds"]:
             return "planner"
         else:
             return "finalization"
@@ -70,7 +100,13 @@ def create_research_graph():
         """
         research_questions = state.get("research_questions")
         print("Research questions:", research_questions)
+        if state.get("budget_exhausted"):
+            print("Budget exhausted, proceeding to finalization")
+            return "finalization"
         if research_questions and len(research_questions) > 0:
+            if state.get("execution_mode") == "pipelined":
+                print("Continuing with the research pipeline")
+                return "research_pipeline"
             print("Continuing with query generation")
             return "query_generation"
         else:
@@ -87,17 +123,11 @@ def create_research_graph():
     graph.add_edge("query_generation", "select_search_results")
     graph.add_edge("select_search_results", "extract_info")
     graph.add_edge("extract_info", "interpretation")
+    graph.add_edge("research_pipeline", "interpretation")
 
     # Finalization
     graph.add_edge("finalization", END)
 
-    # Optional: log node execution if a flag is set in state
-    def on_node_start(state, node_name):
-        if state.get("log_steps"):
-            print(f"[LOG] Running node: {node_name}")
-
-    graph.on_node_start = on_node_start
-
     return graph
 
 if __name__ == "__main__":
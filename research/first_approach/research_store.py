@@ -0,0 +1,213 @@
+"""
+research_store.py
+
+SQLite-backed store of each prospect's past research, used to refresh a
+report instead of researching it again from scratch.
+
+For every prospect it keeps the latest report draft, scratchpad and final
+report, and for every source page: the research question and search
+context it was fetched for, its content fingerprint, the rendered
+extraction, when it was fetched and its HTTP validators (ETag,
+Last-Modified). On refresh only sources that are stale or changed are
+fetched and extracted again (see refresh_sources_agent).
+
+Prospects are keyed by an explicit prospect id, else by the host of their
+website, else by their normalized business name.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from cache import canonicalize_url
+from content_store import content_store
+from http_client import open_public
+
+
+RESEARCH_STORE_PATH = os.getenv("RESEARCH_STORE_PATH", "research_store.sqlite")
+# Sources without HTTP validators are re-fetched once they are this old
+REFRESH_MAX_AGE_SECONDS = float(os.getenv("REFRESH_MAX_AGE_DAYS", "30")) * 86400
+PROBE_TIMEOUT = aiohttp.ClientTimeout(total=10)
+# HEAD requests in flight at once for pages saved without validators
+PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY", "4"))
+_probe_slots = asyncio.Semaphore(PROBE_CONCURRENCY)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prospects (
+    prospect_key TEXT PRIMARY KEY,
+    business_info TEXT NOT NULL,
+    report_draft TEXT,
+    scratchpad TEXT,
+    final_report TEXT,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sources (
+    prospect_key TEXT NOT NULL,
+    url TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (prospect_key, url)
+);
+"""
+
+
+def prospect_key(business_info: Dict[str, Any], prospect_id: Optional[str] = None) -> str:
+    if prospect_id:
+        return f"id:{prospect_id}"
+    website = (business_info or {}).get("website")
+    if website:
+        host = urlsplit(website if "//" in website else f"//{website}").hostname or ""
+        host = host.lower().removeprefix("www.")
+        if host:
+            return f"site:{host}"
+    name = " ".join(str((business_info or {}).get("business_name", "")).lower().split())
+    if name:
+        return f"name:{name}"
+    return "info:" + hashlib.sha256(json.dumps(business_info, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+async def probe(url: str, etag: Optional[str] = None,
+                last_modified: Optional[str] = None) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Asks the source server, with a conditional HEAD request, whether a page
+    changed. Returns a tuple: (verdict, etag, last_modified) where verdict
+    is "unchanged", "changed" or "unknown" (no validators to compare, the
+    server doesn't support HEAD, the request failed or the URL isn't a
+    public http(s) address).
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        async with open_public("HEAD", url, headers=headers, timeout=PROBE_TIMEOUT) as response:
+            if response.status == 304:
+                return "unchanged", etag, last_modified
+            if response.status >= 400:
+                return "unknown", etag, last_modified
+            new_etag = response.headers.get("ETag")
+            new_last_modified = response.headers.get("Last-Modified")
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        return "unknown", etag, last_modified
+
+    if etag and new_etag:
+        verdict = "unchanged" if new_etag == etag else "changed"
+    elif last_modified and new_last_modified:
+        verdict = "unchanged" if new_last_modified == last_modified else "changed"
+    else:
+        verdict = "unknown"
+    return verdict, new_etag, new_last_modified
+
+
+def is_stale(source: Dict[str, Any], now: Optional[float] = None) -> bool:
+    return (now or time.time()) - source.get("fetched_at", 0) > REFRESH_MAX_AGE_SECONDS
+
+
+class ResearchStore:
+    def __init__(self, path: str = RESEARCH_STORE_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT * FROM prospects WHERE prospect_key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            sources = conn.execute("SELECT url, entry FROM sources WHERE prospect_key = ?", (key,)).fetchall()
+        return {
+            "report_draft": row["report_draft"] or "",
+            "scratchpad": row["scratchpad"] or "",
+            "final_report": row["final_report"] or "",
+            "updated_at": row["updated_at"],
+            "sources": {source["url"]: json.loads(source["entry"]) for source in sources},
+        }
+
+    def _save(self, key: str, business_info: Dict[str, Any], report: Dict[str, str],
+              sources: List[Dict[str, Any]]):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO prospects "
+                "(prospect_key, business_info, report_draft, scratchpad, final_report, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(business_info), report["report_draft"], report["scratchpad"],
+                 report["final_report"], now),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO sources (prospect_key, url, entry, fetched_at) VALUES (?, ?, ?, ?)",
+                [(key, canonicalize_url(s["url"]), json.dumps(s), s.get("fetched_at", now)) for s in sources],
+            )
+            conn.commit()
+
+    async def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        The prospect's stored report and sources (keyed by canonical URL), or None.
+        """
+        return await asyncio.to_thread(self._load, key)
+
+    async def save_run(self, key: str, final_state: Dict[str, Any]):
+        """
+        Stores the report and every source of a finished run, with the HTTP
+        validators its fetch returned, so the next refresh can ask the server
+        whether it changed. Sources fetched without validators (e.g. through
+        a reader proxy) are probed for them once, PROBE_CONCURRENCY at a
+        time. Extractions are stored inline rather than as content store
+        references, so the stored research outlives the content store's expiry.
+        """
+        sources = [dict(s) for s in (final_state.get("visited_pages") or {}).values()]
+        unprobed = [s for s in sources if not (s.get("probed") or s.get("etag") or s.get("last_modified"))]
+
+        async def limited_probe(url: str):
+            async with _probe_slots:
+                return await probe(url)
+
+        results = await asyncio.gather(*(limited_probe(s["url"]) for s in unprobed))
+        for source, (_, etag, last_modified) in zip(unprobed, results):
+            source.update({"etag": etag, "last_modified": last_modified})
+        for source in sources:
+            source["probed"] = True
+        for source in sources:
+            source["summary"] = await content_store.get(source.pop("summary_ref", None))
+
+        report = {field: final_state.get(field) or "" for field in ("report_draft", "scratchpad", "final_report")}
+        await asyncio.to_thread(self._save, key, final_state.get("business_info") or {}, report, sources)
+
+    def _count(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self._connect()
+            prospects = conn.execute("SELECT COUNT(*) FROM prospects").fetchone()[0]
+            sources = conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+        return {"prospects": prospects, "sources": sources}
+
+    async def stats(self) -> Dict[str, int]:
+        return await asyncio.to_thread(self._count)
+
+
+research_store = ResearchStore()
@@ -3,91 +3,176 @@ search_backends.py
 
 Provides an abstraction layer for different search backends, such as SerpAPI or
 Google's Custom Search JSON API.
+
+Every backend returns the same compact SearchResult items, without the
+pagemaps, metatags and thumbnails of the raw API responses, so results of
+several queries can be merged and rendered densely into a prompt.
 """
 
-from getpass import getpass
 import os
-import aiohttp
-from dotenv import load_dotenv
+from typing import Any, Dict, Iterable, List, Optional
+from typing_extensions import TypedDict
+
+from settings import credential, get_settings
+from http_client import get_session
+from cache import cached, canonicalize_url, domain_of, normalize_query
+from rate_limiter import RateLimited, parse_retry_after, rate_limited
+from telemetry import telemetry
+from tokenization import count_tokens
+
+
+# The search backend is chosen with SEARCH_BACKEND ("GOOGLE" or "SERPAPI",
+# see settings.py); its API keys are only looked up once it is used.
+
+# Endpoints, overridable to point at local stand-ins (see benchmarks/)
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search")
+GOOGLE_SEARCH_URL = os.getenv("GOOGLE_SEARCH_URL", "https://www.googleapis.com/customsearch/v1")
+
+# Snippets are cut to this many characters in prompts
+SEARCH_SNIPPET_MAX_CHARS = int(os.getenv("SEARCH_SNIPPET_MAX_CHARS", "240"))
 
-def _getpass(env_var: str):
-    if not os.environ.get(env_var):
-        os.environ[env_var] = getpass(f"{env_var}=")
 
+class SearchResult(TypedDict):
+    url: str
+    title: str
+    snippet: str
+    domain: str
+    # 1-based position in the backend's result list
+    rank: int
+    # Tokens the raw API item would have cost in a prompt, to measure savings
+    raw_tokens: int
 
-# -----------------------------
-# Choose which search backend to use here:
-SEARCH_BACKEND = "GOOGLE" 
-# Options: "SERPAPI" or "GOOGLE"
-# -----------------------------
-load_dotenv("../.env")
 
-_getpass("SERPAPI_API_KEY")
-SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY")
-_getpass("GOOGLE_SEARCH_KEY")
-_getpass("GOOGLE_SEARCH_CX")
-GOOGLE_SEARCH_KEY = os.getenv("GOOGLE_SEARCH_KEY")
-GOOGLE_SEARCH_CX = os.getenv("GOOGLE_SEARCH_CX")
+def search_result(url: str, title: str, snippet: str, rank: int, raw_item: Dict[str, Any]) -> SearchResult:
+    return {
+        "url": url,
+        "title": " ".join((title or "").split()),
+        "snippet": " ".join((snippet or "").split()),
+        "domain": domain_of(url),
+        "rank": rank,
+        "raw_tokens": count_tokens(str(raw_item)),
+    }
 
 
+def from_serpapi(items: List[Dict[str, Any]]) -> List[SearchResult]:
+    return [
+        search_result(item["link"], item.get("title", ""), item.get("snippet", ""),
+                      item.get("position") or rank, item)
+        for rank, item in enumerate(items, start=1) if item.get("link")
+    ]
+
+
+def from_google(items: List[Dict[str, Any]]) -> List[SearchResult]:
+    return [
+        search_result(item["link"], item.get("title", ""), item.get("snippet", ""), rank, item)
+        for rank, item in enumerate(items, start=1) if item.get("link")
+    ]
+
+
+def merge_results(result_lists: Iterable[List[SearchResult]]) -> List[SearchResult]:
+    """
+    Merges the results of several queries: one result per canonical URL,
+    kept at its best rank, ordered by rank (earlier queries first on ties).
+    """
+    merged: Dict[str, SearchResult] = {}
+    for results in result_lists:
+        for result in results:
+            key = canonicalize_url(result["url"])
+            if key not in merged or result["rank"] < merged[key]["rank"]:
+                merged[key] = result
+    return sorted(merged.values(), key=lambda result: result["rank"])
+
+
+def render_results(results: List[SearchResult]) -> str:
+    """
+    Dense prompt rendering: one numbered block of title, domain, URL and
+    trimmed snippet per result.
+    """
+    blocks = []
+    for number, result in enumerate(results, start=1):
+        snippet = result["snippet"]
+        if len(snippet) > SEARCH_SNIPPET_MAX_CHARS:
+            snippet = snippet[:SEARCH_SNIPPET_MAX_CHARS].rsplit(" ", 1)[0] + "…"
+        blocks.append(f"{number}. {result['title']} ({result['domain']})\n{result['url']}\n{snippet}".rstrip())
+    return "\n".join(blocks)
+
+
+@cached("serpapi", normalize_query)
+@rate_limited("serpapi", fallback=[])
 async def search_with_serpapi(query):
     """
     Perform a search query using SerpAPI.
-    Returns a list of 'organic_results' items (dicts).
+    Returns its 'organic_results' as SearchResult items.
     """
+    params = {
+        "q": query,
+        "api_key": credential("SERPAPI_API_KEY"),
+        "engine": "google"
+    }
     try:
-        params = {
-            "q": query,
-            "api_key": SERPAPI_API_KEY,
-            "engine": "google"
-        }
-        async with aiohttp.CachedSession() as session:
-            async with session.get("https://serpapi.com/search", params=params, timeout=30) as response:
-                response.raise_for_status()
-                data = await response.json()
-                return data.get("organic_results", [])
+        session = await get_session()
+        async with session.get(SERPAPI_URL, params=params) as response:
+            if response.status == 429:
+                raise RateLimited("serpapi", parse_retry_after(response.headers.get("Retry-After")))
+            response.raise_for_status()
+            data = await response.json()
+            return from_serpapi(data.get("organic_results", []))
+    except RateLimited:
+        raise
     except Exception as e:
         print(f"Error performing SerpAPI search for '{query}': {e}")
         return []
 
 
+@cached("google", normalize_query)
+@rate_limited("google", fallback=[])
 async def search_with_google_custom(query):
     """
     Perform a search query using Google's Custom Search JSON API.
-    Returns a standardized list of search result items (dicts).
+    Returns its 'items' as SearchResult items.
     """
+    params = {
+        "key": credential("GOOGLE_SEARCH_KEY"),
+        "cx": credential("GOOGLE_SEARCH_CX"),
+        "q": query,
+    }
     try:
         print("Using Google Custom Search API")
-        url = "https://www.googleapis.com/customsearch/v1"
-        params = {
-            "key": GOOGLE_SEARCH_KEY,
-            "cx": GOOGLE_SEARCH_CX,
-            "q": query,
-        }
-        async with aiohttp.CachedSession() as session:
-            async with session.get(url, params=params, timeout=30) as response:
-                response.raise_for_status()
-                data = await response.json()
-
-                # Typically, Google Custom Search items are found under "items"
-                items = data.get("items", [])
-                # Return or reformat them as needed to match the same "dict" structure
-                return items
+        url = GOOGLE_SEARCH_URL
+        session = await get_session()
+        async with session.get(url, params=params) as response:
+            if response.status == 429:
+                raise RateLimited("google", parse_retry_after(response.headers.get("Retry-After")))
+            response.raise_for_status()
+            data = await response.json()
+
+            # Typically, Google Custom Search items are found under "items"
+            return from_google(data.get("items", []))
+    except RateLimited:
+        raise
     except Exception as e:
         print(f"Error performing Google Custom Search for '{query}': {e}")
         return []
 
 
-async def search(query, backend="GOOGLE"):
+# Backend name -> (search function, provider)
+SEARCH_BACKENDS = {
+    "SERPAPI": (search_with_serpapi, "serpapi"),
+    "GOOGLE": (search_with_google_custom, "google"),
+}
+
+
+async def search(query, backend: Optional[str] = None) -> List[SearchResult]:
     """
     Main abstraction function that calls the appropriate backend
-    based on the SEARCH_BACKEND setting at the top of this file.
+    based on the SEARCH_BACKEND setting (see settings.py).
     """
     print("Performing search for:", query)
-    backend = backend or SEARCH_BACKEND
-    if backend == "SERPAPI":
-        return search_with_serpapi(query)
-    elif backend == "GOOGLE":
-        return search_with_google_custom(query)
-    else:
-        raise ValueError(f"Unknown search backend '{backend}'")
\ No newline at end of file
+    backend = backend or get_settings().search_backend
+    if backend not in SEARCH_BACKENDS:
+        raise ValueError(f"Unknown search backend '{backend}'")
+    search_fn, provider = SEARCH_BACKENDS[backend]
+    async with telemetry.span("search", provider, provider=provider) as span:
+        results = await search_fn(query)
+        span.set("results", len(results))
+        return results
\ No newline at end of file
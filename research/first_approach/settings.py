@@ -0,0 +1,97 @@
+"""
+settings.py
+
+Service configuration, resolved on first use rather than at import.
+
+Importing the service must not block: nothing here reads ../.env, prompts
+for a key or builds a client until a backend is actually used. The OpenAI
+SDK, the LangChain client and the token encoder are likewise imported on
+first use or warmed in the background once the service is ready (see
+ModelRouter.warm_up); what remains of `import main` (roughly 1.5-2 s) is
+FastAPI, LangGraph and LangChain core.
+
+- get_settings(): the backend choices and LLM temperature, from the environment
+  (after loading ENV_FILE once).
+- credential(name): an API key, at the moment a backend first needs it.
+  Missing keys raise MissingCredential; the interactive prompt of the
+  original scripts is only used when PROMPT_FOR_CREDENTIALS=1 and a
+  terminal is attached, so containers never hang on it.
+"""
+
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from getpass import getpass
+
+
+ENV_FILE = os.getenv("ENV_FILE", "../.env")
+PROMPT_FOR_CREDENTIALS = os.getenv("PROMPT_FOR_CREDENTIALS", "0") == "1"
+
+_env_lock = threading.Lock()
+_env_loaded = False
+
+
+class MissingCredential(RuntimeError):
+    """
+    Raised when a backend is used without its API key configured.
+    """
+
+    def __init__(self, env_var: str):
+        super().__init__(f"{env_var} is not set")
+        self.env_var = env_var
+
+
+def load_env():
+    """
+    Loads ENV_FILE into the environment once; variables already set win.
+    """
+    global _env_loaded
+    with _env_lock:
+        if _env_loaded:
+            return
+        _env_loaded = True
+        try:
+            from dotenv import load_dotenv
+        except ImportError:
+            return
+        load_dotenv(ENV_FILE)
+
+
+@dataclass(frozen=True)
+class Settings:
+    # "GOOGLE" or "SERPAPI"
+    search_backend: str
+    # "NATIVE", "JINA" or "FIRECRAWL"
+    fetch_backend: str
+    # Models are chosen per agent, see model_routing.py
+    llm_temperature: float
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    load_env()
+    return Settings(
+        search_backend=os.getenv("SEARCH_BACKEND", "GOOGLE").upper(),
+        fetch_backend=os.getenv("FETCH_BACKEND", "NATIVE").upper(),
+        llm_temperature=float(os.getenv("LLM_TEMPERATURE", "0")),
+    )
+
+
+def credential(env_var: str) -> str:
+    """
+    The value of an API key variable, loading ENV_FILE first.
+    """
+    load_env()
+    value = os.environ.get(env_var)
+    if not value and PROMPT_FOR_CREDENTIALS and sys.stdin.isatty():
+        value = os.environ[env_var] = getpass(f"{env_var}=")
+    if not value:
+        raise MissingCredential(env_var)
+    return value
+
+
+def has_credential(env_var: str) -> bool:
+    load_env()
+    return bool(os.environ.get(env_var))
@@ -1,14 +1,28 @@
+import json
+from itertools import chain
 from operator import add
 from typing import List, Dict, Optional, Annotated
 from typing_extensions import TypedDict, NotRequired
 from langgraph.graph.message import add_messages
 
+from cache import canonicalize_url
+
 class URLWithContext(TypedDict):
     research_question: str
     search_urls: List[str]
     search_context: str
 
 
+def _unique_urls(urls: Dict[str, str], update: List[str]) -> Dict[str, str]:
+    """
+    Adds URLs to an insertion-ordered set keyed by canonical URL; the first
+    spelling of a URL wins.
+    """
+    for url in update:
+        urls.setdefault(canonicalize_url(url), url)
+    return urls
+
+
 def add_urls_with_context(existing: list[URLWithContext], update: list[URLWithContext] | str):
     """
     Sometimes the query generator returns queries and urls at the same time.
@@ -16,23 +30,51 @@ def add_urls_with_context(existing: list[URLWithContext], update: list[URLWithCo
     to be explored but we need to find promising search results for queries first.
     We wait that we have gotten the urls for every query and finally recombine them
     with the initial urls.
+
+    Runs in linear time and never mutates the existing entries; a URL found
+    by several queries of the same question is explored once.
     """
     if update == "DELETE":
         return []
-    
-    grouped = {}
-    for item in (existing or []) + update:
-        if item['research_question'] in grouped:
-            grouped[item['research_question']]['search_urls'].extend(item['search_urls'])
-        else:
-            grouped[item['research_question']] = item.copy()
 
-    return list(grouped.values())
+    grouped: Dict[str, Dict] = {}
+    urls: Dict[str, Dict[str, str]] = {}
+    for item in chain(existing or [], update):
+        question = item['research_question']
+        if question not in grouped:
+            grouped[question] = item
+            urls[question] = {}
+        _unique_urls(urls[question], item['search_urls'])
+
+    return [{**item, 'search_urls': list(urls[question].values())} for question, item in grouped.items()]
+
+def _item_key(item) -> str:
+    return item if isinstance(item, str) else json.dumps(item, sort_keys=True, default=str)
 
 def extend_with_delete(existing: list, update: list | str):
+    """
+    Appends the items of an update that aren't in the list yet, keeping
+    their order. A repeated question or query would only be researched twice.
+    """
     if update == "DELETE":
         return []
-    return (existing or []) + update
+    if not existing:
+        return list({_item_key(item): item for item in update}.values())
+    seen = {_item_key(item) for item in existing}
+    merged = list(existing)
+    for item in update:
+        key = _item_key(item)
+        if key not in seen:
+            seen.add(key)
+            merged.append(item)
+    return merged
+
+def merge_visited(existing: dict, update: dict):
+    """
+    The visited-page index only grows during a run; later entries for the
+    same canonical URL win.
+    """
+    return {**(existing or {}), **update}
 
 
 class ProspectingAgentState(TypedDict, total=False):
@@ -47,8 +89,10 @@ class ProspectingAgentState(TypedDict, total=False):
         scratchpad (str): Internal notes, hypotheses, conflicts, and next steps.
         
         research_questions (List[str]): Up to 2 research questions that guide further exploration.
-        queries_contexts (List[Dict]): Search queries and contextual information for each question.
-        exploration_results (str): Summarized extracted information to be interpreted in the next step.
+        queries_with_contexts (List[Dict]): Search queries and contextual information for each question.
+        urls_with_contexts (List[Dict]): URLs to explore and contextual information for each question.
+        exploration_results (List[str]): References to the round's page extractions in the content
+            store (see content_store.py), consumed by the next interpretation step.
         final_report (str): The final refined version of the prospect engagement report.
 
         round_count (int): Number of completed research rounds.
@@ -59,6 +103,32 @@ class ProspectingAgentState(TypedDict, total=False):
         max_google_searches (int): Maximum allowed Google searches.
         num_page_fetches (int): Total number of pages fetched.
         max_page_fetches (int): Maximum allowed pages to fetch.
+        budget_exhausted (bool): Set once a node was denied a reservation; the run then finalizes early.
+
+        prefilter_llm (bool): Whether pages passing the lexical pre-filter also get a cheap LLM check.
+        pages_filtered (int): Total number of fetched pages the pre-filter kept from full extraction.
+        prefilter_tokens_saved (int): Estimated extraction tokens saved by the pre-filter.
+        search_tokens_saved (int): Estimated prompt tokens saved by rendering search results compactly.
+
+        visited_pages (Dict): Pages fetched in earlier rounds, keyed by canonical URL, with their
+            content fingerprint and a reference to their rendered extraction (see dedup.py).
+        duplicates_avoided (List[Dict]): Per round, how many URL and content duplicates were skipped.
+
+        execution_mode (str): "staged" runs query generation, search selection and extraction as
+            separate steps; "pipelined" streams each research question through all of them.
+
+        llm_mode (str): "realtime" sends LLM calls as chat completions; "batch" collects them
+            into OpenAI Batch API jobs and waits for the results.
+        selection_mode (str): How search results are selected: "llm", "local" (reranker only) or
+            "hybrid" (LLM picks from the reranker's shortlist); defaults to SELECTION_MODE.
+        model_routes (Dict[str, str]): Per-agent overrides of the model routing table, a tier
+            ("cheap", "strong") or a model name per agent (see model_routing.py).
+
+        refresh (bool): Refresh the prospect's stored research instead of starting from scratch.
+        prospect_key (str): Key of the prospect in the research store (see research_store.py).
+        sources_refreshed (Dict): How many stored sources a refresh checked, found unchanged or changed.
+
+        task_id (str): Identifier of the task running this workflow, used for process-wide accounting.
     """
 
 
@@ -70,10 +140,10 @@ class ProspectingAgentState(TypedDict, total=False):
     scratchpad: NotRequired[str]
 
     research_questions: Annotated[List[str], extend_with_delete]
-    queries_with_context: Annotated[List[Dict], extend_with_delete]
-    urls_with_context: Annotated[List[Dict], add_urls_with_context]
+    queries_with_contexts: Annotated[List[Dict], extend_with_delete]
+    urls_with_contexts: Annotated[List[Dict], add_urls_with_context]
 
-    exploration_results: NotRequired[str]
+    exploration_results: NotRequired[List[str]]
     final_report: NotRequired[str]
 
     round_count: NotRequired[int]
@@ -84,6 +154,26 @@ class ProspectingAgentState(TypedDict, total=False):
     max_google_searches: NotRequired[int]
     num_page_fetches: Annotated[int, add]
     max_page_fetches: NotRequired[int]
+    budget_exhausted: NotRequired[bool]
+
+    prefilter_llm: NotRequired[bool]
+    pages_filtered: Annotated[int, add]
+    prefilter_tokens_saved: Annotated[int, add]
+    search_tokens_saved: Annotated[int, add]
+
+    visited_pages: Annotated[Dict[str, Dict], merge_visited]
+    duplicates_avoided: Annotated[List[Dict], add]
+
+    execution_mode: NotRequired[str]
+    llm_mode: NotRequired[str]
+    selection_mode: NotRequired[str]
+    model_routes: NotRequired[Dict[str, str]]
+
+    refresh: NotRequired[bool]
+    prospect_key: NotRequired[str]
+    sources_refreshed: NotRequired[Dict]
+
+    task_id: NotRequired[str]
 
 
 # Factory function to initialize default values
@@ -104,14 +194,14 @@ def create_default_state(
         ProspectingState: A state dictionary with all fields initialized.
     """
     return {
-        "messages": [],
         "seller_profile": seller_profile,
         "business_info": business_info if business_info else {},
         "report_draft": "",
         "scratchpad": "",
         "research_questions": [],
-        "queries_contexts": [],
-        "exploration_results": "",
+        "queries_with_contexts": [],
+        "urls_with_contexts": [],
+        "exploration_results": [],
         "final_report": "",
 
         "round_count": 0,
@@ -121,5 +211,13 @@ def create_default_state(
         "num_google_searches": 0,
         "max_google_searches": 6,
         "num_page_fetches": 0,
-        "max_page_fetches": 15
+        "max_page_fetches": 15,
+        "budget_exhausted": False,
+        "pages_filtered": 0,
+        "prefilter_tokens_saved": 0,
+        "search_tokens_saved": 0,
+        "visited_pages": {},
+        "duplicates_avoided": [],
+        "execution_mode": "staged",
+        "llm_mode": "realtime",
     }
\ No newline at end of file
@@ -0,0 +1,213 @@
+"""
+task_store.py
+
+SQLite-backed store for research tasks submitted through /submit-task.
+
+Each task row keeps the task's status, callback URL, initial state and the
+batch it was submitted with (if any), so tasks
+that were pending or running when the service stopped can be resumed from
+their LangGraph checkpoint on the next start. The same database holds the
+callback outbox, so finished reports survive until they were delivered.
+Queries run in a worker thread to keep the event loop free.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+TASK_DB_PATH = os.getenv("TASK_DB_PATH", "tasks.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    callback_url TEXT NOT NULL,
+    initial_state TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    batch_id TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_status_idx ON tasks(status);
+
+CREATE TABLE IF NOT EXISTS callback_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    callback_url TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at REAL NOT NULL,
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS callback_outbox_due_idx ON callback_outbox(status, next_attempt_at);
+"""
+
+# Columns added after the first release, applied to existing databases
+_MIGRATIONS = {
+    ("tasks", "batch_id"): "ALTER TABLE tasks ADD COLUMN batch_id TEXT",
+}
+_INDEXES = "CREATE INDEX IF NOT EXISTS tasks_batch_idx ON tasks(batch_id);"
+
+# Statuses of tasks that have not reached a terminal state
+UNFINISHED_STATUSES = ("pending", "running")
+
+
+class TaskStore:
+    def __init__(self, path: str = TASK_DB_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self._migrate(self._conn)
+        return self._conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        for (table, column), statement in _MIGRATIONS.items():
+            columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                conn.execute(statement)
+        conn.executescript(_INDEXES)
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(sql, params).fetchall()
+            conn.commit()
+            return rows
+
+    async def _run(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    async def open(self):
+        await asyncio.to_thread(self._connect)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def create_task(self, task_id: str, callback_url: str, initial_state: Dict[str, Any],
+                          batch_id: Optional[str] = None):
+        now = time.time()
+        await self._run(
+            "INSERT INTO tasks (task_id, status, callback_url, initial_state, created_at, updated_at, batch_id) "
+            "VALUES (?, 'pending', ?, ?, ?, ?, ?)",
+            (task_id, callback_url, json.dumps(initial_state), now, now, batch_id),
+        )
+
+    async def set_status(self, task_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+                         error: Optional[str] = None):
+        await self._run(
+            "UPDATE tasks SET status = ?, result = ?, error = ?, updated_at = ? WHERE task_id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), task_id),
+        )
+
+    async def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the task's status and outcome, without its initial state.
+        """
+        rows = await self._run(
+            "SELECT task_id, batch_id, status, result, error, created_at, updated_at FROM tasks WHERE task_id = ?",
+            (task_id,),
+        )
+        if not rows:
+            return None
+        task = dict(rows[0])
+        task["result"] = json.loads(task["result"]) if task["result"] else None
+        return task
+
+    async def unfinished_tasks(self) -> List[Dict[str, Any]]:
+        """
+        Tasks that were pending or running when the service last stopped.
+        """
+        placeholders = ", ".join("?" for _ in UNFINISHED_STATUSES)
+        rows = await self._run(
+            f"SELECT task_id, batch_id, callback_url, initial_state FROM tasks WHERE status IN ({placeholders}) "
+            "ORDER BY created_at",
+            UNFINISHED_STATUSES,
+        )
+        return [
+            {"task_id": row["task_id"], "batch_id": row["batch_id"], "callback_url": row["callback_url"],
+             "initial_state": json.loads(row["initial_state"])}
+            for row in rows
+        ]
+
+    async def batch_tasks(self, batch_id: str) -> List[Dict[str, Any]]:
+        """
+        The tasks of a batch in submission order, with the prospect each one researches.
+        """
+        rows = await self._run(
+            "SELECT task_id, status, initial_state, result, error, updated_at FROM tasks "
+            "WHERE batch_id = ? ORDER BY created_at, rowid",
+            (batch_id,),
+        )
+        return [
+            {"task_id": row["task_id"], "status": row["status"],
+             "business_info": json.loads(row["initial_state"]).get("business_info", {}),
+             "result": json.loads(row["result"]) if row["result"] else None,
+             "error": row["error"], "updated_at": row["updated_at"]}
+            for row in rows
+        ]
+
+    async def count_by_status(self) -> Dict[str, int]:
+        rows = await self._run("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status")
+        return {row["status"]: row["n"] for row in rows}
+
+    ###########################
+    # Callback outbox
+    ###########################
+
+    async def enqueue_callback(self, task_id: str, callback_url: str, payload: Dict[str, Any]):
+        now = time.time()
+        await self._run(
+            "INSERT INTO callback_outbox (task_id, callback_url, payload, next_attempt_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (task_id, callback_url, json.dumps(payload), now, now),
+        )
+
+    async def due_callbacks(self, limit: int = 100) -> List[Dict[str, Any]]:
+        rows = await self._run(
+            "SELECT id, task_id, callback_url, payload, attempts, created_at FROM callback_outbox "
+            "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+            (time.time(), limit),
+        )
+        return [{**dict(row), "payload": json.loads(row["payload"])} for row in rows]
+
+    async def mark_callbacks_delivered(self, ids: List[int]):
+        placeholders = ", ".join("?" for _ in ids)
+        await self._run(
+            f"UPDATE callback_outbox SET status = 'delivered', delivered_at = ? WHERE id IN ({placeholders})",
+            (time.time(), *ids),
+        )
+
+    async def reschedule_callbacks(self, ids: List[int], next_attempt_at: float, error: str, give_up: bool):
+        placeholders = ", ".join("?" for _ in ids)
+        await self._run(
+            f"UPDATE callback_outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?, "
+            f"status = ? WHERE id IN ({placeholders})",
+            (next_attempt_at, error, "failed" if give_up else "pending", *ids),
+        )
+
+    async def count_callbacks_by_status(self) -> Dict[str, int]:
+        rows = await self._run("SELECT status, COUNT(*) AS n FROM callback_outbox GROUP BY status")
+        return {row["status"]: row["n"] for row in rows}
+
+
+task_store = TaskStore()
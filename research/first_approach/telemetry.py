@@ -0,0 +1,216 @@
+"""
+telemetry.py
+
+Structured, OpenTelemetry-style spans for research runs.
+
+Every graph node, LLM call, search and page fetch runs inside a span that
+records its latency and attributes such as prompt/completion tokens, cost,
+cache hits and retries. Spans of one run share its task id as trace id and
+nest through a context variable, so a node's LLM calls and fetches point to
+the node's span as their parent.
+
+Finished spans feed the per-node and per-provider latency windows behind
+/metrics and, if TELEMETRY_EXPORT is set, are exported in batches: a file
+path receives JSON lines, an http(s) URL receives POSTs of {"spans": [...]}
+(e.g. a local collector).
+"""
+
+import asyncio
+import json
+import os
+import secrets
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+from metrics import LatencyWindow
+
+
+TELEMETRY_EXPORT = os.getenv("TELEMETRY_EXPORT", "")
+TELEMETRY_FLUSH_SECONDS = float(os.getenv("TELEMETRY_FLUSH_SECONDS", "5"))
+# Spans beyond this many waiting for export are dropped
+TELEMETRY_MAX_BUFFER = int(os.getenv("TELEMETRY_MAX_BUFFER", "10000"))
+
+# Attributes summed per (kind, name) for /metrics
+_TOTALED_ATTRIBUTES = ("tokens", "prompt_tokens", "completion_tokens", "cost_usd", "retries")
+
+
+class Span:
+    def __init__(self, kind: str, name: str, trace_id: Optional[str], parent_id: Optional[str],
+                 attributes: Dict[str, Any]):
+        self.kind = kind
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_time = time.time()
+        self.duration = 0.0
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add(self, key: str, amount: float = 1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_seconds": round(self.duration, 4),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def annotate(key: str, value: Any):
+    """
+    Sets an attribute on the current span, if there is one.
+    """
+    span = _current_span.get()
+    if span is not None:
+        span.set(key, value)
+
+
+def count(key: str, amount: float = 1):
+    """
+    Adds to a counter attribute of the current span, if there is one.
+    """
+    span = _current_span.get()
+    if span is not None:
+        span.add(key, amount)
+
+
+class Telemetry:
+    def __init__(self, export_to: str = TELEMETRY_EXPORT):
+        self.export_to = export_to
+        self._buffer: List[Dict[str, Any]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self.latencies: Dict[tuple, LatencyWindow] = defaultdict(LatencyWindow)
+        self.totals: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self.dropped = 0
+
+    @asynccontextmanager
+    async def span(self, kind: str, name: str, trace_id: Optional[str] = None, **attributes):
+        parent = _current_span.get()
+        if trace_id is None and parent is not None:
+            trace_id = parent.trace_id
+        span = Span(kind, name, trace_id, parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        started = time.monotonic()
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.monotonic() - started
+            _current_span.reset(token)
+            self._record(span)
+
+    def _record(self, span: Span):
+        groups = [(span.kind, span.name)]
+        if span.attributes.get("provider"):
+            groups.append(("provider", span.attributes["provider"]))
+        for group in groups:
+            self.latencies[group].add(span.duration)
+            totals = self.totals[group]
+            totals["errors"] += span.status == "error"
+            totals["cache_hits"] += bool(span.attributes.get("cache_hit"))
+            for key in _TOTALED_ATTRIBUTES:
+                totals[key] += span.attributes.get(key) or 0
+
+        if self.export_to:
+            if len(self._buffer) >= TELEMETRY_MAX_BUFFER:
+                self.dropped += 1
+            else:
+                self._buffer.append(span.to_dict())
+
+    async def start(self):
+        if self.export_to:
+            self._flush_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+            await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(TELEMETRY_FLUSH_SECONDS)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Telemetry export failed: {e}")
+
+    async def flush(self):
+        spans, self._buffer = self._buffer, []
+        if not spans:
+            return
+        if self.export_to.startswith(("http://", "https://")):
+            from http_client import get_session
+            session = await get_session()
+            async with session.post(self.export_to, json={"spans": spans}) as response:
+                response.raise_for_status()
+        else:
+            await asyncio.to_thread(self._append_lines, spans)
+
+    def _append_lines(self, spans: List[Dict[str, Any]]):
+        with open(self.export_to, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span) + "\n")
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Latency percentiles and totals, grouped by span kind, then name.
+        """
+        report: Dict[str, Dict[str, Any]] = defaultdict(dict)
+        for (kind, name), window in sorted(self.latencies.items()):
+            totals = self.totals[(kind, name)]
+            report[kind][name] = {
+                "latency_seconds": window.summary(),
+                **{key: round(value, 6) for key, value in totals.items()},
+            }
+        return {"spans": report, "export": {"target": self.export_to or None,
+                                            "buffered": len(self._buffer), "dropped": self.dropped}}
+
+
+telemetry = Telemetry()
+
+
+def traced_node(name: str, fn):
+    """
+    Wraps a graph node so every invocation runs in a "node" span, tagged
+    with the run's task id and round and the tokens the node reported.
+    """
+    @wraps(fn)
+    async def node(state):
+        if state.get("log_steps"):
+            print(f"[LOG] Running node: {name}")
+        async with telemetry.span("node", name, trace_id=state.get("task_id"),
+                                  round=state.get("round_count", 0)) as span:
+            update = await fn(state)
+            if isinstance(update, dict):
+                span.set("tokens", update.get("total_tokens_used", 0))
+            return update
+    return node
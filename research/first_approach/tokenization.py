@@ -0,0 +1,46 @@
+"""
+tokenization.py
+
+Token counting shared by the agents and the page chunker. The encoder is
+loaded once per process.
+"""
+
+from functools import lru_cache
+from typing import Dict, Tuple
+
+
+# USD per million (prompt, completion) tokens
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+# The Batch API bills half the real-time price
+BATCH_DISCOUNT = 0.5
+
+
+@lru_cache(maxsize=1)
+def get_encoder():
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(prompt_text: str, completion_text: str = "", model_name: str = "gpt-4o-mini") -> int:
+    """
+    Approximate token counting for the prompt and completion using tiktoken.
+    Only used where the API response doesn't report usage.
+    """
+    encoder = get_encoder()
+    prompt_tokens = len(encoder.encode(prompt_text))
+    completion_tokens = len(encoder.encode(completion_text)) if completion_text else 0
+    return prompt_tokens + completion_tokens
+
+
+def estimate_cost(model_name: str, prompt_tokens: int, completion_tokens: int, batch: bool = False) -> float:
+    """
+    Estimated price of a call in USD, 0 for models without a known price.
+    """
+    prompt_price, completion_price = MODEL_PRICES.get(model_name, (0.0, 0.0))
+    cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
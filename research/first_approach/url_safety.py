@@ -0,0 +1,68 @@
+"""
+url_safety.py
+
+Guards the requests the service sends to URLs it didn't choose itself:
+page URLs come from search results and LLM output, so without a check a
+prompt-injected page could make the service fetch its own admin endpoints,
+the cloud metadata service (169.254.169.254) or hosts on the private
+network, and hand their answers to the report and the callback.
+
+Only http(s) URLs whose host resolves exclusively to public addresses pass.
+Hosts in FETCH_ALLOWED_PRIVATE_HOSTS are exempt (e.g. local stand-ins,
+see benchmarks/). Redirects are checked hop by hop (see
+http_client.open_public).
+"""
+
+import asyncio
+import ipaddress
+import os
+import socket
+from urllib.parse import urlsplit
+
+
+FETCH_ALLOWED_PRIVATE_HOSTS = frozenset(
+    host.strip().lower() for host in os.getenv("FETCH_ALLOWED_PRIVATE_HOSTS", "").split(",") if host.strip()
+)
+
+
+class UnsafeURL(ValueError):
+    """
+    Raised for URLs the service must not request.
+    """
+
+
+def is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def check_public_url(url: str):
+    """
+    Raises UnsafeURL unless the URL is http(s) and its host only resolves
+    to public addresses.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        raise UnsafeURL(f"Unsupported scheme in {url!r}")
+    host = (parts.hostname or "").lower()
+    if not host:
+        raise UnsafeURL(f"No host in {url!r}")
+    if host in FETCH_ALLOWED_PRIVATE_HOSTS:
+        return
+    try:
+        addresses = [str(ipaddress.ip_address(host))]
+    except ValueError:
+        try:
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+        except ValueError:
+            raise UnsafeURL(f"Invalid port in {url!r}")
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise UnsafeURL(f"Cannot resolve {host}: {e}")
+        addresses = [info[4][0] for info in infos]
+    blocked = [address for address in addresses if not is_public_address(address)]
+    if blocked or not addresses:
+        raise UnsafeURL(f"{host} resolves to a non-public address ({', '.join(blocked) or 'none'})")
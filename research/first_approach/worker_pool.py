@@ -0,0 +1,169 @@
+"""
+worker_pool.py
+
+Bounded worker pool and priority admission queue for research tasks.
+
+Instead of starting every submitted workflow at once, /submit-task enqueues
+it here. A fixed number of workers drain the queue in priority order, and
+submissions are rejected once the queue is full, so the caller can back off
+(HTTP 429) instead of the service flooding OpenAI, Google and Jina.
+
+Tasks in LLM batch mode spend most of their time waiting for the Batch API
+and run on a separate, much wider pool, so they neither hold up real-time
+tasks nor limit how many calls end up in one batch.
+
+CPU-bound helpers (token counting, JSON parsing) can optionally be spread
+over a process pool with `run_cpu_bound`; `run_off_loop` always keeps them
+off the event loop.
+"""
+
+import asyncio
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from metrics import LatencyWindow
+
+
+RESEARCH_WORKERS = int(os.getenv("RESEARCH_WORKERS", "8"))
+RESEARCH_MAX_QUEUE = int(os.getenv("RESEARCH_MAX_QUEUE", "500"))
+RESEARCH_BATCH_MODE_WORKERS = int(os.getenv("RESEARCH_BATCH_MODE_WORKERS", "200"))
+RESEARCH_BATCH_MODE_MAX_QUEUE = int(os.getenv("RESEARCH_BATCH_MODE_MAX_QUEUE", "5000"))
+# 0 keeps CPU-bound helpers on the event loop thread
+RESEARCH_CPU_PROCESSES = int(os.getenv("RESEARCH_CPU_PROCESSES", "0"))
+
+
+class QueueFull(Exception):
+    """
+    Raised when a task is submitted while the admission queue is full.
+    """
+
+
+@dataclass(order=True)
+class _Job:
+    sort_key: tuple
+    task_id: str = field(compare=False)
+    run: Callable[[], Awaitable[Any]] = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class WorkerPool:
+    def __init__(self, workers: int = RESEARCH_WORKERS, max_queue: int = RESEARCH_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._sequence = itertools.count()
+        self._waits = LatencyWindow()
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def start(self):
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        Cancels the workers. Queued and running tasks stay unfinished in the
+        task store and are resumed on the next start.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def is_full(self) -> bool:
+        return self.depth >= self.max_queue
+
+    def submit(self, task_id: str, run: Callable[[], Awaitable[Any]], priority: int = 0, force: bool = False):
+        """
+        Enqueues `run` (a zero-argument coroutine function). Higher priorities
+        run first, ties in submission order. `force` skips the queue limit and
+        is used for tasks resumed after a restart.
+        """
+        if not force and self.is_full():
+            self.rejected += 1
+            raise QueueFull(f"Admission queue is full ({self.max_queue} tasks waiting)")
+        job = _Job((-priority, next(self._sequence)), task_id, run, time.monotonic())
+        self._queue.put_nowait(job)
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            self._waits.add(time.monotonic() - job.enqueued_at)
+            self.running += 1
+            try:
+                await job.run()
+            except Exception as e:
+                print(f"Worker: task {job.task_id} failed outside of its workflow: {e}")
+            finally:
+                self.running -= 1
+                self.completed += 1
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queue_depth": self.depth,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds": self._waits.summary(),
+        }
+
+
+worker_pool = WorkerPool()
+batch_mode_pool = WorkerPool(RESEARCH_BATCH_MODE_WORKERS, RESEARCH_BATCH_MODE_MAX_QUEUE)
+
+
+def pool_for(llm_mode: Optional[str]) -> WorkerPool:
+    return batch_mode_pool if llm_mode == "batch" else worker_pool
+
+
+###########################
+# CPU-bound helpers
+###########################
+
+_cpu_executor: Optional[ProcessPoolExecutor] = None
+
+
+def start_cpu_pool(processes: int = RESEARCH_CPU_PROCESSES):
+    global _cpu_executor
+    if processes > 0 and _cpu_executor is None:
+        _cpu_executor = ProcessPoolExecutor(max_workers=processes)
+
+
+def stop_cpu_pool():
+    global _cpu_executor
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(cancel_futures=True)
+        _cpu_executor = None
+
+
+async def run_cpu_bound(fn: Callable, *args) -> Any:
+    """
+    Runs a picklable, module-level function in the process pool if one is
+    configured, otherwise inline.
+    """
+    if _cpu_executor is None:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(_cpu_executor, fn, *args)
+
+
+async def run_off_loop(fn: Callable, *args) -> Any:
+    """
+    Like run_cpu_bound, but without a process pool runs the function in a
+    thread instead of inline, for work too heavy for the event loop (HTML parsing).
+    """
+    if _cpu_executor is None:
+        return await asyncio.to_thread(fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(_cpu_executor, fn, *args)
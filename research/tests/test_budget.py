@@ -0,0 +1,80 @@
+import budget
+from budget import BudgetGovernor, ProcessBudget
+
+
+def _process(limit=None, **kwargs):
+    return ProcessBudget({"tokens": limit, "google_searches": None, "page_fetches": None}, **kwargs)
+
+
+def _state(task_id="task-1", **fields):
+    return {"task_id": task_id, **fields}
+
+
+def test_reservations_stop_at_the_run_limit():
+    governor = BudgetGovernor(_state(max_page_fetches=3, num_page_fetches=1), _process())
+    assert governor.reserve("page_fetches") and governor.reserve("page_fetches")
+    assert not governor.reserve("page_fetches")
+    assert governor.exhausted and governor.denied == {"page_fetches"}
+    # Resources without a run limit are only bounded by the process budget
+    assert governor.reserve("google_searches", 1000)
+
+
+def test_forced_reservations_are_granted_but_counted():
+    process = _process(limit=100)
+    governor = BudgetGovernor(_state(max_tokens=50, total_tokens_used=40), process)
+    assert not governor.reserve("tokens", 30)
+    assert governor.reserve("tokens", 200, force=True)
+    assert governor.remaining["tokens"] == -190
+    assert process.used["tokens"] == 200
+    # Once over, unforced reservations are denied by both budgets
+    assert not BudgetGovernor(_state(task_id="task-2"), process).reserve("tokens", 1)
+
+
+def test_settle_gives_back_or_adds_the_difference():
+    process = _process(limit=10_000)
+    governor = BudgetGovernor(_state(max_tokens=5000), process)
+    assert governor.reserve("tokens", 1500)
+    governor.settle("tokens", reserved=1500, actual=900)
+    assert process.used["tokens"] == 900 and governor.remaining["tokens"] == 4100
+    assert governor.reserve("tokens", 1000)
+    governor.settle("tokens", reserved=1000, actual=1800)
+    assert process.used["tokens"] == 2700 and governor.remaining["tokens"] == 2300
+
+
+def test_tasks_may_borrow_beyond_their_share_until_half_the_window_is_used():
+    process = _process(limit=200)
+    for task_id in ("a", "b", "c", "d"):
+        process.register_task(task_id)
+    # Fair share is 50 per task; "a" borrows while at most half is used
+    assert process.try_reserve("a", "tokens", 80)
+    assert not process.try_reserve("a", "tokens", 30)
+    # Past the halfway mark the others get their share, but no more
+    assert process.try_reserve("b", "tokens", 50)
+    assert not process.try_reserve("c", "tokens", 51)
+    assert process.try_reserve("c", "tokens", 50)
+    # The hard limit holds even within a share
+    assert not process.try_reserve("d", "tokens", 21)
+    assert process.try_reserve("d", "tokens", 20)
+    assert process.used_by_task["tokens"] == {"a": 80, "b": 50, "c": 50, "d": 20}
+
+
+def test_a_single_task_may_use_the_whole_window():
+    process = _process(limit=100)
+    process.register_task("a")
+    assert process.try_reserve("a", "tokens", 90)
+    assert process.try_reserve("a", "tokens", 10)
+    assert not process.try_reserve("a", "tokens", 1)
+
+
+def test_usage_resets_with_the_window_and_when_a_task_ends(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(budget.time, "monotonic", lambda: clock[0])
+    process = _process(limit=100, window_seconds=60)
+    process.register_task("a")
+    assert process.try_reserve("a", "tokens", 100)
+    assert not process.try_reserve("a", "tokens", 1)
+    clock[0] += 60
+    assert process.try_reserve("a", "tokens", 1)
+
+    process.unregister_task("a")
+    assert process.active_tasks == set() and process.used_by_task["tokens"] == {}
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from cache import AsyncResponseCache, make_key, size_of
+
+
+def test_coalesced_requests_share_one_fetch():
+    async def scenario():
+        cache = AsyncResponseCache()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "page"
+
+        results = await asyncio.gather(*(cache.get_or_fetch("jina", "https://example.com", fetch)
+                                         for _ in range(5)))
+        assert results == ["page"] * 5
+        assert calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_waiter_fetches_itself_when_owner_is_cancelled():
+    async def scenario():
+        cache = AsyncResponseCache()
+        owner_started = asyncio.Event()
+
+        async def slow_fetch():
+            owner_started.set()
+            await asyncio.sleep(10)
+            return "owner"
+
+        async def own_fetch():
+            return "waiter"
+
+        owner = asyncio.create_task(cache.get_or_fetch("jina", "https://example.com", slow_fetch))
+        await owner_started.wait()
+        waiter = asyncio.create_task(cache.get_or_fetch("jina", "https://example.com", own_fetch))
+        await asyncio.sleep(0)
+        owner.cancel()
+
+        assert await waiter == "waiter"
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        assert cache.get(make_key("jina", "https://example.com")) == "waiter"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_stays_cancelled():
+    async def scenario():
+        cache = AsyncResponseCache()
+        owner_started = asyncio.Event()
+
+        async def slow_fetch():
+            owner_started.set()
+            await asyncio.sleep(0.05)
+            return "owner"
+
+        owner = asyncio.create_task(cache.get_or_fetch("jina", "https://example.com", slow_fetch))
+        await owner_started.wait()
+        waiter = asyncio.create_task(cache.get_or_fetch("jina", "https://example.com", slow_fetch))
+        await asyncio.sleep(0)
+        waiter.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert await owner == "owner"
+
+    asyncio.run(scenario())
+
+
+def test_entries_are_evicted_once_the_byte_cap_is_exceeded():
+    page = "x" * 1000
+    cache = AsyncResponseCache(max_entries=100, max_bytes=3 * size_of(page))
+    for i in range(3):
+        cache.set("jina", f"page-{i}", page)
+    cache.get("page-0")
+    cache.set("jina", "page-3", page)
+    # The least recently used page made room
+    assert cache.get("page-1") is None
+    assert all(cache.get(f"page-{i}") == page for i in (0, 2, 3))
+    assert cache.stats()["bytes"] == 3 * size_of(page)
+
+    # A value larger than the whole cache is not kept and evicts nothing
+    cache.set("jina", "huge", "x" * 5000)
+    assert cache.get("huge") is None and cache.stats()["entries"] == 3
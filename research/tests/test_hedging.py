@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+import fetch_backends
+import hedging
+from hedging import CIRCUIT_FAILURE_THRESHOLD, DomainTracker
+from telemetry import annotate
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = DomainTracker()
+    monkeypatch.setattr(hedging, "domain_tracker", tracker)
+    monkeypatch.setattr(fetch_backends, "domain_tracker", tracker)
+    return tracker
+
+
+def _native_backend(monkeypatch, **annotations):
+    async def fetch(url):
+        for key, value in annotations.items():
+            annotate(key, value)
+        return ""
+
+    monkeypatch.setattr(fetch_backends, "FETCH_HEDGE_BACKEND", "NONE")
+    monkeypatch.setitem(fetch_backends.BACKENDS, "NATIVE", (fetch, "native", None))
+    monkeypatch.setattr(fetch_backends, "get_settings", lambda: type("S", (), {"fetch_backend": "NATIVE"})())
+
+
+@pytest.mark.parametrize("annotations", [{"fetch_error": "client_error"}, {"content_type": "application/pdf"},
+                                         {"needs_javascript": True}])
+def test_missing_pages_and_unsupported_types_keep_the_circuit_closed(monkeypatch, tracker, annotations):
+    _native_backend(monkeypatch, **annotations)
+
+    async def scenario():
+        for i in range(CIRCUIT_FAILURE_THRESHOLD + 2):
+            assert await fetch_backends.fetch_page(f"https://shop.example.com/guessed-{i}") == ""
+
+    asyncio.run(scenario())
+    assert tracker.circuits_opened == 0 and tracker.allow("shop.example.com")
+
+
+@pytest.mark.parametrize("error", ["server_error", "timeout", "connection"])
+def test_failing_domains_open_the_circuit(monkeypatch, tracker, error):
+    _native_backend(monkeypatch, fetch_error=error)
+
+    async def scenario():
+        for i in range(CIRCUIT_FAILURE_THRESHOLD):
+            await fetch_backends.fetch_page(f"https://shop.example.com/page-{i}")
+
+    asyncio.run(scenario())
+    assert tracker.circuits_opened == 1 and not tracker.allow("shop.example.com")
+
+
+def _backend(name, seconds, content="", calls=None, cancelled=None):
+    async def fetch(url):
+        if calls is not None:
+            calls.append(name)
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(name)
+            raise
+        if isinstance(content, Exception):
+            raise content
+        return content
+    return name, fetch
+
+
+def test_hedge_delay_follows_the_latency_percentile_within_bounds(tracker):
+    assert tracker.hedge_delay("slow.example") == hedging.FETCH_HEDGE_DEFAULT_DELAY
+    for seconds in (2.0, 2.0, 2.0, 2.0, 3.0):
+        tracker.record("slow.example", seconds, True)
+    assert tracker.hedge_delay("slow.example") == pytest.approx(3.0, abs=0.5)
+    # Domains without enough samples of their own use the latencies of all domains
+    assert tracker.hedge_delay("new.example") == tracker.hedge_delay("slow.example")
+    for _ in range(10):
+        tracker.record("crawl.example", 120.0, True)
+    assert tracker.hedge_delay("crawl.example") == hedging.FETCH_HEDGE_MAX_DELAY
+
+
+def test_slow_primary_is_hedged_and_cancelled_when_the_alternate_wins(tracker):
+    cancelled = []
+
+    async def scenario():
+        return await hedging.hedged("https://a.example", _backend("native", 5, "slow", cancelled=cancelled),
+                                    _backend("jina", 0.01, "fast"), delay=0.05)
+
+    assert asyncio.run(scenario()) == ("fast", "jina")
+    assert cancelled == ["native"]
+    assert (tracker.hedges, tracker.fallbacks, tracker.alternate_wins) == (1, 0, 1)
+
+
+@pytest.mark.parametrize("failure", ["", ConnectionError("refused")])
+def test_fast_primary_failure_falls_back_immediately(tracker, failure):
+    async def scenario():
+        started = asyncio.get_running_loop().time()
+        result = await hedging.hedged("https://a.example", _backend("native", 0, failure),
+                                      _backend("jina", 0.01, "page"), delay=5)
+        return result, asyncio.get_running_loop().time() - started
+
+    (content, winner), elapsed = asyncio.run(scenario())
+    assert (content, winner) == ("page", "jina") and elapsed < 1
+    assert (tracker.hedges, tracker.fallbacks) == (0, 1)
+
+
+def test_fast_primary_needs_no_alternate(tracker):
+    calls = []
+
+    async def scenario():
+        return await hedging.hedged("https://a.example", _backend("native", 0, "page", calls),
+                                    _backend("jina", 0, "other", calls), delay=1)
+
+    assert asyncio.run(scenario()) == ("page", "native")
+    assert calls == ["native"]
+
+
+def test_open_circuit_lets_one_trial_through_after_the_open_period(monkeypatch, tracker):
+    clock = [1000.0]
+    monkeypatch.setattr(hedging.time, "monotonic", lambda: clock[0])
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        tracker.record("down.example", 1.0, False)
+    assert not tracker.allow("down.example")
+
+    clock[0] += hedging.CIRCUIT_OPEN_SECONDS
+    assert tracker.allow("down.example")
+    # Only one trial until its outcome is known
+    assert not tracker.allow("down.example")
+    tracker.record("down.example", 1.0, True)
+    assert tracker.allow("down.example") and tracker.allow("down.example")
+
+    # A failed trial keeps the circuit open for another period
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        tracker.record("down.example", 1.0, False)
+    clock[0] += hedging.CIRCUIT_OPEN_SECONDS
+    assert tracker.allow("down.example")
+    tracker.record("down.example", 1.0, False)
+    clock[0] += hedging.CIRCUIT_OPEN_SECONDS / 2
+    assert not tracker.allow("down.example")
@@ -0,0 +1,22 @@
+from llm_cache import near_duplicate_key
+
+INPUT = {
+    "seller_profile": "We offer AI-driven marketing automation solutions.",
+    "business_info": {"business_name": "Cafe Blau", "website": "https://cafe-blau.de"},
+    "research_question": "Which opening hours does the cafe publish?",
+    "search_context": "Opening hours and contact details",
+    "page_content": "Cafe Blau\n\nOpen daily from 8 to 18.",
+}
+
+
+def test_near_duplicate_key_ignores_whitespace_and_case():
+    variant = {**INPUT, "page_content": "  cafe blau   open DAILY from 8 to 18. "}
+    assert near_duplicate_key("gpt-4o-mini", "schema", variant) == near_duplicate_key("gpt-4o-mini", "schema", INPUT)
+
+
+def test_near_duplicate_key_separates_prospects_and_contexts():
+    key = near_duplicate_key("gpt-4o-mini", "schema", INPUT)
+    other_prospect = {**INPUT, "business_info": {"business_name": "Bäckerei Rot", "website": "https://rot.de"}}
+    other_context = {**INPUT, "search_context": "Reviews mentioning the breakfast menu"}
+    assert near_duplicate_key("gpt-4o-mini", "schema", other_prospect) != key
+    assert near_duplicate_key("gpt-4o-mini", "schema", other_context) != key
@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from native_fetch import _TextStats, _TreeBuilder, _text, _walk, html_to_markdown  # noqa: E402
+
+
+def _markdown(html: str) -> str:
+    return html_to_markdown(html)[0]
+
+
+def test_unclosed_items_rows_and_cells_close_their_siblings():
+    assert _markdown("<ul><li>one<li>two<ul><li>two.a<li>two.b</ul><li>three</ul>") == (
+        "- one\n- two two.a two.b\n- three"
+    )
+    assert _markdown("<table><tr><th>Day<th>Hours<tr><td>Mon<td>9-17</table>") == (
+        "| Day | Hours |\n| Mon | 9-17 |"
+    )
+
+
+def test_text_stats_match_the_extracted_text():
+    builder = _TreeBuilder()
+    builder.feed("<div> Open  daily, <a href='/h'>see hours</a><p>Call us,<br>or write.</p>  </div><li>x")
+    builder.close()
+    stats = _TextStats(builder.root)
+    for node in _walk(builder.root):
+        assert stats.length(node) == len(_text(node))
+        assert stats.commas(node) == _text(node).count(",")
+
+
+def test_deeply_nested_pages_are_extracted():
+    html = "<div>" * 5000 + "<p>" + "Deep text, " * 20 + "</p><pre>code</pre>" + "</div>" * 5000
+    assert _markdown(html).startswith("Deep text, Deep text,")
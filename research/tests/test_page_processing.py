@@ -0,0 +1,24 @@
+import time
+
+from page_processing import is_link_only, strip_boilerplate
+
+
+def test_navigation_lines_are_dropped_and_inline_links_keep_their_text():
+    page = (
+        "- [Home](https://a.de) | [About](https://a.de/about) · [Contact](https://a.de/contact)\n"
+        "We are open daily, see [our hours](https://a.de/hours).\n"
+    )
+    assert strip_boilerplate(page) == "We are open daily, see our hours."
+
+
+def test_link_only_check_is_linear_on_long_navigation_lines():
+    links = [f"[Item {i}](https://example.com/{i})" for i in range(40)]
+    lines = [
+        " ".join(links) + " and some trailing text",
+        "  ".join(links) + " x",
+        " | ".join(links) + " |",
+    ]
+    started = time.perf_counter()
+    assert [is_link_only(line) for line in lines] == [False, False, True]
+    strip_boilerplate("\n".join(lines * 50))
+    assert time.perf_counter() - started < 1.0
@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+from rate_limiter import LIMITERS, ProviderLimiter, model_limiter
+
+
+def test_models_get_their_own_limiters(monkeypatch):
+    monkeypatch.setenv("OPENAI_TPM_GPT_4O", "30000")
+    strong, cheap = model_limiter("gpt-4o"), model_limiter("gpt-4o-mini")
+    assert strong is not cheap and model_limiter("gpt-4o") is strong
+    assert LIMITERS["openai:gpt-4o"] is strong and strong.tokens.per_minute == 30000
+    strong.on_throttle(5)
+    assert cheap.paused_until < strong.paused_until
+
+
+def test_timeout_starts_once_the_slot_is_acquired():
+    async def scenario():
+        limiter = ProviderLimiter("test", rpm=None, initial_concurrency=1, max_concurrency=1)
+
+        async def work(seconds):
+            await asyncio.sleep(seconds)
+            return seconds
+
+        # The second call queues behind the first for longer than its timeout
+        first = asyncio.create_task(limiter.call(work, 0.2))
+        await asyncio.sleep(0)
+        assert await limiter.call(work, 0.05, timeout=0.1) == 0.05
+        await first
+        with pytest.raises(asyncio.TimeoutError):
+            await limiter.call(work, 0.2, timeout=0.05)
+
+    asyncio.run(scenario())
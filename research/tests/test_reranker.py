@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+import agents
+from budget import BudgetGovernor
+from relevance import BM25
+from reranker import (RERANK_DIRECTORY_PENALTY, RERANK_RANK_WEIGHT, RERANK_SHORTLIST, RERANK_SOCIAL_PENALTY,
+                      RERANK_TOP_K, RERANK_WEBSITE_BOOST, domain_prior, rerank)
+
+QUESTION = "Who owns Bakery Mueller and when was it founded?"
+WEBSITE = "https://www.bakery-mueller.de"
+
+
+def _result(rank, domain, title, snippet):
+    return {"url": f"https://{domain}/{rank}", "title": title, "snippet": snippet, "domain": domain,
+            "rank": rank, "raw_tokens": 100}
+
+
+RESULTS = [
+    _result(1, "yelp.com", "Bakery Mueller - Yelp", "Reviews of Bakery Mueller"),
+    _result(2, "bakery-mueller.de", "About Bakery Mueller", "Founded in 1980, Bakery Mueller is owned by Anna Mueller"),
+    _result(3, "facebook.com", "Bakery Mueller", "Bakery Mueller on Facebook"),
+    _result(4, "weather.example", "Weather forecast", "Sunny tomorrow"),
+    _result(5, "news.example", "Bakery Mueller opens a second store", "The owner of Bakery Mueller founded it in 1980"),
+    _result(6, "recipes.example", "Sourdough recipes", "Bread at home"),
+]
+
+
+def test_domain_priors():
+    assert domain_prior("shop.bakery-mueller.de", "bakery-mueller.de") == RERANK_WEBSITE_BOOST
+    assert domain_prior("de.yelp.com", "bakery-mueller.de") == -RERANK_DIRECTORY_PENALTY
+    assert domain_prior("facebook.com", None) == -RERANK_SOCIAL_PENALTY
+    assert domain_prior("notyelp.com", None) == 0.0
+
+
+def test_scores_combine_bm25_rank_and_domain_priors():
+    ranked = asyncio.run(rerank(RESULTS, QUESTION, website=WEBSITE))
+    lexical = BM25([f"{r['title']} {r['snippet']}" for r in RESULTS]).scores(QUESTION)
+    for result, score in ranked:
+        index = RESULTS.index(result)
+        expected = (lexical[index] / max(lexical) + RERANK_RANK_WEIGHT / result["rank"]
+                    + domain_prior(result["domain"], "bakery-mueller.de"))
+        assert score == pytest.approx(expected)
+    order = [result["domain"] for result, _ in ranked]
+    assert order[0] == "bakery-mueller.de"
+    assert order.index("news.example") < order.index("yelp.com") < order.index("weather.example")
+    assert dict((r["domain"], s) for r, s in ranked)["weather.example"] == pytest.approx(RERANK_RANK_WEIGHT / 4)
+
+
+def _select(monkeypatch, mode, results):
+    llm_calls = []
+
+    async def fake_search(query):
+        return results
+
+    async def fake_call_llm(agent, input_data, **kwargs):
+        llm_calls.append(input_data["search_results"])
+        return {"selected_results": ["https://picked.example"]}, 50
+
+    monkeypatch.setattr(agents, "search", fake_search)
+    monkeypatch.setattr(agents, "call_llm", fake_call_llm)
+    monkeypatch.setattr(agents, "count_tokens", lambda text: len(text.split()))
+    state = {"selection_mode": mode, "business_info": {"website": WEBSITE}}
+    query_context = {"research_question": QUESTION, "search_context": "", "search_queries": ["bakery mueller owner"]}
+    selected, searches, tokens_used, _ = asyncio.run(
+        agents.search_and_select(state, query_context, BudgetGovernor(state))
+    )
+    return selected["search_urls"], tokens_used, llm_calls
+
+
+def test_local_mode_takes_the_top_results_without_the_llm(monkeypatch):
+    urls, tokens_used, llm_calls = _select(monkeypatch, "local", RESULTS)
+    ranked = asyncio.run(rerank(RESULTS, QUESTION, queries=["bakery mueller owner"], website=WEBSITE))
+    assert urls == [result["url"] for result, _ in ranked[:RERANK_TOP_K]]
+    assert (tokens_used, llm_calls) == (0, [])
+
+
+def test_hybrid_mode_skips_the_llm_for_a_short_shortlist(monkeypatch):
+    short = RESULTS[:RERANK_TOP_K]
+    urls, tokens_used, llm_calls = _select(monkeypatch, "hybrid", short)
+    assert sorted(urls) == sorted(result["url"] for result in short)
+    assert (tokens_used, llm_calls) == (0, [])
+
+
+def test_hybrid_mode_lets_the_llm_pick_from_the_shortlist(monkeypatch):
+    assert RERANK_TOP_K < len(RESULTS)
+    urls, tokens_used, llm_calls = _select(monkeypatch, "hybrid", RESULTS)
+    assert (urls, tokens_used) == (["https://picked.example"], 50)
+    assert len(llm_calls) == 1
+    assert llm_calls[0].count("\nhttps://") == min(len(RESULTS), RERANK_SHORTLIST)
+
+
+def test_llm_mode_sends_every_result(monkeypatch):
+    urls, _, llm_calls = _select(monkeypatch, "llm", RESULTS)
+    assert urls == ["https://picked.example"]
+    assert all(result["url"] in llm_calls[0] for result in RESULTS)
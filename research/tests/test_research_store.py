@@ -0,0 +1,34 @@
+import asyncio
+
+import research_store
+from dedup import visited_entry
+from research_store import PROBE_CONCURRENCY, ResearchStore
+
+
+def test_only_sources_without_validators_are_probed_a_few_at_a_time(monkeypatch, tmp_path):
+    probed, in_flight, peak = [], 0, 0
+
+    async def fake_probe(url):
+        nonlocal in_flight, peak
+        probed.append(url)
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return "unknown", f'"{url}"', None
+
+    monkeypatch.setattr(research_store, "probe", fake_probe)
+    fetched = {f"https://a.example/{i}": visited_entry(f"https://a.example/{i}", "q", "ctx", 1,
+                                                        etag=f'"v{i}"') for i in range(3)}
+    proxied = {f"https://b.example/{i}": visited_entry(f"https://b.example/{i}", "q", "ctx", 1)
+               for i in range(10)}
+    store = ResearchStore(str(tmp_path / "research.sqlite"))
+
+    asyncio.run(store.save_run("site:a.example", {"visited_pages": {**fetched, **proxied}}))
+
+    assert sorted(probed) == sorted(proxied)
+    assert peak <= PROBE_CONCURRENCY
+    sources = store._load("site:a.example")["sources"]
+    assert sources["https://a.example/0"]["etag"] == '"v0"'
+    assert sources["https://b.example/0"]["etag"] == '"https://b.example/0"'
+    assert all(source["probed"] for source in sources.values())
@@ -0,0 +1,44 @@
+from state import add_urls_with_context, extend_with_delete
+
+
+def _urls(question, urls, context="ctx"):
+    return {"research_question": question, "search_urls": urls, "search_context": context}
+
+
+def test_urls_are_merged_per_question_deduplicated_by_canonical_url():
+    existing = [_urls("Who runs it?", ["https://Example.com/team/", "https://example.com/about?utm_source=x"])]
+    update = [
+        _urls("Who runs it?", ["https://example.com/team", "https://example.com/jobs"], context="later"),
+        _urls("What do they sell?", ["https://example.com/shop", "https://example.com/shop#top"]),
+    ]
+    merged = add_urls_with_context(existing, update)
+    assert merged == [
+        # The first item of a question keeps its context, the first spelling of a URL wins
+        _urls("Who runs it?", ["https://Example.com/team/", "https://example.com/about?utm_source=x",
+                               "https://example.com/jobs"]),
+        _urls("What do they sell?", ["https://example.com/shop"]),
+    ]
+
+
+def test_merging_urls_does_not_alias_the_existing_entries():
+    existing = [_urls("Who runs it?", ["https://example.com/team"])]
+    merged = add_urls_with_context(existing, [_urls("Who runs it?", ["https://example.com/jobs"])])
+    merged[0]["search_urls"].append("https://example.com/more")
+    assert existing == [_urls("Who runs it?", ["https://example.com/team"])]
+    assert merged[0] is not existing[0]
+
+
+def test_extend_skips_items_already_in_the_list_and_keeps_order():
+    existing = ["a", "b"]
+    assert extend_with_delete(existing, ["c", "a", "d", "c"]) == ["a", "b", "c", "d"]
+    assert existing == ["a", "b"]
+    assert extend_with_delete([], ["b", "a", "b"]) == ["b", "a"]
+    queries = [{"query": "x", "research_question": "q"}]
+    assert extend_with_delete(queries, [{"research_question": "q", "query": "x"}, {"query": "y"}]) == (
+        queries + [{"query": "y"}]
+    )
+
+
+def test_delete_sentinel_clears_both_lists():
+    assert add_urls_with_context([_urls("q", ["https://example.com"])], "DELETE") == []
+    assert extend_with_delete(["a"], "DELETE") == []
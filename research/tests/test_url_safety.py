@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from url_safety import UnsafeURL, check_public_url, is_public_address
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1", "10.0.0.5", "192.168.1.1", "169.254.169.254", "::1",
+                                     "fe80::1%eth0", "::ffff:127.0.0.1", "0.0.0.0", "100.64.0.1", "224.0.0.1"])
+def test_non_public_addresses(address):
+    assert not is_public_address(address)
+
+
+@pytest.mark.parametrize("address", ["93.184.216.34", "2606:4700::6810:84e5"])
+def test_public_addresses(address):
+    assert is_public_address(address)
+
+
+@pytest.mark.parametrize("url", ["file:///etc/passwd", "ftp://example.com/", "http:///path",
+                                 "http://127.0.0.1:8000/stats", "http://[::1]/", "http://169.254.169.254/latest/",
+                                 "http://localhost/"])
+def test_unsafe_urls_are_refused(url):
+    with pytest.raises(UnsafeURL):
+        asyncio.run(check_public_url(url))
+
+
+def test_public_ip_literal_passes():
+    asyncio.run(check_public_url("https://93.184.216.34/about"))